@@ -0,0 +1,13 @@
+"""
+Нагрузочные прогоны и бенчмарки бэкендов beton (Строй/beton) и youg
+
+Запуск из корня репозитория:
+
+    python -m benchmarks seed beton --years 2
+    python -m benchmarks run beton --workloads operator_shift:4,dashboard_wall:16 --duration 60
+    python -m benchmarks micro beton
+    python -m benchmarks seed youg --tasks 500000
+    python -m benchmarks run youg --workloads kanban_drag:32
+
+Подробнее — benchmarks/README.md.
+"""
@@ -0,0 +1,174 @@
+"""
+Командная строка бенчмарков: seed, run, micro, compare (см. benchmarks/README.md)
+"""
+import argparse
+import asyncio
+import importlib
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import httpx
+
+from benchmarks import runner
+
+TARGETS = ("beton", "youg")
+
+# Смесь сценариев по умолчанию: сценарий:виртуальных пользователей
+DEFAULT_WORKLOADS = {
+    "beton": "operator_shift:4,dashboard_wall:16,lab_entry:2,archive:1",
+    "youg": "kanban_drag:32,board_view:8",
+}
+
+
+def target_module(target: str, name: str = ""):
+    return importlib.import_module(f"benchmarks.{target}{'.' + name if name else ''}")
+
+
+def configure(args):
+    package = target_module(args.target)
+    if args.target == "beton":
+        package.configure(args.database_url, args.env)
+    else:
+        package.configure(args.workdir, args.env)
+    return package
+
+
+@asynccontextmanager
+async def open_client(args):
+    """Клиент к живому серверу (--url) или к приложению в процессе"""
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+            yield client, None
+        return
+    package = configure(args)
+    async with package.open_app() as app:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            yield client, package
+
+
+def cmd_seed(args):
+    configure(args)
+    seed = target_module(args.target, "seed")
+    if args.target == "beton":
+        counts = seed.seed(years=args.years, orders_per_day=args.orders_per_day, seed=args.seed)
+    else:
+        counts = seed.seed(companies=args.companies, tasks=args.tasks, seed=args.seed)
+    print(f"{args.target}: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
+
+
+def compare_with_baseline(args, result: dict, kind: str, compare) -> int:
+    path = runner.baseline_path(args.target, kind, args.baseline)
+    if args.save_baseline:
+        runner.save_json(path, result)
+        print(f"\nБазовая линия сохранена: {path}")
+        return 0
+    if not path.exists():
+        print(f"\nБазовой линии нет ({path}); сохранить: --save-baseline")
+        return 0
+    baseline = runner.load_json(path)
+    if kind == "load" and baseline.get("workloads") != result["workloads"]:
+        print(f"\nБазовая линия снята на другой смеси сценариев ({baseline.get('workloads')}), сравнение пропущено")
+        return 0
+    return 1 if runner.print_comparison(compare(result, baseline, args.tolerance), args.tolerance) else 0
+
+
+async def cmd_run(args) -> int:
+    registry = target_module(args.target, "workloads").WORKLOADS
+    spec = args.workloads or DEFAULT_WORKLOADS[args.target]
+    workloads = runner.parse_workloads(spec, registry)
+    async with open_client(args) as (client, package):
+        try:
+            recorder, elapsed = await runner.run_load(
+                client, workloads, args.duration, args.warmup, args.think_ms, args.seed
+            )
+        except runner.WorkloadError as e:
+            raise SystemExit(f"Подготовка сценария не удалась ({e}); данные созданы командой seed?")
+        result = {"target": args.target, "workloads": spec, "environment": runner.environment()}
+        result.update(runner.summarize(recorder, elapsed))
+        if package is not None:
+            result["server"] = package.server_stats()
+    runner.print_load(result)
+    if args.output:
+        runner.save_json(Path(args.output), result)
+    return compare_with_baseline(args, result, "load", runner.compare_load)
+
+
+async def cmd_micro(args) -> int:
+    benches = target_module(args.target, "micro").MICRO
+    unknown = set(args.names) - set(benches)
+    if unknown:
+        raise SystemExit(f"Неизвестные бенчмарки: {', '.join(sorted(unknown))}; доступны: {', '.join(benches)}")
+    args.url = None
+    results = {}
+    async with open_client(args) as (client, _):
+        for name in args.names or benches:
+            print(f"{name}...", flush=True)
+            results[name] = await benches[name](client)
+    result = {"target": args.target, "environment": runner.environment(), "results": results}
+    runner.print_micro(result)
+    if args.output:
+        runner.save_json(Path(args.output), result)
+    return compare_with_baseline(args, result, "micro", runner.compare_micro)
+
+
+def cmd_compare(args) -> int:
+    current, baseline = runner.load_json(args.current), runner.load_json(args.baseline)
+    compare = runner.compare_micro if "results" in current else runner.compare_load
+    return 1 if runner.print_comparison(compare(current, baseline, args.tolerance), args.tolerance) else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Нагрузочные прогоны beton и youg")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def target_parser(name: str, help_text: str):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("target", choices=TARGETS)
+        sub.add_argument("--database-url", help="beton: база прогона (по умолчанию benchmarks/data/beton.db)")
+        sub.add_argument("--workdir", help="youg: каталог с data/ (по умолчанию benchmarks/data/youg)")
+        sub.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                         help="Переменная окружения приложения, например SQLITE_PROFILE=performance")
+        sub.add_argument("--seed", type=int, default=1, help="Зерно генератора случайных чисел")
+        return sub
+
+    seed = target_parser("seed", "Заполнить базу данными")
+    seed.add_argument("--years", type=float, default=1.0, help="beton: лет истории")
+    seed.add_argument("--orders-per-day", type=int, default=60, help="beton: заказов в сутки")
+    seed.add_argument("--companies", type=int, default=20, help="youg: компаний")
+    seed.add_argument("--tasks", type=int, default=500000, help="youg: задач")
+
+    for name, help_text in (("run", "Нагрузочный прогон сценариев"), ("micro", "Микробенчмарки")):
+        sub = target_parser(name, help_text)
+        if name == "run":
+            sub.add_argument("--workloads", help=f"Сценарии и пользователи, например {DEFAULT_WORKLOADS['beton']}")
+            sub.add_argument("--duration", type=float, default=60, help="Длительность замера (сек)")
+            sub.add_argument("--warmup", type=float, default=5, help="Прогрев перед замером (сек)")
+            sub.add_argument("--think-ms", type=float, default=0, help="Пауза пользователя между итерациями (мс)")
+            sub.add_argument("--url", help="Живой сервер вместо приложения в процессе")
+        else:
+            sub.add_argument("names", nargs="*", help="Бенчмарки (по умолчанию все)")
+        sub.add_argument("--output", help="Сохранить результат в JSON")
+        sub.add_argument("--baseline", help="Имя или путь базовой линии (benchmarks/baselines/<цель>-<вид>[-имя].json)")
+        sub.add_argument("--save-baseline", action="store_true", help="Сохранить результат как базовую линию")
+        sub.add_argument("--tolerance", type=float, default=runner.DEFAULT_TOLERANCE, help="Допустимое ухудшение (доля)")
+
+    compare = commands.add_parser("compare", help="Сравнить сохраненный результат с базовой линией")
+    compare.add_argument("current")
+    compare.add_argument("baseline")
+    compare.add_argument("--tolerance", type=float, default=runner.DEFAULT_TOLERANCE)
+
+    args = parser.parse_args(argv)
+    if args.command == "seed":
+        cmd_seed(args)
+        return 0
+    if args.command == "run":
+        return asyncio.run(cmd_run(args))
+    if args.command == "micro":
+        return asyncio.run(cmd_micro(args))
+    return cmd_compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Бенчмарки beton: генератор данных, сценарии нагрузки и микробенчмарки
+
+Приложение запускается в процессе прогона (через httpx.ASGITransport) на базе
+из DATABASE_URL, либо прогон идет по живому серверу (`--url`). Переменные
+окружения beton читаются при импорте `backend`, поэтому `configure()` должен
+выполниться до первого импорта.
+"""
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Iterable, Optional
+
+BETON_DIR = Path(__file__).resolve().parents[2] / "Строй" / "beton"
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+DEFAULT_DATABASE_URL = f"sqlite:///{DATA_DIR / 'beton.db'}"
+
+# Пользователи для сценариев (создаются init_db и генератором данных)
+USERS = {
+    "admin": ("admin", "admin123"),
+    "operator": ("operator", "operator123"),
+    "technologist": ("technologist", "tech123"),
+    "laboratory": ("laboratory", "lab123"),
+}
+
+
+def configure(database_url: Optional[str] = None, env: Iterable[str] = ()):
+    """Окружение beton (DATABASE_URL и KEY=VALUE из --env) до импорта backend"""
+    if "backend.database" in sys.modules:
+        raise RuntimeError("backend уже импортирован: окружение не применится")
+    DATA_DIR.mkdir(exist_ok=True)
+    os.environ["DATABASE_URL"] = database_url or os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL
+    for item in env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+    if str(BETON_DIR) not in sys.path:
+        sys.path.insert(0, str(BETON_DIR))
+
+
+@asynccontextmanager
+async def open_app():
+    """Приложение beton с выполненным lifespan (миграции, фоновые задачи)"""
+    from backend.main import app
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+def server_stats() -> dict:
+    """Состояние процесса после прогона: SQL по маршрутам, пулы, кэши, поток событий"""
+    from backend.auth import principal_cache
+    from backend.dashboard_cache import dashboard_cache
+    from backend.live_events import live_broker
+    from backend.pool_metrics import pool_stats
+    from backend.profiling import route_metrics
+    from backend.recipe_cache import recipe_cache
+
+    routes = {}
+    for (method, route), metrics in sorted(route_metrics.items()):
+        count = metrics.latency_ms.count
+        if count:
+            routes[f"{method} {route}"] = {
+                "requests": count,
+                "sql_per_request": round(metrics.sql_count.total / count, 2),
+                "sql_ms_per_request": round(metrics.sql_ms / count, 3),
+            }
+    return {
+        "routes": routes,
+        "db_pool": pool_stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "recipe_cache": recipe_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "live_events": live_broker.stats(),
+    }
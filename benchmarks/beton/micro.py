@@ -0,0 +1,991 @@
+"""
+Микробенчмарки beton: узкие места по отдельности
+
+Каждый бенчмарк — корутина `(client) -> dict` с метриками. Ключи `*_per_sec`
+сравниваются с базовой линией как "больше — лучше", `*_ms` и `*_us` — как
+"меньше — лучше"; остальные ключи информационные (число дублей, планы запросов).
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from benchmarks.beton.workloads import load_recipes, login
+from benchmarks.runner import percentile
+
+# Строк в замере сериализации
+SERIALIZATION_ROWS = 10000
+
+# Заказов в замере планировщика
+PLANNER_ORDERS = 1200
+
+# Параллельных повторов одного перехода статуса
+TRANSITION_RETRIES = 16
+
+# Партий в одном запросе массовой загрузки дозирования и запросов на формат (JSON-массив, NDJSON)
+BULK_DOSING_RECORDS = 5000
+BULK_DOSING_REQUESTS = 4
+
+# Параллельных списаний со склада
+SILO_WRITERS = 16
+
+# Параллельных входов в замере пересменки
+LOGIN_STORM_USERS = 32
+
+# Показаний в одной пачке, пачек в замере и рядов (оборудование × величина) в пачке
+TELEMETRY_BLOCK = 10000
+TELEMETRY_BLOCKS = 10
+TELEMETRY_METRICS = ("weight_kg", "level_pct", "temperature_c", "vibration_mm_s")
+
+# Устройств Modbus и MQTT на имитаторах и длительность замера шлюза (сек)
+GATEWAY_DEVICES = 200
+GATEWAY_MQTT_DEVICES = 50
+GATEWAY_SECONDS = 5
+
+# Синтетических партий с результатами лаборатории для обучения модели прочности
+STRENGTH_BATCHES = 1_000_000
+
+# Записей в одном запросе пакетного прогноза
+STRENGTH_BULK_ITEMS = 1000
+
+# Логов дозирования в замере выгрузки
+EXPORT_DOSING_LOGS = 1_000_000
+
+# Партий в базе регрессии планов запросов (логов дозирования столько же)
+QUERY_PLAN_BATCHES = 1_000_000
+
+# Подписчиков и событий в замере рассылки
+LIVE_SUBSCRIBERS = 500
+LIVE_EVENTS = 2000
+
+
+def _timed(call, repeat: int) -> float:
+    """Среднее время вызова (сек)"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return (time.perf_counter() - started) / repeat
+
+
+async def serialization(client) -> dict:
+    """Строки партий в JSON: orjson по словарям строк против pydantic-моделей"""
+    from pydantic import TypeAdapter
+
+    from backend.database import AsyncSessionLocal
+    from backend.models import Batch
+    from backend.schemas import BatchResponse
+    from backend.serialization import dumps, fetch_rows, project
+
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        rows = await fetch_rows(db, project(Batch, BatchResponse).limit(SERIALIZATION_ROWS))
+        fetch = time.perf_counter() - started
+    adapter = TypeAdapter(List[BatchResponse])
+    fast = _timed(lambda: dumps(rows), 5)
+    models = _timed(lambda: adapter.dump_json(adapter.validate_python(rows)), 5)
+    return {
+        "rows": len(rows),
+        "fetch_rows_per_sec": round(len(rows) / fetch),
+        "dumps_rows_per_sec": round(len(rows) / fast),
+        "pydantic_rows_per_sec": round(len(rows) / models),
+    }
+
+
+async def planner(client) -> dict:
+    """Расписание PLANNER_ORDERS заказов на смесители завода (без БД)"""
+    from backend.planner import plan_summary, schedule
+
+    start = datetime.now().replace(microsecond=0)
+    jobs = [
+        (order_id, 1 + order_id % 8, start + timedelta(minutes=order_id % 960), 2 + order_id % 11, 240)
+        for order_id in range(PLANNER_ORDERS)
+    ]
+    mixers = [(1, 3.0, start), (2, 3.0, start), (3, 4.5, start), (4, 4.5, start)]
+    planned = schedule(jobs, mixers)
+    elapsed = _timed(lambda: plan_summary(schedule(jobs, mixers)), 5)
+    return {"orders": PLANNER_ORDERS, "batches": len(planned), "schedule_ms": round(elapsed * 1000, 3)}
+
+
+async def auth(client) -> dict:
+    """Вход (хеш пароля) и проверка токена на запросе"""
+    repeat = 10
+    started = time.perf_counter()
+    for _ in range(repeat):
+        headers = await login(client, "operator")
+    login_ms = (time.perf_counter() - started) * 1000 / repeat
+
+    started = time.perf_counter()
+    for _ in range(200):
+        await client.get("/api/health")
+    health_us = (time.perf_counter() - started) * 1e6 / 200
+    started = time.perf_counter()
+    for _ in range(200):
+        await client.get("/api/auth/me", headers=headers)
+    me_us = (time.perf_counter() - started) * 1e6 / 200
+    return {"login_ms": round(login_ms, 3), "health_us": round(health_us, 1), "auth_me_us": round(me_us, 1)}
+
+
+async def login_storm(client) -> dict:
+    """Время ответа несвязанного запроса в покое и во время LOGIN_STORM_USERS параллельных входов.
+
+    При хешировании в event loop (PASSWORD_HASH_WORKERS=0) оно растет на время
+    хеширования, умноженное на очередь входов; с пулом потоков — почти не меняется.
+    """
+    from backend.passwords import hash_pool
+
+    headers = await login(client, "operator")
+
+    async def probe() -> float:
+        samples = []
+        for _ in range(200):
+            started = time.perf_counter()
+            await client.get("/api/auth/me", headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.002)
+        return percentile(sorted(samples), 95)
+
+    idle = await probe()
+    stop = asyncio.Event()
+    logins = 0
+
+    async def storm():
+        nonlocal logins
+        while not stop.is_set():
+            await login(client, "laboratory")
+            logins += 1
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(storm()) for _ in range(LOGIN_STORM_USERS)]
+    await asyncio.sleep(0.2)
+    during = await probe()
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return {
+        "hash_workers": hash_pool.workers,
+        "logins_per_sec": round(logins / elapsed, 1),
+        "idle_p95_ms": round(idle, 3),
+        "storm_p95_ms": round(during, 3),
+        "peak_hash_queue": hash_pool.peak_queued,
+    }
+
+
+async def recipe_cache(client) -> dict:
+    """Рецептура из кэша процесса против SELECT по первичному ключу"""
+    from backend.database import AsyncSessionLocal
+    from backend.models import Recipe
+    from backend.recipe_cache import recipe_cache as cache
+
+    repeat = 2000
+    async with AsyncSessionLocal() as db:
+        recipe_id = (await cache.get_by_code(db, "B25")).id
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await cache.get(db, recipe_id)
+        cached = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await db.get(Recipe, recipe_id, populate_existing=True)
+        direct = time.perf_counter() - started
+    return {"cached_get_us": round(cached * 1e6 / repeat, 2), "select_get_us": round(direct * 1e6 / repeat, 2)}
+
+
+async def setpoints(client) -> dict:
+    """Уставки партии: поиск в таблице, пересчет таблицы рецептуры при смене влажности, весь HTTP-запрос"""
+    from sqlalchemy import select
+
+    from backend.database import AsyncSessionLocal
+    from backend.models import Batch
+    from backend.recipe_cache import recipe_cache as cache
+    from backend.setpoints import SetpointTable, setpoint_engine
+
+    repeat = 2000
+    headers = await login(client, "operator")
+    async with AsyncSessionLocal() as db:
+        batch_id = await db.scalar(select(Batch.id).order_by(Batch.id.desc()).limit(1))
+        await setpoint_engine.for_batch(db, batch_id)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            await setpoint_engine.for_batch(db, batch_id)
+        lookup = time.perf_counter() - started
+        recipe = await cache.get(db, (await db.get(Batch, batch_id)).recipe_id)
+        build = _timed(lambda: SetpointTable(recipe, {"sand": 4.5, "gravel": 1.5}, setpoint_engine.volumes), 200)
+    for _ in range(100):
+        await client.get(f"/api/batches/{batch_id}/setpoints", headers=headers)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await client.get(f"/api/batches/{batch_id}/setpoints", headers=headers)
+    request = time.perf_counter() - started
+    return {
+        "lookup_us": round(lookup * 1e6 / repeat, 2),
+        "volumes_per_table": len(setpoint_engine.volumes),
+        "table_build_us": round(build * 1e6, 1),
+        "request_us": round(request * 1e6 / repeat, 1),
+    }
+
+
+async def transitions(client) -> dict:
+    """Параллельные повторы переходов: ровно один должен примениться.
+
+    Для complete-dosing дополнительно проверяется, что логи дозирования и
+    списание со склада записаны один раз; при дублях бенчмарк падает.
+    """
+    from sqlalchemy import func, select
+
+    from backend.database import AsyncSessionLocal
+    from backend.models import BatchTransition, DosingLog, StockMovement
+
+    headers = await login(client, "operator")
+    recipe = (await load_recipes(client, headers))[0]
+    order = (await client.post("/api/orders/", headers=headers, json={
+        "concrete_grade": recipe["code"], "volume_m3": 6, "recipe_id": recipe["id"],
+    })).json()
+    dosing = {
+        "actual_cement": recipe["cement_kg"] * 3, "actual_sand": recipe["sand_kg"] * 3,
+        "actual_gravel": recipe["gravel_kg"] * 3, "actual_water": recipe["water_kg"] * 3,
+    }
+
+    async def new_batch() -> int:
+        response = await client.post("/api/batches/", headers=headers, json={
+            "order_id": order["id"], "recipe_id": recipe["id"], "volume_m3": 3,
+        })
+        return response.json()["id"]
+
+    async def burst(batch_id: int, action: str, keyed: bool, params=None) -> tuple:
+        """TRANSITION_RETRIES одинаковых запросов разом: (число ответов 200, мс)"""
+        burst_headers = {**headers, "Idempotency-Key": f"micro-{time.time_ns()}"} if keyed else headers
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post(f"/api/batches/{batch_id}/{action}", headers=burst_headers, params=params)
+            for _ in range(TRANSITION_RETRIES)
+        ])
+        elapsed = (time.perf_counter() - started) * 1000
+        return sum(response.status_code == 200 for response in responses), elapsed
+
+    async def dosing_rows(batch_id: int) -> dict:
+        """Строки complete_dosing в базе: всего и различных (компонентов, материалов)"""
+        async with AsyncSessionLocal() as db:
+            transitions_count = await db.scalar(select(func.count()).where(
+                BatchTransition.batch_id == batch_id, BatchTransition.action == "complete_dosing",
+            ))
+            logs, components = (await db.execute(select(
+                func.count(), func.count(DosingLog.component_type.distinct()),
+            ).where(DosingLog.batch_id == batch_id))).one()
+            movements, materials = (await db.execute(select(
+                func.count(), func.count(StockMovement.material_id.distinct()),
+            ).where(StockMovement.batch_id == batch_id, StockMovement.reason == "dosing"))).one()
+        return {
+            "transitions": transitions_count, "logs": logs, "components": components,
+            "movements": movements, "materials": materials,
+        }
+
+    failures = []
+    metrics = {"retries": TRANSITION_RETRIES}
+
+    # start: с ключом все повторы получают 200, без ключа — один успех, остальные — конфликт
+    batch_id = await new_batch()
+    metrics["keyed_ok"], keyed_ms = await burst(batch_id, "start", keyed=True)
+    metrics["keyed_burst_ms"] = round(keyed_ms, 3)
+    history = (await client.get(f"/api/batches/{batch_id}/transitions", headers=headers)).json()
+    metrics["duplicate_transitions"] = len(history) - 1
+    if metrics["keyed_ok"] != TRANSITION_RETRIES or len(history) != 1:
+        failures.append(f"start с ключом: {metrics['keyed_ok']} ответов 200, переходов {len(history)}")
+    metrics["unkeyed_ok"], _ = await burst(await new_batch(), "start", keyed=False)
+    if metrics["unkeyed_ok"] != 1:
+        failures.append(f"start без ключа: {metrics['unkeyed_ok']} ответов 200 вместо одного")
+
+    # complete-dosing: один переход, один набор логов и одно списание на партию
+    for keyed, label in ((True, "keyed"), (False, "unkeyed")):
+        batch_id = await new_batch()
+        ok, elapsed = await burst(batch_id, "complete-dosing", keyed, dosing)
+        rows = await dosing_rows(batch_id)
+        metrics[f"dosing_{label}_ok"] = ok
+        metrics[f"dosing_{label}_burst_ms"] = round(elapsed, 3)
+        metrics[f"dosing_{label}_logs"] = rows["logs"]
+        metrics[f"dosing_{label}_movements"] = rows["movements"]
+        problems = []
+        if ok != (TRANSITION_RETRIES if keyed else 1):
+            problems.append(f"{ok} ответов 200")
+        if rows["transitions"] != 1:
+            problems.append(f"переходов {rows['transitions']}")
+        if not rows["logs"] or rows["logs"] != rows["components"]:
+            problems.append(f"логов {rows['logs']} на {rows['components']} компонентов")
+        if not rows["movements"] or rows["movements"] != rows["materials"]:
+            problems.append(f"списаний {rows['movements']} на {rows['materials']} материалов")
+        if problems:
+            failures.append(f"complete-dosing {'с ключом' if keyed else 'без ключа'}: " + ", ".join(problems))
+
+    if failures:
+        raise RuntimeError("Повторы переходов записаны не один раз:\n" + "\n".join(failures))
+    return metrics
+
+
+async def bulk_dosing(client) -> dict:
+    """Массовая загрузка дозирования: записей в секунду для JSON-массива и NDJSON"""
+    import json
+
+    from sqlalchemy import insert, select
+
+    from backend.database import AsyncSessionLocal
+    from backend.models import Batch, BatchStatus
+
+    headers = await login(client, "operator")
+    recipe = (await load_recipes(client, headers))[0]
+    volume = 0.5
+    order = (await client.post("/api/orders/", headers=headers, json={
+        "concrete_grade": recipe["code"], "recipe_id": recipe["id"],
+        "volume_m3": volume * BULK_DOSING_RECORDS * BULK_DOSING_REQUESTS * 2,
+    })).json()
+
+    # Запланированные партии пишутся напрямую: замеряется только загрузка дозирования
+    prefix = f"BULK-{time.time_ns()}"
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Batch), [
+            {
+                "batch_number": f"{prefix}-{number}", "order_id": order["id"], "recipe_id": recipe["id"],
+                "volume_m3": volume, "status": BatchStatus.PLANNED,
+            }
+            for number in range(BULK_DOSING_RECORDS * BULK_DOSING_REQUESTS * 2)
+        ])
+        batch_ids = (await db.scalars(
+            select(Batch.id).where(Batch.batch_number.startswith(prefix)).order_by(Batch.id)
+        )).all()
+        await db.commit()
+
+    def record(batch_id: int) -> dict:
+        return {"batch_id": batch_id, **{
+            f"actual_{c}": round((recipe.get(f"{c}_kg") or 0) * volume * (1 + (batch_id % 7 - 3) / 200), 2)
+            for c in ("cement", "sand", "gravel", "water", "additive1", "additive2")
+        }}
+
+    async def upload(ids, ndjson: bool) -> tuple:
+        accepted = logs = 0
+        started = time.perf_counter()
+        for start in range(0, len(ids), BULK_DOSING_RECORDS):
+            records = [record(batch_id) for batch_id in ids[start:start + BULK_DOSING_RECORDS]]
+            if ndjson:
+                body = "\n".join(json.dumps(item) for item in records).encode()
+                response = await client.post("/api/batches/dosing/bulk", content=body, headers={
+                    **headers, "Content-Type": "application/x-ndjson",
+                })
+            else:
+                response = await client.post("/api/batches/dosing/bulk", headers=headers, json=records)
+            if response.status_code != 200:
+                raise RuntimeError(f"Загрузка дозирования: {response.status_code} {response.text[:200]}")
+            accepted += response.json()["accepted"]
+            logs += response.json()["dosing_logs"]
+        return accepted, logs, time.perf_counter() - started
+
+    half = len(batch_ids) // 2
+    array_accepted, array_logs, array_elapsed = await upload(batch_ids[:half], ndjson=False)
+    ndjson_accepted, ndjson_logs, ndjson_elapsed = await upload(batch_ids[half:], ndjson=True)
+    return {
+        "records_per_request": BULK_DOSING_RECORDS,
+        "rejected": len(batch_ids) - array_accepted - ndjson_accepted,
+        "array_records_per_sec": round(array_accepted / array_elapsed),
+        "ndjson_records_per_sec": round(ndjson_accepted / ndjson_elapsed),
+        "dosing_logs_per_sec": round((array_logs + ndjson_logs) / (array_elapsed + ndjson_elapsed)),
+    }
+
+
+async def middleware(client) -> dict:
+    """Накладные расходы RequestMetricsMiddleware на легком запросе"""
+    from backend.main import app
+    from backend.profiling import RequestMetricsMiddleware
+
+    async def per_request_us() -> float:
+        for _ in range(100):
+            await client.get("/api/health")
+        started = time.perf_counter()
+        for _ in range(1000):
+            await client.get("/api/health")
+        return (time.perf_counter() - started) * 1000
+
+    with_metrics = await per_request_us()
+    saved = list(app.user_middleware)
+    app.user_middleware = [item for item in saved if item.cls is not RequestMetricsMiddleware]
+    app.middleware_stack = None
+    try:
+        without = await per_request_us()
+    finally:
+        app.user_middleware = saved
+        app.middleware_stack = None
+    return {
+        "with_metrics_us": round(with_metrics, 1),
+        "without_metrics_us": round(without, 1),
+        "overhead_us": round(with_metrics - without, 1),
+    }
+
+
+async def silo_contention(client) -> dict:
+    """Параллельные списания одних материалов: остаток должен сойтись с суммой списаний"""
+    from sqlalchemy import select
+
+    from backend.database import AsyncSessionLocal
+    from backend.models import WarehouseMaterial
+    from backend.stock import consume_for_batches
+
+    components = {"cement": 1.0, "sand": 1.0, "gravel": 1.0, "water": 1.0}
+    rounds = 20
+
+    async def stock():
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(WarehouseMaterial.material_type, WarehouseMaterial.current_stock_kg)
+                .where(WarehouseMaterial.material_type.in_(components))
+            )
+            return dict(rows.all())
+
+    async def writer():
+        for _ in range(rounds):
+            async with AsyncSessionLocal() as db:
+                await consume_for_batches(db, [(None, components)])
+                await db.commit()
+
+    before = await stock()
+    started = time.perf_counter()
+    await asyncio.gather(*[writer() for _ in range(SILO_WRITERS)])
+    elapsed = time.perf_counter() - started
+    after = await stock()
+    expected = SILO_WRITERS * rounds
+    return {
+        "writers": SILO_WRITERS,
+        "commits_per_sec": round(SILO_WRITERS * rounds / elapsed, 1),
+        "lost_updates": sum(round(before[c] - after[c] - expected * kg) != 0 for c, kg in components.items()),
+    }
+
+
+async def live_fanout(client) -> dict:
+    """Рассылка событий партий LIVE_SUBSCRIBERS подписчикам (фильтр по заказу у половины)"""
+    from backend.live_events import Subscription, live_broker
+
+    subscriptions = [
+        live_broker.subscribe(Subscription(order_id=index if index % 2 else None, maxsize=LIVE_EVENTS))
+        for index in range(LIVE_SUBSCRIBERS)
+    ]
+    try:
+        event = {"type": "batch", "id": 1, "order_id": 1, "status": "dosing", "previous_status": "planned"}
+        delivered = live_broker.delivered
+        started = time.perf_counter()
+        for _ in range(LIVE_EVENTS):
+            live_broker.publish(event)
+        elapsed = time.perf_counter() - started
+        delivered = live_broker.delivered - delivered
+    finally:
+        for subscription in subscriptions:
+            live_broker.unsubscribe(subscription)
+    return {
+        "subscribers": LIVE_SUBSCRIBERS,
+        "events_per_sec": round(LIVE_EVENTS / elapsed),
+        "deliveries_per_sec": round(delivered / elapsed),
+    }
+
+
+async def telemetry(client) -> dict:
+    """Загрузка показаний датчиков пачками по TELEMETRY_BLOCK (в процессе и по HTTP) и графики по ним"""
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+
+    from backend.database import AsyncSessionLocal
+    from backend.models import EquipmentStatus
+    from backend.schemas import TelemetryBatch
+    from backend.telemetry import ingest
+
+    headers = await login(client, "operator")
+    async with AsyncSessionLocal() as db:
+        names = (await db.scalars(select(EquipmentStatus.equipment_name).order_by(EquipmentStatus.id))).all()
+    keys = [(name, metric) for name in names for metric in TELEMETRY_METRICS]
+    per_series = TELEMETRY_BLOCK // len(keys)
+    start = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+
+    def block(number: int) -> list:
+        # 100 Гц на ряд, пачки идут подряд во времени
+        first = start + timedelta(seconds=number * per_series / 100)
+        return [
+            {
+                "equipment": name,
+                "metric": metric,
+                "points": [
+                    [(first + timedelta(milliseconds=10 * i)).isoformat(), 100 + (i % 200) * 0.5]
+                    for i in range(per_series)
+                ],
+            }
+            for name, metric in keys
+        ]
+
+    blocks = [block(number) for number in range(2 * TELEMETRY_BLOCKS)]
+    adapter = TypeAdapter(List[TelemetryBatch])
+    readings = per_series * len(keys)
+    started = time.perf_counter()
+    for payload in blocks[:TELEMETRY_BLOCKS]:
+        async with AsyncSessionLocal() as db:
+            await ingest(db, adapter.validate_python(payload))
+            await db.commit()
+    direct = time.perf_counter() - started
+    started = time.perf_counter()
+    for payload in blocks[TELEMETRY_BLOCKS:]:
+        response = await client.post("/api/telemetry/readings", headers=headers, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"Загрузка показаний: {response.status_code} {response.text[:200]}")
+    http = time.perf_counter() - started
+
+    series = (await client.get("/api/telemetry/series", headers=headers)).json()
+    series_id = series[0]["id"]
+    charts = {}
+    for name, hours in (("chart_10min_ms", 1 / 6), ("chart_1h_ms", 1), ("chart_24h_ms", 24)):
+        params = {
+            "date_from": (start + timedelta(hours=1) - timedelta(hours=hours)).isoformat(),
+            "date_to": (start + timedelta(hours=1)).isoformat(),
+            "points": 500,
+        }
+        await client.get(f"/api/telemetry/series/{series_id}", headers=headers, params=params)
+        started = time.perf_counter()
+        for _ in range(20):
+            await client.get(f"/api/telemetry/series/{series_id}", headers=headers, params=params)
+        charts[name] = round((time.perf_counter() - started) * 1000 / 20, 2)
+    return {
+        "series": len(keys),
+        "block_readings": readings,
+        "ingest_readings_per_sec": round(readings * TELEMETRY_BLOCKS / direct),
+        "http_readings_per_sec": round(readings * TELEMETRY_BLOCKS / http),
+        **charts,
+    }
+
+
+async def export(client) -> dict:
+    """Потоковая выгрузка EXPORT_DOSING_LOGS логов дозирования в CSV и Parquet: строк/с и пик памяти.
+
+    Логи — в отдельной базе SQLite (по 6 на партию); выгружается тот же
+    запрос, что в GET /api/reports/dosing-logs, теми же генераторами
+    backend/export.py. Пик памяти снимается вторым проходом под tracemalloc
+    (для Parquet — плюс пик пула памяти pyarrow).
+    """
+    import os
+    import tempfile
+    import tracemalloc
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from backend import export as exporter
+    from backend.routers.reports import dosing_logs_export_query
+
+    query = dosing_logs_export_query()
+    columns = [(column.name, column.type) for column in query.selected_columns]
+    formats = {"csv": lambda partitions: exporter.csv_stream([name for name, _ in columns], partitions)}
+    if exporter.parquet_available():
+        formats["parquet"] = lambda partitions: exporter.parquet_stream(columns, partitions)
+
+    async def drain(session_factory, fmt: str) -> tuple:
+        size = 0
+        started = time.perf_counter()
+        async for chunk in formats[fmt](exporter.stream_partitions(query, session_factory)):
+            size += len(chunk)
+        return size, time.perf_counter() - started
+
+    batches = EXPORT_DOSING_LOGS // 6
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "export.db")
+        await asyncio.to_thread(_synthetic_database, path, batches, 6)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        try:
+            for fmt in formats:
+                size, elapsed = await drain(session_factory, fmt)
+                if fmt == "parquet":
+                    exporter.pa.default_memory_pool().release_unused()
+                tracemalloc.start()
+                try:
+                    await drain(session_factory, fmt)
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                if fmt == "parquet":
+                    peak += exporter.pa.default_memory_pool().max_memory()
+                results.update({
+                    f"{fmt}_rows_per_sec": round(batches * 6 / elapsed),
+                    f"{fmt}_mb_per_sec": round(size / elapsed / 2 ** 20, 2),
+                    f"{fmt}_size_mb": round(size / 2 ** 20, 1),
+                    f"{fmt}_peak_memory_mb": round(peak / 2 ** 20, 1),
+                })
+        finally:
+            await engine.dispose()
+    return {"rows": batches * 6, "chunk_rows": exporter.EXPORT_CHUNK_SIZE, **results}
+
+
+async def analytics_rebuild(client) -> dict:
+    """Полный пересчет агрегатов отклонений из логов дозирования"""
+    from backend.analytics import rebuild_rollups
+    from backend.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        samples = await rebuild_rollups(db)
+        await db.commit()
+    elapsed = time.perf_counter() - started
+    return {"samples": samples, "rebuild_ms": round(elapsed * 1000, 1), "samples_per_sec": round(samples / elapsed)}
+
+
+def _synthetic_database(path: str, batches: int, logs_per_batch: int) -> None:
+    """Отдельная база SQLite: `batches` партий (по 4 на заказ), логи дозирования и контроль качества.
+
+    Строки генерирует сама SQLite (рекурсивный CTE), поэтому миллион партий
+    создается за секунды; после заполнения собирается статистика (ANALYZE).
+    """
+    from sqlalchemy import create_engine, insert, text
+
+    from backend.models import Base, Recipe
+    from benchmarks.beton.seed import EXTRA_RECIPES
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    numbers = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count) "
+    # Одна партия в 30 сек; 1% партий активны, 2% запланированы, заказы последних суток ожидают
+    statements = (
+        ("orders", batches // 4, """
+            INSERT INTO orders (id, order_number, concrete_grade, volume_m3, status, recipe_id, customer_name, created_at)
+            SELECT i, 'SYN-' || i, 'B25', 12, CASE WHEN i > :count - 720 THEN 'PENDING' ELSE 'COMPLETED' END,
+                   1 + i % :recipes, 'ООО СтройМонтаж', datetime('2024-01-01', '+' || (i * 120) || ' seconds')
+            FROM n"""),
+        ("batches", batches, """
+            INSERT INTO batches (id, batch_number, order_id, recipe_id, volume_m3, status,
+                                 actual_cement_kg, actual_water_kg, deviation_cement_pct, deviation_water_pct, created_at)
+            SELECT i, 'SYN-' || i, 1 + (i - 1) / 4, 1 + (i - 1) / 4 % :recipes, 3,
+                   CASE WHEN i % 100 = 0 THEN 'DOSING' WHEN i % 50 = 0 THEN 'PLANNED' ELSE 'COMPLETED' END,
+                   900 + i % 13, 540 + i % 7, (i % 13 - 6) / 4.0, (i % 7 - 3) / 2.0,
+                   datetime('2024-01-01', '+' || (i * 30) || ' seconds')
+            FROM n"""),
+        ("dosing_logs", batches * logs_per_batch, """
+            INSERT INTO dosing_logs (id, batch_id, component_type, planned_kg, actual_kg, deviation_pct, timestamp)
+            SELECT i, 1 + (i - 1) / :logs, CASE (i - 1) % :logs WHEN 0 THEN 'cement' WHEN 1 THEN 'sand'
+                   WHEN 2 THEN 'gravel' WHEN 3 THEN 'water' WHEN 4 THEN 'additive1' ELSE 'additive2' END,
+                   1000, 1000 + i % 21 - 10, (i % 21 - 10) / 10.0,
+                   datetime('2024-01-01', '+' || ((i - 1) / :logs * 30 + (i - 1) % :logs) || ' seconds')
+            FROM n"""),
+        ("quality_checks", batches // 3, """
+            INSERT INTO quality_checks (id, batch_id, mobility_cm, strength_mpa, status, checked_at)
+            SELECT i, i * 3, 18, 30 + i % 9, CASE WHEN i % 20 = 0 THEN 'PENDING' ELSE 'APPROVED' END,
+                   datetime('2024-01-02', '+' || (i * 90) || ' seconds')
+            FROM n"""),
+        ("warehouse_materials", 10000, """
+            INSERT INTO warehouse_materials (id, material_type, material_name, current_stock_kg, min_stock_kg)
+            SELECT i, 'cement', 'Цемент ' || i, CASE WHEN i % 500 = 0 THEN 100 ELSE 50000 END, 1000
+            FROM n"""),
+    )
+    with engine.begin() as connection:
+        connection.execute(insert(Recipe), [
+            {"id": recipe_id, "name": code, "code": code, "cement_kg": cement, "sand_kg": sand,
+             "gravel_kg": gravel, "water_kg": water, "additive1_kg": additive1}
+            for recipe_id, (code, cement, sand, gravel, water, additive1, _) in enumerate(EXTRA_RECIPES, 1)
+        ])
+        for _, count, sql in statements:
+            connection.execute(text(numbers + sql), {
+                "count": count, "recipes": len(EXTRA_RECIPES), "logs": logs_per_batch,
+            })
+        connection.execute(text("ANALYZE"))
+    engine.dispose()
+
+
+def _plan_problems(table: str, plan: List[str], indexes: tuple) -> List[str]:
+    """Нарушения в плане: полный просмотр или сортировка большой таблицы, ожидаемый индекс не выбран"""
+    problems = []
+    for step in plan:
+        if step in (f"SCAN {table}", f"Seq Scan on {table}") or step.startswith(f"Seq Scan on {table} "):
+            problems.append(f"полный просмотр: {step}")
+        if step == "USE TEMP B-TREE FOR ORDER BY":
+            problems.append("сортировка всей выборки")
+    if not any(index in step for step in plan for index in indexes):
+        problems.append(f"не использован {' или '.join(indexes)}")
+    return problems
+
+
+async def query_plans(client) -> dict:
+    """Регрессия планов: запросы роутеров на QUERY_PLAN_BATCHES партий должны идти по индексам.
+
+    База — отдельная SQLite со схемой из моделей (те же индексы, что в
+    миграциях), база прогона не используется. Запросы строятся так же, как в роутерах (project, paginate, условия
+    частичных индексов). Если хоть один план просматривает большую таблицу
+    целиком или не использует ожидаемый индекс, бенчмарк падает.
+    """
+    import os
+    import tempfile
+
+    from sqlalchemy import func, select, text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from backend.models import (
+        ACTIVE_BATCH_FILTER, LOW_STOCK_FILTER, PENDING_ORDER_FILTER, Batch, BatchStatus, DosingLog,
+        Order, OrderStatus, QualityCheck, QualityStatus, WarehouseMaterial,
+    )
+    from backend.pagination import encode_cursor, paginate
+    from backend.schemas import BatchResponse, OrderResponse, QualityCheckResponse
+    from backend.serialization import project
+
+    cursor = encode_cursor(datetime(2024, 6, 1), 500000)
+
+    def page(query, time_column, id_column, cursor_value=None, skip=0):
+        return paginate(query, time_column, id_column, cursor_value, skip, 100)
+
+    batches = project(Batch, BatchResponse)
+    orders = project(Order, OrderResponse)
+    checks = project(QualityCheck, QualityCheckResponse)
+    # Имя: (запрос, таблица, допустимые индексы)
+    cases = {
+        "batches_page": (page(batches, Batch.created_at, Batch.id), "batches", ("ix_batches_created_at_id",)),
+        "batches_cursor": (
+            page(batches, Batch.created_at, Batch.id, cursor), "batches", ("ix_batches_created_at_id",),
+        ),
+        "batches_by_status": (
+            page(batches.where(Batch.status == BatchStatus.COMPLETED), Batch.created_at, Batch.id),
+            "batches", ("ix_batches_status_created_at",),
+        ),
+        "batches_by_order": (
+            page(batches.where(Batch.order_id == 1000), Batch.created_at, Batch.id),
+            "batches", ("ix_batches_order_id_created_at",),
+        ),
+        "batches_active": (
+            select(func.count()).select_from(Batch).where(ACTIVE_BATCH_FILTER),
+            "batches", ("ix_batches_active_created_at", "ix_batches_status_created_at"),
+        ),
+        "orders_page": (page(orders, Order.created_at, Order.id), "orders", ("ix_orders_created_at_id",)),
+        "orders_by_status": (
+            page(orders.where(Order.status == OrderStatus.COMPLETED), Order.created_at, Order.id),
+            "orders", ("ix_orders_status_created_at",),
+        ),
+        "orders_pending": (
+            select(func.count()).select_from(Order).where(PENDING_ORDER_FILTER),
+            "orders", ("ix_orders_pending_created_at", "ix_orders_status_created_at"),
+        ),
+        "dosing_logs_batch": (
+            select(DosingLog).where(DosingLog.batch_id == 1000).order_by(DosingLog.id),
+            "dosing_logs", ("ix_dosing_logs_batch_id",),
+        ),
+        "quality_page": (
+            page(checks, QualityCheck.checked_at, QualityCheck.id), "quality_checks", ("ix_quality_checks_checked_at_id",),
+        ),
+        "quality_by_status": (
+            page(checks.where(QualityCheck.status == QualityStatus.PENDING), QualityCheck.checked_at, QualityCheck.id),
+            "quality_checks", ("ix_quality_checks_status_checked_at",),
+        ),
+        "quality_by_batch": (
+            select(QualityCheck).where(QualityCheck.batch_id == 3000), "quality_checks", ("(batch_id=",),
+        ),
+        "low_stock": (
+            select(WarehouseMaterial).where(LOW_STOCK_FILTER),
+            "warehouse_materials", ("ix_warehouse_materials_low_stock",),
+        ),
+    }
+
+    plans, failures = {}, []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "plans.db")
+        started = time.perf_counter()
+        await asyncio.to_thread(_synthetic_database, path, QUERY_PLAN_BATCHES, 1)
+        seed_sec = time.perf_counter() - started
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        try:
+            async with engine.connect() as connection:
+                for name, (query, table, indexes) in cases.items():
+                    sql = str(query.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+                    plan = [str(row[-1]) for row in await connection.execute(text("EXPLAIN QUERY PLAN " + sql))]
+                    plans[name] = " | ".join(plan)
+                    failures.extend(f"{name}: {problem} ({plans[name]})" for problem in _plan_problems(table, plan, indexes))
+        finally:
+            await engine.dispose()
+    if failures:
+        raise RuntimeError("Планы запросов без индекса:\n" + "\n".join(failures))
+    return {"batches": QUERY_PLAN_BATCHES, "seed_sec": round(seed_sec, 1), "queries_checked": len(plans), **plans}
+
+
+async def gateway(client) -> dict:
+    """Шлюз оборудования на имитаторах: опросы Modbus без пауз, сообщения MQTT, пакетные сбросы в БД"""
+    from backend.gateway import Gateway
+    from backend.simulators import MqttBroker, ModbusSimulator
+
+    modbus = ModbusSimulator()
+    broker = MqttBroker()
+    modbus_port = await modbus.start()
+    mqtt_port = await broker.start()
+    for unit in range(1, GATEWAY_DEVICES + 1):
+        modbus.set_registers(unit, 0, [1, unit, 0])
+    config = {
+        "modbus": [
+            {
+                "equipment": f"Стенд Modbus {unit}",
+                "equipment_type": "scale",
+                "host": "127.0.0.1",
+                "port": modbus_port,
+                "unit": unit,
+                "status_register": 0,
+                "metrics": {"weight_kg": {"register": 1, "scale": 0.1}, "temperature_c": {"register": 2, "scale": 0.1}},
+                # Без пауз: замеряется пропускная способность, а не расписание
+                "min_interval_ms": 0,
+                "max_interval_ms": 0,
+            }
+            for unit in range(1, GATEWAY_DEVICES + 1)
+        ],
+        "mqtt": [{"host": "127.0.0.1", "port": mqtt_port, "topic_prefix": "beton/equipment/"}],
+    }
+    mqtt_names = [f"Стенд Modbus {unit}" for unit in range(1, GATEWAY_MQTT_DEVICES + 1)]
+    instance = Gateway(config)
+    await instance.start()
+    await asyncio.sleep(0.2)
+
+    async def change():
+        tick = 0
+        while True:
+            tick += 1
+            for unit in range(1, GATEWAY_DEVICES + 1):
+                modbus.set_registers(unit, 1, [unit + tick % 100])
+            for name in mqtt_names:
+                broker.publish(f"beton/equipment/{name}", b'{"readings": {"level_pct": %d}}' % (tick % 100))
+            await asyncio.sleep(0.01)
+
+    changer = asyncio.create_task(change())
+    before = instance.stats()
+    started = time.perf_counter()
+    try:
+        await asyncio.sleep(GATEWAY_SECONDS)
+    finally:
+        changer.cancel()
+        await instance.stop()
+        elapsed = time.perf_counter() - started
+        await modbus.stop()
+        await broker.stop()
+    after = instance.stats()
+    flushes = after["flushes"] - before["flushes"]
+    return {
+        "devices": GATEWAY_DEVICES,
+        "polls_per_sec": round((after["polls"] - before["polls"]) / elapsed),
+        "mqtt_messages_per_sec": round((after["mqtt_messages"] - before["mqtt_messages"]) / elapsed),
+        "readings_written_per_sec": round((after["readings_written"] - before["readings_written"]) / elapsed),
+        "flushes": flushes,
+        "coalesced_updates": after["coalesced"] - before["coalesced"],
+        "flush_errors": after["flush_errors"],
+        "last_flush_ms": after["last_flush_ms"],
+    }
+
+
+def _strength_database(path: str) -> None:
+    """Отдельная база с STRENGTH_BATCHES партиями и прочностью по рецептурам seed"""
+    import random
+
+    from sqlalchemy import create_engine, insert
+
+    from backend.dosing import calc_deviation
+    from backend.models import Base, Batch, BatchStatus, QualityCheck, Recipe
+    from benchmarks.beton.seed import DOSING_SIGMA, EXTRA_RECIPES
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(1)
+    recipes = []
+    with engine.begin() as connection:
+        for recipe_id, (code, cement, sand, gravel, water, additive1, design) in enumerate(EXTRA_RECIPES, 1):
+            per_m3 = {"cement": cement, "sand": sand, "gravel": gravel, "water": water, "additive1": additive1, "additive2": 0}
+            connection.execute(insert(Recipe), [{
+                "id": recipe_id, "name": code, "code": code,
+                **{f"{c}_kg": value for c, value in per_m3.items()},
+            }])
+            recipes.append((recipe_id, per_m3, design))
+        batches, checks = [], []
+        for batch_id in range(1, STRENGTH_BATCHES + 1):
+            recipe_id, per_m3, design = rng.choice(recipes)
+            volume = rng.randrange(4, 13) / 4
+            actual = {c: per_m3[c] * volume * (1 + rng.gauss(0, DOSING_SIGMA[c])) for c in per_m3}
+            deviation = {c: calc_deviation(actual[c], per_m3[c] * volume) for c in per_m3}
+            batches.append({
+                "id": batch_id, "batch_number": f"S{batch_id}", "order_id": 1, "recipe_id": recipe_id,
+                "volume_m3": volume, "status": BatchStatus.COMPLETED,
+                **{f"actual_{c}_kg": value for c, value in actual.items()},
+                **{f"deviation_{c}_pct": deviation[c] for c in ("cement", "sand", "gravel", "water")},
+            })
+            # Как в seed: прочность падает при передозировке воды и растет с цементом
+            strength = design * rng.gauss(1.12, 0.06) * (1 - deviation["water"] / 100) * (1 + deviation["cement"] / 200)
+            checks.append({"id": batch_id, "batch_id": batch_id, "strength_mpa": round(strength, 1)})
+            if len(batches) == 50000:
+                connection.execute(insert(Batch), batches)
+                connection.execute(insert(QualityCheck), checks)
+                batches.clear()
+                checks.clear()
+        if batches:
+            connection.execute(insert(Batch), batches)
+            connection.execute(insert(QualityCheck), checks)
+    engine.dispose()
+
+
+async def strength_model(client) -> dict:
+    """Модель прочности: обучение на STRENGTH_BATCHES синтетических партий, прогноз в процессе и по HTTP"""
+    import os
+    import tempfile
+
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from backend.models import Batch, Recipe
+    from backend.strength import FittedModel, INPUT_FIELDS, train
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "strength.db")
+        await asyncio.to_thread(_strength_database, path)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                started = time.perf_counter()
+                model = await train(db)
+                await db.commit()
+                train_ms = (time.perf_counter() - started) * 1000
+                fitted = FittedModel.from_row(model)
+                recipes = {recipe.id: recipe for recipe in await db.scalars(select(Recipe))}
+                rows = (await db.execute(
+                    select(Batch.recipe_id, *(getattr(Batch, name) for name in INPUT_FIELDS)).limit(10000)
+                )).all()
+        finally:
+            await engine.dispose()
+    items = [(dict(zip(INPUT_FIELDS, row[1:])), recipes[row.recipe_id]) for row in rows]
+    single = _timed(lambda: fitted.predict(*items[0]), 20000)
+    many = _timed(lambda: fitted.predict_many(items), 5)
+
+    # Прогноз по HTTP моделью, обученной на базе прогона
+    headers = await login(client, "technologist")
+    response = await client.post("/api/quality/strength/train", headers=headers)
+    if response.status_code != 200:
+        raise RuntimeError(f"Обучение модели прочности: {response.status_code} {response.text[:200]}")
+    http_train_ms = (await client.get("/api/quality/strength/models", headers=headers, params={"limit": 1})).json()[0]["train_ms"]
+    recipe = next(iter(recipes.values()))
+    payload = {"recipe_id": 1, "volume_m3": 2, **{
+        f"actual_{c}_kg": getattr(recipe, f"{c}_kg") * 2 for c in ("cement", "sand", "gravel", "water", "additive1")
+    }}
+    timings = []
+    for _ in range(200):
+        started = time.perf_counter()
+        await client.post("/api/quality/strength/predict", headers=headers, json=payload)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    bulk = [payload] * STRENGTH_BULK_ITEMS
+    started = time.perf_counter()
+    for _ in range(10):
+        response = await client.post("/api/quality/strength/predict/bulk", headers=headers, json=bulk)
+    bulk_ms = (time.perf_counter() - started) * 1000 / 10
+    return {
+        "batches": model.samples,
+        "train_ms": round(train_ms, 1),
+        "holdout_rmse_mpa": model.holdout_rmse_mpa,
+        "holdout_r2": model.holdout_r2,
+        "predict_us": round(single * 1e6, 2),
+        "predict_many_per_sec": round(len(items) / many),
+        "http_train_ms": http_train_ms,
+        "http_predict_p50_ms": round(percentile(timings, 50), 2),
+        "http_predict_p95_ms": round(percentile(timings, 95), 2),
+        f"http_bulk_{STRENGTH_BULK_ITEMS}_ms": round(bulk_ms, 1),
+    }
+
+
+MICRO = {
+    bench.__name__: bench
+    for bench in (
+        serialization, planner, auth, login_storm, recipe_cache, setpoints, transitions, bulk_dosing, middleware,
+        silo_contention, live_fanout, telemetry, export, analytics_rebuild, query_plans, gateway,
+        strength_model,
+    )
+}
@@ -0,0 +1,262 @@
+"""
+Генератор данных beton: годы заказов, партий, логов дозирования и контроля качества
+
+Данные детерминированы (`--seed`). Строки пишутся массовыми INSERT блоками
+с заранее назначенными id, без ORM, поэтому год производства генерируется за
+секунды. Заказы сегодняшнего дня остаются ожидающими — их берет сценарий
+operator_shift; последние LAB_BACKLOG_DAYS дней без контроля качества —
+очередь сценария lab_entry. Агрегаты аналитики пересчитываются в конце.
+"""
+import asyncio
+import math
+import random
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, List
+
+# Доля партий с записью контроля качества
+QUALITY_SHARE = 0.35
+
+# Последние дни без контроля качества (очередь лаборатории)
+LAB_BACKLOG_DAYS = 3
+
+# Строк в блоке записи
+FLUSH_ROWS = 50000
+
+# Смесители завода
+MIXERS = (("Смеситель №1", 3.0), ("Смеситель №2", 3.0), ("Смеситель №3", 4.5), ("Смеситель №4", 4.5))
+
+# Дополнительные рецептуры: код, цемент, песок, щебень, вода, добавка 1, проектная прочность (МПа)
+EXTRA_RECIPES = (
+    ("B7.5", 220, 800, 1100, 190, 1.0, 9.8),
+    ("B15", 280, 720, 1150, 185, 1.5, 19.6),
+    ("B20", 320, 680, 1180, 180, 2.0, 26.2),
+    ("B30", 400, 620, 1180, 175, 3.0, 39.3),
+    ("B35", 440, 600, 1160, 170, 3.5, 45.8),
+    ("B40", 480, 580, 1140, 165, 4.0, 52.4),
+)
+
+# Разброс дозирования по компонентам (доля от плана)
+DOSING_SIGMA = {"cement": 0.01, "sand": 0.02, "gravel": 0.015, "water": 0.02, "additive1": 0.03, "additive2": 0.03}
+
+# Пополнение склада перед генерацией, чтобы сценарии не уводили остатки в минус (кг)
+STOCK_RECEIPT_KG = 5_000_000
+
+CUSTOMERS = ("ООО СтройМонтаж", "ПИК-Регион", "ЖБИ-3", "АО Мостострой", "ИП Петров", "ГК Самолет")
+
+
+def _ensure_reference_data(db) -> None:
+    """Лаборант, рецептуры и смесители сверх созданных init_db"""
+    from sqlalchemy import select
+
+    from backend import auth
+    from backend.models import EquipmentStatus, Recipe, User, UserRole
+    from benchmarks.beton import USERS
+
+    username, password = USERS["laboratory"]
+    if db.scalar(select(User).where(User.username == username)) is None:
+        db.add(User(
+            username=username,
+            email=f"{username}@beton.ru",
+            full_name="Лаборант",
+            role=UserRole.LABORATORY,
+            hashed_password=auth.get_password_hash(password),
+        ))
+    for code, cement, sand, gravel, water, additive, _ in EXTRA_RECIPES:
+        if db.scalar(select(Recipe).where(Recipe.code == code)) is None:
+            db.add(Recipe(
+                name=f"Бетон {code}", code=code, cement_kg=cement, sand_kg=sand, gravel_kg=gravel,
+                water_kg=water, additive1_kg=additive, mixing_time_sec=120, discharge_time_sec=60,
+                is_gost=True,
+            ))
+    for name, capacity in MIXERS:
+        if db.scalar(select(EquipmentStatus).where(EquipmentStatus.equipment_name == name)) is None:
+            db.add(EquipmentStatus(
+                equipment_name=name, equipment_type="mixer", status="idle", capacity_m3=capacity,
+            ))
+    db.commit()
+
+
+def _top_up_stock(connection) -> None:
+    from sqlalchemy import insert, select, update
+
+    from backend.models import StockMovement, WarehouseMaterial
+
+    now = datetime.now().replace(microsecond=0)
+    for material_id, in connection.execute(select(WarehouseMaterial.id)).all():
+        connection.execute(
+            update(WarehouseMaterial)
+            .where(WarehouseMaterial.id == material_id)
+            .values(current_stock_kg=WarehouseMaterial.current_stock_kg + STOCK_RECEIPT_KG)
+        )
+        connection.execute(insert(StockMovement).values(
+            material_id=material_id, quantity_kg=STOCK_RECEIPT_KG, reason="receipt",
+            comment="Пополнение для бенчмарков", created_at=now,
+        ))
+
+
+async def _rebuild_rollups() -> int:
+    from backend.analytics import rebuild_rollups
+    from backend.database import AsyncSessionLocal, async_engine, async_writer_engine
+
+    async with AsyncSessionLocal() as db:
+        total = await rebuild_rollups(db)
+        await db.commit()
+    await async_engine.dispose()
+    if async_writer_engine is not None:
+        await async_writer_engine.dispose()
+    return total
+
+
+def seed(years: float = 1.0, orders_per_day: int = 60, seed: int = 1, progress: Callable[[str], None] = print) -> dict:
+    """Заполняет базу из DATABASE_URL; возвращает число созданных строк по таблицам"""
+    from sqlalchemy import func, insert, select, text
+
+    from backend.database import SessionLocal, engine
+    from backend.dosing import DEVIATION_COMPONENTS, DOSING_COMPONENTS, calc_deviation
+    from backend.init_db import init_db
+    from backend.models import (
+        Batch, BatchStatus, DosingLog, EquipmentStatus, Order, OrderStatus,
+        QualityCheck, QualityStatus, Recipe, User,
+    )
+
+    init_db()
+    with SessionLocal() as db:
+        _ensure_reference_data(db)
+        recipes = db.scalars(select(Recipe).where(Recipe.is_active.is_(True)).order_by(Recipe.id)).all()
+        mixers = db.scalars(
+            select(EquipmentStatus.id).where(EquipmentStatus.equipment_type == "mixer").order_by(EquipmentStatus.id)
+        ).all()
+        creator_id = db.scalar(select(User.id).where(User.username == "operator"))
+        lab_id = db.scalar(select(User.id).where(User.username == "laboratory"))
+        next_ids = {
+            model: (db.scalar(select(func.max(model.id))) or 0)
+            for model in (Order, Batch, DosingLog, QualityCheck)
+        }
+
+    strength = {code: design for code, *_, design in EXTRA_RECIPES}
+    plans = [
+        (
+            recipe.id,
+            recipe.code,
+            {c: getattr(recipe, f"{c}_kg") or 0 for c in DOSING_COMPONENTS},
+            (recipe.mixing_time_sec or 120) + (recipe.discharge_time_sec or 60) + 60,
+            strength.get(recipe.code, 32.7),
+        )
+        for recipe in recipes
+    ]
+
+    rng = random.Random(seed)
+    days = int(years * 365)
+    today = date.today()
+    counts = {"orders": 0, "batches": 0, "dosing_logs": 0, "quality_checks": 0}
+    rows: Dict[type, List[dict]] = {Order: [], Batch: [], DosingLog: [], QualityCheck: []}
+
+    def flush(connection):
+        for model in (Order, Batch, DosingLog, QualityCheck):
+            if rows[model]:
+                connection.execute(insert(model), rows[model])
+                rows[model].clear()
+
+    with engine.begin() as connection:
+        _top_up_stock(connection)
+
+    for offset in range(days, -1, -1):
+        day = today - timedelta(days=offset)
+        lab_backlog = offset < LAB_BACKLOG_DAYS
+        for _ in range(max(int(rng.gauss(orders_per_day, orders_per_day * 0.15)), 0)):
+            next_ids[Order] += 1
+            order_id = next_ids[Order]
+            recipe_id, code, per_m3, cycle_sec, design = rng.choice(plans)
+            planned_time = datetime.combine(day, time(6)) + timedelta(minutes=rng.randrange(16 * 60))
+            volume = rng.randrange(4, 25) / 2
+            rows[Order].append({
+                "id": order_id,
+                "order_number": f"ORD-{day:%Y%m%d}-{order_id:08d}",
+                "concrete_grade": code,
+                "volume_m3": volume,
+                "planned_time": planned_time,
+                "status": OrderStatus.PENDING if offset == 0 else OrderStatus.COMPLETED,
+                "recipe_id": recipe_id,
+                "created_by": creator_id,
+                "customer_name": rng.choice(CUSTOMERS),
+                "delivery_address": f"ул. Строителей, {rng.randrange(1, 200)}",
+                "vehicle_number": f"А{rng.randrange(100, 999)}ВС{rng.randrange(10, 199)}",
+                "created_at": planned_time - timedelta(days=1),
+                "completed_at": None if offset == 0 else planned_time + timedelta(hours=2),
+            })
+            counts["orders"] += 1
+            if offset == 0:
+                continue
+
+            parts = math.ceil(volume / 3)
+            started = planned_time
+            for _ in range(parts):
+                next_ids[Batch] += 1
+                batch_id = next_ids[Batch]
+                part = round(volume / parts, 3)
+                completed = started + timedelta(seconds=cycle_sec)
+                planned = {c: per_m3[c] * part for c in DOSING_COMPONENTS}
+                actual = {
+                    c: round(planned[c] * (1 + rng.gauss(0, DOSING_SIGMA[c])), 2) if planned[c] else 0
+                    for c in DOSING_COMPONENTS
+                }
+                deviation = {c: calc_deviation(actual[c], planned[c]) for c in DOSING_COMPONENTS}
+                batch = {
+                    "id": batch_id,
+                    "batch_number": f"BATCH-{day:%Y%m%d}-{batch_id:08X}",
+                    "order_id": order_id,
+                    "recipe_id": recipe_id,
+                    "volume_m3": part,
+                    "status": BatchStatus.COMPLETED,
+                    "mixer_id": rng.choice(mixers) if mixers else None,
+                    "planned_start": started,
+                    "planned_end": completed,
+                    "started_at": started,
+                    "completed_at": completed,
+                    "created_at": started - timedelta(hours=1),
+                }
+                batch.update({f"actual_{c}_kg": actual[c] for c in DOSING_COMPONENTS})
+                batch.update({f"deviation_{c}_pct": deviation[c] for c in DEVIATION_COMPONENTS})
+                rows[Batch].append(batch)
+                for c in DOSING_COMPONENTS:
+                    if planned[c] > 0:
+                        next_ids[DosingLog] += 1
+                        rows[DosingLog].append({
+                            "id": next_ids[DosingLog],
+                            "batch_id": batch_id,
+                            "component_type": c,
+                            "planned_kg": planned[c],
+                            "actual_kg": actual[c],
+                            "deviation_pct": deviation[c],
+                            "timestamp": started + timedelta(seconds=30),
+                        })
+                        counts["dosing_logs"] += 1
+                if not lab_backlog and rng.random() < QUALITY_SHARE:
+                    # Прочность хуже при передозировке воды
+                    value = design * rng.gauss(1.12, 0.06) * (1 - deviation["water"] / 100)
+                    next_ids[QualityCheck] += 1
+                    rows[QualityCheck].append({
+                        "id": next_ids[QualityCheck],
+                        "batch_id": batch_id,
+                        "mobility_cm": round(rng.uniform(14, 20), 1),
+                        "strength_mpa": round(value, 1),
+                        "moisture_pct": round(rng.uniform(3, 6), 1),
+                        "status": QualityStatus.APPROVED if value >= design else QualityStatus.REJECTED,
+                        "checked_by": lab_id,
+                        "checked_at": completed + timedelta(hours=rng.randrange(1, 48)),
+                    })
+                    counts["quality_checks"] += 1
+                counts["batches"] += 1
+                started = completed
+
+        if sum(len(batch) for batch in rows.values()) >= FLUSH_ROWS or offset == 0:
+            with engine.begin() as connection:
+                flush(connection)
+            progress(f"{day}: заказов {counts['orders']}, партий {counts['batches']}, логов {counts['dosing_logs']}")
+
+    progress("Пересчет агрегатов аналитики...")
+    counts["rollup_samples"] = asyncio.run(_rebuild_rollups())
+    with engine.begin() as connection:
+        if engine.dialect.name in ("sqlite", "postgresql"):
+            connection.execute(text("ANALYZE"))
+    return counts
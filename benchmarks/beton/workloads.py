@@ -0,0 +1,209 @@
+"""
+Сценарии нагрузки beton
+
+- operator_shift — оператор ведет заказ через весь цикл партии;
+- dashboard_wall — экраны цеха опрашивают дашборд и оборудование;
+- lab_entry — лаборант разбирает очередь партий и вводит контроль качества;
+- archive — технолог листает архив, выгружает отчеты и строит аналитику;
+- login_storm — пересменка: непрерывные входы в систему (смешивать с другими
+  сценариями, чтобы видеть, не растет ли время ответа остальных запросов).
+"""
+import uuid
+from datetime import date, datetime, timedelta
+
+from benchmarks.beton import USERS
+from benchmarks.runner import Workload, WorkloadError
+
+# Компоненты рецептуры в параметрах complete-dosing
+DOSING_PARAMS = ("cement", "sand", "gravel", "water", "additive1", "additive2")
+
+SPC_COMPONENTS = ("cement", "sand", "gravel", "water")
+
+
+async def login(client, role: str, recorder=None) -> dict:
+    """Заголовки авторизации пользователя роли"""
+    username, password = USERS[role]
+    payload = {"username": username, "password": password}
+    if recorder is None:
+        response = await client.post("/api/auth/login", json=payload)
+        if response.status_code != 200:
+            raise WorkloadError(f"Вход {username}: {response.status_code} {response.text[:200]}")
+    else:
+        response = await recorder.request(client, "auth.login", "POST", "/api/auth/login", json=payload)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def load_recipes(client, headers: dict) -> list:
+    response = await client.get("/api/recipes/", headers=headers)
+    if response.status_code != 200:
+        raise WorkloadError(f"Рецептуры: {response.status_code}")
+    return [recipe for recipe in response.json() if recipe["is_active"]]
+
+
+def _key() -> str:
+    """Ключ идемпотентности уникален между прогонами на одной базе, поэтому не из rng"""
+    return f"bench-{uuid.uuid4().hex}"
+
+
+class OperatorShift(Workload):
+    name = "operator_shift"
+    description = "Заказ -> партия -> старт -> дозирование -> завершение, списки партий и логи"
+
+    async def setup(self, client):
+        headers = await login(client, "operator")
+        return {"headers": headers, "recipes": await load_recipes(client, headers)}
+
+    async def iteration(self, client, recorder, state, rng):
+        headers = state["headers"]
+        recipe = rng.choice(state["recipes"])
+        volume = rng.randrange(2, 7) / 2
+        order = await recorder.request(client, "orders.create", "POST", "/api/orders/", headers=headers, json={
+            "concrete_grade": recipe["code"],
+            "volume_m3": volume,
+            "recipe_id": recipe["id"],
+            "planned_time": (datetime.now() + timedelta(minutes=rng.randrange(240))).isoformat(timespec="seconds"),
+            "customer_name": "Бенчмарк",
+        })
+        batch = await recorder.request(client, "batches.create", "POST", "/api/batches/", headers=headers, json={
+            "order_id": order.json()["id"], "recipe_id": recipe["id"], "volume_m3": volume,
+        })
+        batch_id = batch.json()["id"]
+        await recorder.request(
+            client, "batches.start", "POST", f"/api/batches/{batch_id}/start",
+            headers={**headers, "Idempotency-Key": _key()},
+        )
+        params = {
+            f"actual_{component}": round((recipe[f"{component}_kg"] or 0) * volume * rng.gauss(1, 0.015), 2)
+            for component in DOSING_PARAMS
+        }
+        await recorder.request(
+            client, "batches.complete_dosing", "POST", f"/api/batches/{batch_id}/complete-dosing",
+            headers={**headers, "Idempotency-Key": _key()}, params=params,
+        )
+        await recorder.request(
+            client, "batches.complete", "POST", f"/api/batches/{batch_id}/complete",
+            headers={**headers, "Idempotency-Key": _key()},
+        )
+        await recorder.request(client, "batches.list", "GET", "/api/batches/", headers=headers, params={"limit": 50})
+        await recorder.request(client, "batches.dosing_logs", "GET", f"/api/batches/{batch_id}/dosing-logs", headers=headers)
+
+
+class DashboardWall(Workload):
+    name = "dashboard_wall"
+    description = "Дашборд с If-None-Match, оборудование, активные партии, низкие остатки"
+
+    async def setup(self, client):
+        return {"headers": await login(client, "technologist"), "etag": None}
+
+    async def iteration(self, client, recorder, state, rng):
+        headers = dict(state["headers"])
+        if state["etag"]:
+            headers["If-None-Match"] = state["etag"]
+        response = await recorder.request(
+            client, "monitoring.dashboard", "GET", "/api/monitoring/dashboard", expected=(200, 304), headers=headers,
+        )
+        state["etag"] = response.headers.get("etag")
+        headers = state["headers"]
+        await recorder.request(client, "monitoring.equipment", "GET", "/api/monitoring/equipment", headers=headers)
+        await recorder.request(
+            client, "batches.list_active", "GET", "/api/batches/", headers=headers,
+            params={"status": rng.choice(("dosing", "mixing")), "limit": 20},
+        )
+        await recorder.request(
+            client, "warehouse.low_stock", "GET", "/api/warehouse/", headers=headers, params={"low_stock_only": True},
+        )
+
+
+class LabEntry(Workload):
+    name = "lab_entry"
+    description = "Очередь завершенных партий по курсору, ввод контроля качества, аналитика отклонений"
+
+    # Доля итераций со входом в систему (пересменка)
+    LOGIN_SHARE = 0.05
+
+    async def setup(self, client):
+        headers = await login(client, "laboratory")
+        recipes = await load_recipes(client, headers)
+        return {"headers": headers, "recipe_codes": [recipe["code"] for recipe in recipes]}
+
+    async def iteration(self, client, recorder, state, rng):
+        if rng.random() < self.LOGIN_SHARE:
+            state["headers"] = await login(client, "laboratory", recorder)
+        headers = state["headers"]
+        params = {"status": "completed", "limit": 50}
+        batches = []
+        for _ in range(rng.randrange(1, 4)):
+            page = await recorder.request(
+                client, "batches.list_completed", "GET", "/api/batches/", headers=headers, params=params,
+            )
+            batches += page.json()
+            cursor = page.headers.get("x-next-cursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+        if batches:
+            batch = rng.choice(batches)
+            # Партия может уже иметь запись контроля: 400 — ожидаемый ответ
+            await recorder.request(client, "quality.create", "POST", "/api/quality/", expected=(200, 400), headers=headers, json={
+                "batch_id": batch["id"],
+                "mobility_cm": round(rng.uniform(14, 20), 1),
+                "strength_mpa": round(rng.uniform(20, 45), 1),
+                "moisture_pct": round(rng.uniform(3, 6), 1),
+            })
+        date_from = (date.today() - timedelta(days=30)).isoformat()
+        await recorder.request(
+            client, "analytics.deviations", "GET", "/api/analytics/deviations", headers=headers,
+            params={"group_by": "recipe,component", "date_from": date_from},
+        )
+        await recorder.request(client, "analytics.spc", "GET", "/api/analytics/spc", headers=headers, params={
+            "recipe_code": rng.choice(state["recipe_codes"]),
+            "component": rng.choice(SPC_COMPONENTS),
+            "date_from": date_from,
+        })
+
+
+class Archive(Workload):
+    name = "archive"
+    description = "Глубокие страницы по курсору и по OFFSET, выгрузка CSV за месяц, аналитика по дням за год"
+
+    PAGE_SIZE = 100
+
+    async def setup(self, client):
+        return {"headers": await login(client, "technologist")}
+
+    async def iteration(self, client, recorder, state, rng):
+        headers = state["headers"]
+        pages = rng.randrange(5, 30)
+        params = {"limit": self.PAGE_SIZE}
+        for _ in range(pages):
+            page = await recorder.request(client, "batches.page_cursor", "GET", "/api/batches/", headers=headers, params=params)
+            cursor = page.headers.get("x-next-cursor")
+            if not cursor:
+                break
+            params["cursor"] = cursor
+        await recorder.request(
+            client, "batches.page_offset", "GET", "/api/batches/", headers=headers,
+            params={"limit": self.PAGE_SIZE, "skip": pages * self.PAGE_SIZE},
+        )
+        month = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=30 * rng.randrange(1, 12))
+        await recorder.download(client, "reports.batches_csv", "/api/reports/batches", headers=headers, params={
+            "date_from": month.isoformat(), "date_to": (month + timedelta(days=30)).isoformat(), "format": "csv",
+        })
+        await recorder.request(
+            client, "analytics.deviations_by_day", "GET", "/api/analytics/deviations", headers=headers,
+            params={"group_by": "day", "date_from": (date.today() - timedelta(days=365)).isoformat()},
+        )
+
+
+class LoginStorm(Workload):
+    name = "login_storm"
+    description = "Вход в систему операторов и лаборантов без пауз"
+
+    async def iteration(self, client, recorder, state, rng):
+        await login(client, rng.choice(("operator", "laboratory")), recorder)
+
+
+WORKLOADS = {
+    workload.name: workload
+    for workload in (OperatorShift, DashboardWall, LabEntry, Archive, LoginStorm)
+}
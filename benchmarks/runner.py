@@ -0,0 +1,306 @@
+"""
+Общая часть прогонов: виртуальные пользователи, замеры и сравнение с базовой линией
+
+Сценарий (workload) — класс с `setup(client)` и `iteration(client, recorder,
+state, rng)`. Каждый виртуальный пользователь крутит итерации своего сценария
+до конца прогона; время каждой операции пишет `Recorder`. Операции
+называются `<роутер>.<действие>`, поэтому регрессия видна по роутеру.
+"""
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+# Допустимое ухудшение p95 и пропускной способности относительно базовой линии
+DEFAULT_TOLERANCE = 0.25
+
+# Операции с меньшим числом замеров не сравниваются: слишком шумно
+MIN_SAMPLES = 20
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class WorkloadError(Exception):
+    """Неожиданный ответ: итерация сценария прерывается"""
+
+
+class Workload:
+    """Сценарий виртуального пользователя"""
+    name = ""
+    description = ""
+
+    async def setup(self, client: httpx.AsyncClient):
+        """Общее состояние пользователей сценария (токены, id); не замеряется"""
+        return None
+
+    async def iteration(self, client: httpx.AsyncClient, recorder: "Recorder", state, rng: random.Random):
+        raise NotImplementedError
+
+
+class Recorder:
+    """Время операций (мс) и ошибки"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        name: str,
+        method: str,
+        url: str,
+        expected: Iterable[int] = (200,),
+        **kwargs,
+    ) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.samples[name].append((time.perf_counter() - started) * 1000)
+            self.errors[name] += 1
+            raise
+        self.samples[name].append((time.perf_counter() - started) * 1000)
+        if response.status_code not in expected:
+            self.errors[name] += 1
+            raise WorkloadError(f"{name}: {response.status_code} {response.text[:200]}")
+        return response
+
+    async def download(self, client: httpx.AsyncClient, name: str, url: str, **kwargs) -> int:
+        """Потоковая загрузка целиком; время — до последнего байта. Возвращает размер"""
+        started = time.perf_counter()
+        size = 0
+        async with client.stream("GET", url, **kwargs) as response:
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+        self.samples[name].append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            self.errors[name] += 1
+            raise WorkloadError(f"{name}: {response.status_code}")
+        return size
+
+
+def parse_workloads(spec: str, registry: Dict[str, type]) -> List[Tuple[Workload, int]]:
+    """`operator_shift:4,dashboard_wall:16` -> [(сценарий, пользователей)]"""
+    result = []
+    for part in filter(None, (item.strip() for item in spec.split(","))):
+        name, _, users = part.partition(":")
+        if name not in registry:
+            raise SystemExit(f"Неизвестный сценарий {name}; доступны: {', '.join(sorted(registry))}")
+        result.append((registry[name](), int(users or 1)))
+    return result
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    workloads: List[Tuple[Workload, int]],
+    duration: float,
+    warmup: float = 0,
+    think_ms: float = 0,
+    seed: int = 1,
+) -> Tuple[Recorder, float]:
+    """Прогон: пользователи всех сценариев параллельно в течение duration секунд"""
+    states = [await workload.setup(client) for workload, _ in workloads]
+
+    async def user(workload: Workload, state, index: int, recorder: Recorder, deadline: float):
+        rng = random.Random(seed * 100003 + index)
+        while time.perf_counter() < deadline:
+            try:
+                await workload.iteration(client, recorder, state, rng)
+            except (WorkloadError, httpx.HTTPError):
+                pass
+            if think_ms:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+
+    async def phase(seconds: float) -> Tuple[Recorder, float]:
+        recorder = Recorder()
+        started = time.perf_counter()
+        deadline = started + seconds
+        index = 0
+        tasks = []
+        for (workload, users), state in zip(workloads, states):
+            for _ in range(users):
+                tasks.append(user(workload, state, index, recorder, deadline))
+                index += 1
+        await asyncio.gather(*tasks)
+        return recorder, time.perf_counter() - started
+
+    if warmup > 0:
+        await phase(warmup)
+    return await phase(duration)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по рангу (values отсортированы)"""
+    if not values:
+        return 0.0
+    return values[max(math.ceil(q / 100 * len(values)), 1) - 1]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    operations = {}
+    for name, values in sorted(recorder.samples.items()):
+        values = sorted(values)
+        stats = {
+            "count": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values), 3),
+            "max_ms": round(values[-1], 3),
+        }
+        stats.update({f"p{q}_ms": round(percentile(values, q), 3) for q in PERCENTILES})
+        operations[name] = stats
+    total = sum(stats["count"] for stats in operations.values())
+    return {
+        "duration_sec": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "errors": sum(stats["errors"] for stats in operations.values()),
+        "operations": operations,
+    }
+
+
+def environment() -> dict:
+    """Где и на чем снят результат: без этого сравнивать цифры бессмысленно"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def baseline_path(target: str, kind: str, name: Optional[str] = None) -> Path:
+    if name and (name.endswith(".json") or "/" in name):
+        return Path(name)
+    return BASELINES_DIR / f"{target}-{kind}{'-' + name if name else ''}.json"
+
+
+def save_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2, default=str) + "\n", encoding="utf-8")
+
+
+def load_json(path: Path) -> dict:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def _error_rate(stats: dict) -> float:
+    return stats["errors"] / stats["count"] if stats["count"] else 0.0
+
+
+def compare_load(result: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[dict]:
+    """Сравнение прогона с базовой линией по операциям: p95, доля ошибок и общий rps"""
+    rows = []
+    for name, base in sorted(baseline["operations"].items()):
+        current = result["operations"].get(name)
+        if current is None:
+            rows.append({"name": name, "regression": True, "reason": "операция не выполнялась"})
+            continue
+        if base["count"] < MIN_SAMPLES or current["count"] < MIN_SAMPLES:
+            continue
+        change = current["p95_ms"] / max(base["p95_ms"], 0.001) - 1
+        errors = _error_rate(current) - _error_rate(base)
+        reasons = []
+        if change > tolerance:
+            reasons.append(f"p95 +{change:.0%}")
+        if errors > 0.01:
+            reasons.append(f"ошибки +{errors:.1%}")
+        rows.append({
+            "name": name,
+            "baseline": base["p95_ms"],
+            "current": current["p95_ms"],
+            "change": change,
+            "regression": bool(reasons),
+            "reason": ", ".join(reasons),
+        })
+    change = result["rps"] / max(baseline["rps"], 0.001) - 1
+    rows.append({
+        "name": "всего, rps",
+        "baseline": baseline["rps"],
+        "current": result["rps"],
+        "change": change,
+        "regression": change < -tolerance,
+        "reason": f"rps {change:.0%}" if change < -tolerance else "",
+    })
+    return rows
+
+
+def compare_micro(result: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[dict]:
+    """Сравнение микробенчмарков: *_per_sec — больше лучше, *_ms и *_us — меньше лучше"""
+    rows = []
+    for bench, base_metrics in sorted(baseline["results"].items()):
+        metrics = result["results"].get(bench)
+        if metrics is None:
+            continue
+        for key, base in sorted(base_metrics.items()):
+            current = metrics.get(key)
+            if not isinstance(base, (int, float)) or not isinstance(current, (int, float)) or not base:
+                continue
+            if key.endswith("_per_sec"):
+                change = current / base - 1
+                regression = change < -tolerance
+            elif key.endswith(("_ms", "_us")):
+                change = current / base - 1
+                regression = change > tolerance
+            else:
+                continue
+            rows.append({
+                "name": f"{bench}.{key}",
+                "baseline": base,
+                "current": current,
+                "change": change,
+                "regression": regression,
+                "reason": f"{change:+.0%}" if regression else "",
+            })
+    return rows
+
+
+def print_load(result: dict):
+    print(f"\n{result['target']}: {result['workloads']}, {result['duration_sec']} сек, "
+          f"{result['requests']} запросов, {result['rps']} rps, ошибок {result['errors']}")
+    print(f"{'операция':<36}{'кол-во':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'ошибки':>8}")
+    for name, stats in result["operations"].items():
+        print(f"{name:<36}{stats['count']:>8}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+              f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}{stats['errors']:>8}")
+
+
+def print_micro(result: dict):
+    for bench, metrics in result["results"].items():
+        print(f"\n{bench}")
+        for key, value in metrics.items():
+            print(f"  {key:<40} {value}")
+
+
+def print_comparison(rows: List[dict], tolerance: float) -> bool:
+    """Печатает сравнение; True, если есть регрессии"""
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\nСравнение с базовой линией (допуск {tolerance:.0%}):")
+    for row in rows:
+        mark = "РЕГРЕССИЯ" if row["regression"] else ""
+        if "change" in row:
+            print(f"  {row['name']:<48}{row['baseline']:>12.3f}{row['current']:>12.3f}{row['change']:>+9.0%}  {mark} {row['reason']}")
+        else:
+            print(f"  {row['name']:<48}{'':>33}  {mark} {row['reason']}")
+    print(f"Регрессий: {len(regressions)}")
+    return bool(regressions)
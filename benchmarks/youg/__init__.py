@@ -0,0 +1,60 @@
+"""
+Бенчмарки youg: генератор данных, сценарии Kanban и микробенчмарки журнала
+
+youg хранит данные в памяти, а на диск пишет снимок `data/database.json`
+и журнал изменений относительно текущего каталога. Прогон идет в отдельном
+рабочем каталоге (по умолчанию benchmarks/data/youg), поэтому данные
+разработчика не затрагиваются; `configure()` должен выполниться до импорта
+`main`.
+"""
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Iterable, Optional
+
+YOUG_DIR = Path(__file__).resolve().parents[2] / "youg" / "backend"
+
+DEFAULT_WORKDIR = Path(__file__).resolve().parents[1] / "data" / "youg"
+
+
+def configure(workdir: Optional[str] = None, env: Iterable[str] = ()):
+    """Рабочий каталог с данными и переменные окружения (KEY=VALUE из --env) до импорта main"""
+    if "main" in sys.modules:
+        raise RuntimeError("main уже импортирован: окружение не применится")
+    path = Path(workdir) if workdir else DEFAULT_WORKDIR
+    (path / "data").mkdir(parents=True, exist_ok=True)
+    os.chdir(path)
+    for item in env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+    if str(YOUG_DIR) not in sys.path:
+        sys.path.insert(0, str(YOUG_DIR))
+
+
+@asynccontextmanager
+async def open_app():
+    """Приложение youg; при выходе журнал сворачивается в снимок"""
+    from main import app
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+def server_stats() -> dict:
+    """Состояние процесса после прогона: записи в журнал по маршрутам, объем данных"""
+    import main
+    from metrics import route_metrics
+
+    routes = {}
+    for (method, route), metrics in sorted(route_metrics.items()):
+        count = metrics.latency_ms.count
+        if count:
+            routes[f"{method} {route}"] = {
+                "requests": count,
+                "journal_writes_per_request": round(metrics.journal_writes.total / count, 2),
+                "journal_ms_per_request": round(metrics.journal_ms / count, 3),
+            }
+    return {
+        "routes": routes,
+        "collections": {name: len(store) for name, store in main.get_collections().items()},
+    }
@@ -0,0 +1,113 @@
+"""
+Микробенчмарки youg: журнал изменений, снимок и выборка доски из индекса
+"""
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+# Записей в замере журнала
+JOURNAL_RECORDS = 20000
+
+# Размеры данных (задач) для задержки изменения при работающем потоке снимков
+JOURNAL_SWEEP_TASKS = (1_000, 10_000, 100_000, 1_000_000)
+# Минимум изменений на размер и пауза между ними (сек); замер идет, пока
+# фоновый поток не допишет хотя бы один снимок
+JOURNAL_SWEEP_MUTATIONS = 2000
+JOURNAL_SWEEP_INTERVAL = 0.001
+
+
+def _mutation_latency(workdir: Path, task, size: int) -> dict:
+    """Задержка изменения (запись в словарь + журнал) на size задачах, пока поток пишет снимки"""
+    from storage import JournalStorage
+
+    class TimedStorage(JournalStorage):
+        def snapshot(self):
+            started = time.perf_counter()
+            super().snapshot()
+            self.snapshots.append(time.perf_counter() - started)
+
+    # Один объект задачи под разными ключами: снимок сериализует каждую запись,
+    # а память на миллион задач не нужна
+    tasks = {f"{task.id}-{i}": task for i in range(size)}
+    keys = list(tasks)
+    storage = TimedStorage(workdir / f"sweep{size}.json", lambda: {"tasks": tasks},
+                           snapshot_delay=0.05, max_snapshot_delay=0.2)
+    storage.snapshots = []
+    storage.start()
+    latencies = []
+    while len(latencies) < JOURNAL_SWEEP_MUTATIONS or not storage.snapshots:
+        key = keys[len(latencies) % size]
+        started = time.perf_counter()
+        tasks[key] = task
+        storage.record("tasks", key, task)
+        latencies.append(time.perf_counter() - started)
+        time.sleep(JOURNAL_SWEEP_INTERVAL)
+    snapshots = list(storage.snapshots)
+    storage.close()
+    latencies.sort()
+    return {
+        f"tasks_{size}_p50_us": round(statistics.median(latencies) * 1e6, 1),
+        f"tasks_{size}_p99_us": round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+        f"tasks_{size}_max_ms": round(latencies[-1] * 1000, 2),
+        f"tasks_{size}_mutations": len(latencies),
+        f"tasks_{size}_snapshots": len(snapshots),
+        f"tasks_{size}_snapshot_ms": round(statistics.mean(snapshots) * 1000, 1),
+    }
+
+
+async def journal(client) -> dict:
+    """Дописывание изменений задач в журнал (без fsync и с fsync) и задержка
+    изменения в зависимости от объема данных при работающем потоке снимков"""
+    import main
+    from storage import JournalStorage
+
+    task = next(iter(main.tasks_db.values()))
+    result = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for fsync, records in ((False, JOURNAL_RECORDS), (True, 200)):
+            storage = JournalStorage(Path(workdir) / f"fsync{int(fsync)}.json", lambda: {}, fsync=fsync)
+            started = time.perf_counter()
+            for _ in range(records):
+                storage.record("tasks", task.id, task)
+            elapsed = time.perf_counter() - started
+            storage.close()
+            result[f"{'fsync' if fsync else 'append'}_records_per_sec"] = round(records / elapsed)
+        for size in JOURNAL_SWEEP_TASKS:
+            result.update(_mutation_latency(Path(workdir), task, size))
+    return result
+
+
+async def snapshot(client) -> dict:
+    """Полный снимок всех коллекций (его пишет фоновый поток после паузы в изменениях)"""
+    import main
+
+    started = time.perf_counter()
+    main.storage.snapshot()
+    elapsed = time.perf_counter() - started
+    return {
+        "tasks": len(main.tasks_db),
+        "snapshot_ms": round(elapsed * 1000, 1),
+        "size_mb": round(main.DATA_FILE.stat().st_size / 2 ** 20, 1),
+    }
+
+
+async def board_tasks(client) -> dict:
+    """Задачи самой большой доски: индекс и сортировка против ответа API целиком"""
+    import main
+
+    board_id = max(main.boards_db, key=lambda board: len(main.tasks_by_board.get_board(board)))
+    size = len(main.tasks_by_board.get_board(board_id))
+    repeat = 20
+    started = time.perf_counter()
+    for _ in range(repeat):
+        sorted((main.tasks_db[tid] for tid in main.tasks_by_board.get_board(board_id)), key=lambda task: task.position)
+    lookup = (time.perf_counter() - started) / repeat
+    started = time.perf_counter()
+    for _ in range(3):
+        await client.get(f"/api/boards/{board_id}/tasks")
+    response = (time.perf_counter() - started) / 3
+    return {"tasks": size, "index_sort_ms": round(lookup * 1000, 3), "response_ms": round(response * 1000, 1)}
+
+
+MICRO = {bench.__name__: bench for bench in (journal, snapshot, board_tasks)}
@@ -0,0 +1,141 @@
+"""
+Генератор данных youg: крупные компании, проекты, доски и задачи
+
+Снимок `data/database.json` пишется напрямую в формате JournalStorage
+(`_meta.seq` = 0), журналы рабочего каталога удаляются. Размер досок
+распределен по Парето: несколько досок на десятки тысяч задач и длинный
+хвост маленьких — так ведут себя реальные трекеры.
+"""
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+COLUMNS = ["todo", "in_progress", "review", "done"]
+
+# Доля задач по колонкам
+COLUMN_WEIGHTS = [0.3, 0.15, 0.1, 0.45]
+
+PRIORITIES = ["low", "medium", "high"]
+
+TAGS = ["backend", "frontend", "bug", "design", "docs", "infra", "qa", "research"]
+
+# Пользователей, проектов и досок на компанию
+USERS_PER_COMPANY = 50
+PROJECTS_PER_COMPANY = 10
+BOARDS_PER_PROJECT = 3
+
+
+def seed(companies: int = 20, tasks: int = 500000, seed: int = 1, progress: Callable[[str], None] = print) -> dict:
+    """Пишет снимок в data/ текущего каталога; возвращает размеры коллекций"""
+    rng = random.Random(seed)
+
+    def new_id() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    started = datetime(2024, 1, 1)
+
+    def stamp(days: float) -> str:
+        return (started + timedelta(days=days)).isoformat()
+
+    data = {name: {} for name in ("users", "companies", "projects", "roles", "project_members", "boards", "tasks")}
+    boards = []
+    for c in range(companies):
+        company_id = new_id()
+        users = []
+        for u in range(USERS_PER_COMPANY):
+            user_id = new_id()
+            users.append(user_id)
+            data["users"][user_id] = {
+                "id": user_id,
+                "email": f"user{u}@company{c}.example",
+                "username": f"c{c}u{u}",
+                "full_name": f"Сотрудник {u} компании {c}",
+                "role": "admin" if u == 0 else "manager" if u < 5 else "member",
+                "company_id": company_id,
+                "avatar": None,
+                "is_active": True,
+                "created_at": stamp(c),
+            }
+        data["companies"][company_id] = {
+            "id": company_id,
+            "name": f"Компания {c}",
+            "description": "",
+            "owner_id": users[0],
+            "members_count": len(users),
+            "created_at": stamp(c),
+        }
+        for p in range(PROJECTS_PER_COMPANY):
+            project_id = new_id()
+            data["projects"][project_id] = {
+                "id": project_id,
+                "name": f"Проект {p}",
+                "description": "",
+                "company_id": company_id,
+                "owner_id": users[0],
+                "status": "active",
+                "color": "#3498db",
+                "created_at": stamp(c),
+                "updated_at": stamp(c),
+            }
+            for user_id in rng.sample(users, 10):
+                member_id = new_id()
+                data["project_members"][member_id] = {
+                    "id": member_id,
+                    "project_id": project_id,
+                    "user_id": user_id,
+                    "role": "owner" if user_id == users[0] else "member",
+                    "joined_at": stamp(c),
+                }
+            for b in range(BOARDS_PER_PROJECT):
+                board_id = new_id()
+                data["boards"][board_id] = {
+                    "id": board_id,
+                    "name": f"Доска {b}",
+                    "description": "",
+                    "project_id": project_id,
+                    "created_by": users[0],
+                    "created_at": stamp(c),
+                    "columns": COLUMNS,
+                }
+                boards.append((board_id, users))
+
+    weights = [rng.paretovariate(1.2) for _ in boards]
+    positions = {}
+    for index in range(tasks):
+        board_id, users = rng.choices(boards, weights)[0]
+        status = rng.choices(COLUMNS, COLUMN_WEIGHTS)[0]
+        position = positions.get((board_id, status), 0)
+        positions[(board_id, status)] = position + 1
+        assignee = rng.choice(users)
+        task_id = new_id()
+        created = stamp(rng.uniform(30, 900))
+        data["tasks"][task_id] = {
+            "id": task_id,
+            "title": f"Задача {index}",
+            "description": "Описание задачи для нагрузочного теста",
+            "status": status,
+            "priority": rng.choice(PRIORITIES),
+            "board_id": board_id,
+            "assignee_id": assignee,
+            "assignee": data["users"][assignee]["full_name"],
+            "created_by": users[0],
+            "created_at": created,
+            "updated_at": created,
+            "position": position,
+            "tags": rng.sample(TAGS, rng.randrange(3)),
+            "due_date": None,
+        }
+        if (index + 1) % 100000 == 0:
+            progress(f"задач: {index + 1}")
+
+    data_dir = Path("data")
+    data_dir.mkdir(exist_ok=True)
+    for journal in ("database.journal", "database.journal.prev"):
+        (data_dir / journal).unlink(missing_ok=True)
+    data["_meta"] = {"seq": 0}
+    with open(data_dir / "database.json", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    return {name: len(items) for name, items in data.items() if name != "_meta"}
@@ -0,0 +1,75 @@
+"""
+Сценарии нагрузки youg
+
+- kanban_drag — шторм перетаскиваний: смена колонки и позиции задач, изредка новые задачи;
+- board_view — открытие доски целиком, проекты компании и участники проекта.
+"""
+from benchmarks.runner import Workload, WorkloadError
+
+COLUMNS = ("todo", "in_progress", "review", "done")
+
+# Досок в выборке сценария (задачи загружаются в setup, не замеряются)
+SAMPLE_BOARDS = 30
+
+
+async def load_boards(client, rng_seed: int = 1) -> dict:
+    """Выборка досок с id их задач: {board_id: {"project_id": ..., "tasks": [...]}}"""
+    import random
+
+    response = await client.get("/api/boards")
+    if response.status_code != 200:
+        raise WorkloadError(f"Доски: {response.status_code}")
+    boards = response.json()
+    sample = random.Random(rng_seed).sample(boards, min(SAMPLE_BOARDS, len(boards)))
+    result = {}
+    for board in sample:
+        tasks = await client.get(f"/api/boards/{board['id']}/tasks")
+        if tasks.status_code != 200:
+            raise WorkloadError(f"Задачи доски: {tasks.status_code}")
+        result[board["id"]] = {"project_id": board["project_id"], "tasks": [task["id"] for task in tasks.json()]}
+    return result
+
+
+class KanbanDrag(Workload):
+    name = "kanban_drag"
+    description = "PATCH статуса и позиции задач на выборке досок, 5% — создание задачи"
+
+    async def setup(self, client):
+        return {"boards": await load_boards(client)}
+
+    async def iteration(self, client, recorder, state, rng):
+        board_id = rng.choice(list(state["boards"]))
+        tasks = state["boards"][board_id]["tasks"]
+        if not tasks or rng.random() < 0.05:
+            response = await recorder.request(client, "tasks.create", "POST", "/api/tasks", json={
+                "title": "Новая задача", "board_id": board_id, "status": rng.choice(COLUMNS),
+            })
+            tasks.append(response.json()["id"])
+            return
+        await recorder.request(client, "tasks.move", "PATCH", f"/api/tasks/{rng.choice(tasks)}", json={
+            "status": rng.choice(COLUMNS), "position": rng.randrange(50),
+        })
+
+
+class BoardView(Workload):
+    name = "board_view"
+    description = "Задачи доски целиком, проекты компании, участники проекта"
+
+    async def setup(self, client):
+        boards = await load_boards(client)
+        projects = (await client.get("/api/projects")).json()
+        companies = {project["id"]: project["company_id"] for project in projects}
+        return {"boards": boards, "companies": companies}
+
+    async def iteration(self, client, recorder, state, rng):
+        board_id = rng.choice(list(state["boards"]))
+        project_id = state["boards"][board_id]["project_id"]
+        await recorder.request(client, "boards.tasks", "GET", f"/api/boards/{board_id}/tasks")
+        await recorder.request(
+            client, "projects.list", "GET", "/api/projects",
+            params={"company_id": state["companies"].get(project_id, "")},
+        )
+        await recorder.request(client, "projects.members", "GET", f"/api/projects/{project_id}/members")
+
+
+WORKLOADS = {workload.name: workload for workload in (KanbanDrag, BoardView)}
@@ -0,0 +1,92 @@
+"""
+Вторичные индексы для хранилищ в памяти
+
+Индексы хранят только id записей и обновляются вместе с хранилищем,
+поэтому выборки по связям стоят O(результата), а не O(всех записей).
+Для каждой записи запоминается значение ключа, под которым она лежит в индексе:
+модели изменяются на месте (setattr), и старый ключ иначе не узнать.
+"""
+from typing import Dict, List, Optional
+
+
+class GroupIndex:
+    """Индекс: значение поля -> id записей (в порядке добавления)"""
+
+    def __init__(self, attr: str):
+        self.attr = attr
+        self._groups: Dict[Optional[str], Dict[str, None]] = {}
+        self._keys: Dict[str, Optional[str]] = {}
+
+    def add(self, item_id: str, item):
+        key = getattr(item, self.attr)
+        self._keys[item_id] = key
+        self._groups.setdefault(key, {})[item_id] = None
+
+    def remove(self, item_id: str):
+        if item_id not in self._keys:
+            return
+        key = self._keys.pop(item_id)
+        group = self._groups[key]
+        del group[item_id]
+        if not group:
+            del self._groups[key]
+
+    def update(self, item_id: str, item):
+        """Переносит запись, если значение поля изменилось"""
+        if self._keys.get(item_id, object()) != getattr(item, self.attr):
+            self.remove(item_id)
+            self.add(item_id, item)
+
+    def get(self, key) -> List[str]:
+        return list(self._groups.get(key, ()))
+
+    def rebuild(self, store: dict):
+        self._groups.clear()
+        self._keys.clear()
+        for item_id, item in store.items():
+            self.add(item_id, item)
+
+
+class BoardTaskIndex:
+    """Индекс задач: доска -> статус -> id задач (в порядке добавления)"""
+
+    def __init__(self):
+        self._boards: Dict[str, Dict[str, Dict[str, None]]] = {}
+        self._keys: Dict[str, tuple] = {}
+
+    def add(self, task_id: str, task):
+        key = (task.board_id, task.status)
+        self._keys[task_id] = key
+        self._boards.setdefault(task.board_id, {}).setdefault(task.status, {})[task_id] = None
+
+    def remove(self, task_id: str):
+        if task_id not in self._keys:
+            return
+        board_id, status = self._keys.pop(task_id)
+        statuses = self._boards[board_id]
+        del statuses[status][task_id]
+        if not statuses[status]:
+            del statuses[status]
+        if not statuses:
+            del self._boards[board_id]
+
+    def update(self, task_id: str, task):
+        """Переносит задачу при смене статуса (перетаскивание в другую колонку)"""
+        if self._keys.get(task_id) != (task.board_id, task.status):
+            self.remove(task_id)
+            self.add(task_id, task)
+
+    def get_board(self, board_id: str) -> List[str]:
+        """Все задачи доски"""
+        statuses = self._boards.get(board_id, {})
+        return [task_id for tasks in statuses.values() for task_id in tasks]
+
+    def count(self, board_id: str, status: str) -> int:
+        """Количество задач в колонке доски"""
+        return len(self._boards.get(board_id, {}).get(status, ()))
+
+    def rebuild(self, tasks: dict):
+        self._boards.clear()
+        self._keys.clear()
+        for task_id, task in tasks.items():
+            self.add(task_id, task)
@@ -1,14 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime
 import uuid
-import json
 import os
 from pathlib import Path
 
+from indexes import BoardTaskIndex, GroupIndex
+from metrics import (
+    PROMETHEUS_CONTENT_TYPE, ProfiledRoute, RequestMetricsMiddleware,
+    observe_journal_write, render_prometheus, slow_requests,
+)
+from storage import JournalStorage
+
 app = FastAPI(title="TeamS Task Tracker API")
+# Обработчики выполняются под профилировщиком, если запрос выбран (PROFILE_SAMPLE_RATE)
+app.router.route_class = ProfiledRoute
 
 # CORS настройки - разрешаем все запросы с фронтенда
 app.add_middleware(
@@ -26,6 +34,9 @@ app.add_middleware(
     max_age=3600,  # Кэширование preflight запросов на 1 час
 )
 
+# Время запросов и записи в журнал по маршрутам (GET /metrics)
+app.add_middleware(RequestMetricsMiddleware)
+
 # ============= МОДЕЛИ ДАННЫХ =============
 
 # Пользователи
@@ -188,6 +199,13 @@ project_members_db = {}
 boards_db = {}
 tasks_db = {}
 
+# Вторичные индексы (обновляются при каждом изменении и после загрузки)
+users_by_company = GroupIndex("company_id")
+projects_by_company = GroupIndex("company_id")
+members_by_project = GroupIndex("project_id")
+boards_by_project = GroupIndex("project_id")
+tasks_by_board = BoardTaskIndex()
+
 # Путь к файлу данных
 DATA_DIR = Path("data")
 DATA_FILE = DATA_DIR / "database.json"
@@ -195,39 +213,60 @@ DATA_FILE = DATA_DIR / "database.json"
 # Создаём директорию для данных, если её нет
 DATA_DIR.mkdir(exist_ok=True)
 
+# Снимок пишется после паузы в изменениях (сек), но не реже MAX_SNAPSHOT_DELAY
+SNAPSHOT_DELAY = float(os.getenv("SNAPSHOT_DELAY", "2"))
+MAX_SNAPSHOT_DELAY = float(os.getenv("MAX_SNAPSHOT_DELAY", "30"))
+# fsync журнала после каждой записи: надёжнее, но медленнее
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "0") == "1"
+
 # ============= ФУНКЦИИ СОХРАНЕНИЯ И ЗАГРУЗКИ =============
 
+def get_collections():
+    """Текущие хранилища по именам коллекций в файле данных"""
+    return {
+        "users": users_db,
+        "companies": companies_db,
+        "projects": projects_db,
+        "roles": roles_db,
+        "project_members": project_members_db,
+        "boards": boards_db,
+        "tasks": tasks_db,
+    }
+
+storage = JournalStorage(
+    DATA_FILE,
+    get_collections,
+    snapshot_delay=SNAPSHOT_DELAY,
+    max_snapshot_delay=MAX_SNAPSHOT_DELAY,
+    fsync=JOURNAL_FSYNC,
+    on_record=observe_journal_write,
+)
+
 def save_data():
-    """Сохраняет все данные в JSON файл"""
+    """Сохраняет полный снимок всех данных в JSON файл"""
     try:
-        data = {
-            "users": {k: v.dict() for k, v in users_db.items()},
-            "companies": {k: v.dict() for k, v in companies_db.items()},
-            "projects": {k: v.dict() for k, v in projects_db.items()},
-            "roles": {k: v.dict() for k, v in roles_db.items()},
-            "project_members": {k: v.dict() for k, v in project_members_db.items()},
-            "boards": {k: v.dict() for k, v in boards_db.items()},
-            "tasks": {k: v.dict() for k, v in tasks_db.items()},
-        }
-        
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
+        storage.snapshot()
         print(f"✅ Данные сохранены: {DATA_FILE}")
     except Exception as e:
         print(f"❌ Ошибка при сохранении данных: {e}")
 
+def rebuild_indexes():
+    """Перестраивает все вторичные индексы по текущим хранилищам"""
+    users_by_company.rebuild(users_db)
+    projects_by_company.rebuild(projects_db)
+    members_by_project.rebuild(project_members_db)
+    boards_by_project.rebuild(boards_db)
+    tasks_by_board.rebuild(tasks_db)
+
 def load_data():
     """Загружает данные из JSON файла"""
     global users_db, companies_db, projects_db, roles_db, project_members_db, boards_db, tasks_db
     
-    if not DATA_FILE.exists():
-        print("ℹ️ Файл данных не найден, будут созданы демо данные")
-        return False
-    
     try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = storage.load()
+        if data is None:
+            print("ℹ️ Файл данных не найден, будут созданы демо данные")
+            return False
         
         # Загружаем данные в соответствующие хранилища
         users_db = {k: User(**v) for k, v in data.get("users", {}).items()}
@@ -237,6 +276,7 @@ def load_data():
         project_members_db = {k: ProjectMember(**v) for k, v in data.get("project_members", {}).items()}
         boards_db = {k: Board(**v) for k, v in data.get("boards", {}).items()}
         tasks_db = {k: Task(**v) for k, v in data.get("tasks", {}).items()}
+        rebuild_indexes()
         
         print(f"✅ Данные загружены из {DATA_FILE}")
         print(f"   👥 Пользователей: {len(users_db)}")
@@ -250,16 +290,33 @@ def load_data():
         print(f"❌ Ошибка при загрузке данных: {e}")
         return False
 
+@app.on_event("shutdown")
+def flush_data():
+    """Сохраняет накопленные изменения при остановке сервера"""
+    storage.close()
+
 @app.get("/")
 def read_root():
     return {"message": "TeamS Task Tracker API", "version": "2.0.0"}
 
+# ============= METRICS ENDPOINTS =============
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Метрики запросов в текстовом формате Prometheus"""
+    return Response(content=render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/api/metrics/slow-requests")
+def get_slow_requests():
+    """Последние медленные запросы: маршрут, время, записи в журнал и профиль"""
+    return slow_requests()
+
 # ============= USERS ENDPOINTS =============
 
 @app.get("/api/users", response_model=List[User])
 def get_users(company_id: Optional[str] = None):
     if company_id:
-        return [user for user in users_db.values() if user.company_id == company_id]
+        return [users_db[uid] for uid in users_by_company.get(company_id)]
     return list(users_db.values())
 
 @app.post("/api/users", response_model=User)
@@ -276,12 +333,14 @@ def create_user(user: UserCreate):
         created_at=now
     )
     users_db[user_id] = new_user
+    users_by_company.add(user_id, new_user)
+    storage.record("users", user_id, new_user)
     
     # Обновляем счетчик членов компании
     if user.company_id and user.company_id in companies_db:
         companies_db[user.company_id].members_count += 1
+        storage.record("companies", user.company_id, companies_db[user.company_id])
     
-    save_data()
     return new_user
 
 @app.get("/api/users/{user_id}", response_model=User)
@@ -302,7 +361,8 @@ def update_user(user_id: str, user_update: UserUpdate):
         setattr(user, field, value)
     
     users_db[user_id] = user
-    save_data()
+    users_by_company.update(user_id, user)
+    storage.record("users", user_id, user)
     return user
 
 @app.delete("/api/users/{user_id}")
@@ -315,9 +375,11 @@ def delete_user(user_id: str):
     # Обновляем счетчик членов компании
     if user.company_id and user.company_id in companies_db:
         companies_db[user.company_id].members_count -= 1
+        storage.record("companies", user.company_id, companies_db[user.company_id])
     
     del users_db[user_id]
-    save_data()
+    users_by_company.remove(user_id)
+    storage.record("users", user_id)
     return {"message": "User deleted successfully"}
 
 # ============= COMPANIES ENDPOINTS =============
@@ -339,7 +401,7 @@ def create_company(company: CompanyCreate):
         created_at=now
     )
     companies_db[company_id] = new_company
-    save_data()
+    storage.record("companies", company_id, new_company)
     return new_company
 
 @app.get("/api/companies/{company_id}", response_model=Company)
@@ -360,7 +422,7 @@ def update_company(company_id: str, company_update: CompanyUpdate):
         setattr(company, field, value)
     
     companies_db[company_id] = company
-    save_data()
+    storage.record("companies", company_id, company)
     return company
 
 @app.delete("/api/companies/{company_id}")
@@ -369,12 +431,14 @@ def delete_company(company_id: str):
         raise HTTPException(status_code=404, detail="Company not found")
     
     # Удаляем все проекты компании
-    projects_to_delete = [pid for pid, p in projects_db.items() if p.company_id == company_id]
+    projects_to_delete = projects_by_company.get(company_id)
     for pid in projects_to_delete:
         del projects_db[pid]
+        projects_by_company.remove(pid)
+        storage.record("projects", pid)
     
     del companies_db[company_id]
-    save_data()
+    storage.record("companies", company_id)
     return {"message": "Company deleted successfully"}
 
 # ============= PROJECTS ENDPOINTS =============
@@ -382,7 +446,7 @@ def delete_company(company_id: str):
 @app.get("/api/projects", response_model=List[Project])
 def get_projects(company_id: Optional[str] = None):
     if company_id:
-        return [p for p in projects_db.values() if p.company_id == company_id]
+        return [projects_db[pid] for pid in projects_by_company.get(company_id)]
     return list(projects_db.values())
 
 @app.post("/api/projects", response_model=Project)
@@ -403,7 +467,8 @@ def create_project(project: ProjectCreate):
         updated_at=now
     )
     projects_db[project_id] = new_project
-    save_data()
+    projects_by_company.add(project_id, new_project)
+    storage.record("projects", project_id, new_project)
     return new_project
 
 @app.get("/api/projects/{project_id}", response_model=Project)
@@ -425,7 +490,7 @@ def update_project(project_id: str, project_update: ProjectUpdate):
     
     project.updated_at = datetime.now().isoformat()
     projects_db[project_id] = project
-    save_data()
+    storage.record("projects", project_id, project)
     return project
 
 @app.delete("/api/projects/{project_id}")
@@ -434,23 +499,28 @@ def delete_project(project_id: str):
         raise HTTPException(status_code=404, detail="Project not found")
     
     # Удаляем все доски проекта
-    boards_to_delete = [bid for bid, b in boards_db.items() if b.project_id == project_id]
+    boards_to_delete = boards_by_project.get(project_id)
     for bid in boards_to_delete:
         # Удаляем задачи доски
-        tasks_to_delete = [tid for tid, t in tasks_db.items() if t.board_id == bid]
+        tasks_to_delete = tasks_by_board.get_board(bid)
         for tid in tasks_to_delete:
             del tasks_db[tid]
+            tasks_by_board.remove(tid)
+            storage.record("tasks", tid)
         del boards_db[bid]
+        boards_by_project.remove(bid)
+        storage.record("boards", bid)
     
     del projects_db[project_id]
-    save_data()
+    projects_by_company.remove(project_id)
+    storage.record("projects", project_id)
     return {"message": "Project deleted successfully"}
 
 # ============= PROJECT MEMBERS ENDPOINTS =============
 
 @app.get("/api/projects/{project_id}/members", response_model=List[ProjectMember])
 def get_project_members(project_id: str):
-    return [m for m in project_members_db.values() if m.project_id == project_id]
+    return [project_members_db[mid] for mid in members_by_project.get(project_id)]
 
 @app.post("/api/project-members", response_model=ProjectMember)
 def add_project_member(member: ProjectMemberCreate):
@@ -469,7 +539,8 @@ def add_project_member(member: ProjectMemberCreate):
         joined_at=now
     )
     project_members_db[member_id] = new_member
-    save_data()
+    members_by_project.add(member_id, new_member)
+    storage.record("project_members", member_id, new_member)
     return new_member
 
 @app.delete("/api/project-members/{member_id}")
@@ -478,7 +549,8 @@ def remove_project_member(member_id: str):
         raise HTTPException(status_code=404, detail="Member not found")
     
     del project_members_db[member_id]
-    save_data()
+    members_by_project.remove(member_id)
+    storage.record("project_members", member_id)
     return {"message": "Member removed successfully"}
 
 # ============= ROLES ENDPOINTS =============
@@ -502,7 +574,7 @@ def create_role(role: RoleCreate):
         created_at=now
     )
     roles_db[role_id] = new_role
-    save_data()
+    storage.record("roles", role_id, new_role)
     return new_role
 
 @app.delete("/api/roles/{role_id}")
@@ -511,7 +583,7 @@ def delete_role(role_id: str):
         raise HTTPException(status_code=404, detail="Role not found")
     
     del roles_db[role_id]
-    save_data()
+    storage.record("roles", role_id)
     return {"message": "Role deleted successfully"}
 
 # Endpoints для досок
@@ -533,7 +605,8 @@ def create_board(board: BoardCreate):
         columns=board.columns
     )
     boards_db[board_id] = new_board
-    save_data()
+    boards_by_project.add(board_id, new_board)
+    storage.record("boards", board_id, new_board)
     return new_board
 
 @app.get("/api/boards/{board_id}", response_model=Board)
@@ -548,12 +621,15 @@ def delete_board(board_id: str):
         raise HTTPException(status_code=404, detail="Board not found")
     
     # Удаляем все задачи связанные с доской
-    tasks_to_delete = [task_id for task_id, task in tasks_db.items() if task.board_id == board_id]
+    tasks_to_delete = tasks_by_board.get_board(board_id)
     for task_id in tasks_to_delete:
         del tasks_db[task_id]
+        tasks_by_board.remove(task_id)
+        storage.record("tasks", task_id)
     
     del boards_db[board_id]
-    save_data()
+    boards_by_project.remove(board_id)
+    storage.record("boards", board_id)
     return {"message": "Board deleted successfully"}
 
 # Endpoints для задач
@@ -562,7 +638,7 @@ def get_tasks(board_id: str):
     if board_id not in boards_db:
         raise HTTPException(status_code=404, detail="Board not found")
     
-    board_tasks = [task for task in tasks_db.values() if task.board_id == board_id]
+    board_tasks = [tasks_db[tid] for tid in tasks_by_board.get_board(board_id)]
     return sorted(board_tasks, key=lambda x: x.position)
 
 @app.post("/api/tasks", response_model=Task)
@@ -574,8 +650,7 @@ def create_task(task: TaskCreate):
     now = datetime.now().isoformat()
     
     # Определяем позицию для новой задачи
-    board_tasks = [t for t in tasks_db.values() if t.board_id == task.board_id and t.status == task.status]
-    position = len(board_tasks)
+    position = tasks_by_board.count(task.board_id, task.status)
     
     # Получаем имя исполнителя если указан ID
     assignee_name = None
@@ -599,7 +674,8 @@ def create_task(task: TaskCreate):
         due_date=task.due_date
     )
     tasks_db[task_id] = new_task
-    save_data()
+    tasks_by_board.add(task_id, new_task)
+    storage.record("tasks", task_id, new_task)
     return new_task
 
 @app.get("/api/tasks/{task_id}", response_model=Task)
@@ -626,7 +702,8 @@ def update_task(task_id: str, task_update: TaskUpdate):
     
     task.updated_at = datetime.now().isoformat()
     tasks_db[task_id] = task
-    save_data()
+    tasks_by_board.update(task_id, task)
+    storage.record("tasks", task_id, task)
     return task
 
 @app.delete("/api/tasks/{task_id}")
@@ -635,7 +712,8 @@ def delete_task(task_id: str):
         raise HTTPException(status_code=404, detail="Task not found")
     
     del tasks_db[task_id]
-    save_data()
+    tasks_by_board.remove(task_id)
+    storage.record("tasks", task_id)
     return {"message": "Task deleted successfully"}
 
 # Инициализация с демо данными
@@ -914,8 +992,10 @@ def init_demo_data():
 if not load_data():
     print("🔧 Создаём демо данные...")
     init_demo_data()
+    rebuild_indexes()
     save_data()
     print("✅ Демо данные созданы и сохранены")
+storage.start()
 
 if __name__ == "__main__":
     import uvicorn
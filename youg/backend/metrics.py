@@ -0,0 +1,275 @@
+"""
+Метрики запросов: время по маршрутам и записи в журнал на запрос
+
+`RequestMetricsMiddleware` замеряет каждый HTTP-запрос и относит его к шаблону
+маршрута (`/api/tasks/{task_id}`), а не к конкретному пути. Базы данных нет,
+поэтому вместо SQL считаются записи в журнал изменений и их время
+(`observe_journal_write` подключается к JournalStorage).
+
+Запросы дольше SLOW_REQUEST_MS сохраняются в кольцевой буфер. Доля запросов
+PROFILE_SAMPLE_RATE выполняется под профилировщиком. Обработчики синхронные
+и работают в пуле потоков, поэтому профилировщик запускается в потоке
+обработчика — это делает класс маршрутов `ProfiledRoute`.
+
+Метрики отдаются в текстовом формате Prometheus: `GET /metrics`.
+"""
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+
+try:
+    from pyinstrument import Profiler as Pyinstrument
+except ImportError:
+    Pyinstrument = None
+
+# Порог медленного запроса (мс)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "200"))
+# Сколько последних медленных запросов хранить
+SLOW_REQUEST_SAMPLES = int(os.getenv("SLOW_REQUEST_SAMPLES", "50"))
+# Доля запросов под профилировщиком (0 — профилирование выключено)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Профилировщик: cprofile или pyinstrument
+PROFILER = os.getenv("PROFILER", "cprofile").lower()
+
+# Сколько строк профиля cProfile сохранять
+PROFILE_TOP = 30
+
+# Границы корзин времени запроса (мс)
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+# Границы корзин числа записей в журнал на запрос
+JOURNAL_WRITE_BUCKETS = (0, 1, 2, 5, 10, 50)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (le — включительно)"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+class RequestStats:
+    """Записи в журнал и профиль текущего запроса"""
+    __slots__ = ("journal_writes", "journal_ms", "profile", "profiler")
+
+    def __init__(self, profile: bool = False):
+        self.journal_writes = 0
+        self.journal_ms = 0.0
+        self.profile = profile
+        self.profiler = None
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.journal_writes = Histogram(JOURNAL_WRITE_BUCKETS)
+        self.journal_ms = 0.0
+        self.statuses: Dict[int, int] = {}
+        self.slow = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Метрики по (метод, шаблон маршрута); обновляются из потока event loop
+route_metrics: Dict[Tuple[str, str], RouteMetrics] = {}
+slow_samples = deque(maxlen=SLOW_REQUEST_SAMPLES)
+
+# cProfile нельзя запускать вложенно: профилируется один запрос за раз
+_profiling = threading.Lock()
+
+
+def observe_journal_write(seconds: float):
+    """Учет записи в журнал изменений (колбэк JournalStorage)"""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.journal_writes += 1
+        stats.journal_ms += seconds * 1000
+
+
+def _profile_call(stats: RequestStats, call, *args, **kwargs):
+    if not _profiling.acquire(blocking=False):
+        return call(*args, **kwargs)
+    try:
+        if PROFILER == "pyinstrument" and Pyinstrument is not None:
+            profiler = Pyinstrument(async_mode="disabled")
+            profiler.start()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                profiler.stop()
+                stats.profiler = profiler
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(call, *args, **kwargs)
+        finally:
+            stats.profiler = profiler
+    finally:
+        _profiling.release()
+
+
+def _profile_text(profiler) -> str:
+    if isinstance(profiler, cProfile.Profile):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        return out.getvalue()
+    return profiler.output_text()
+
+
+class ProfiledRoute(APIRoute):
+    """Маршрут, обработчик которого выполняется под профилировщиком, если запрос выбран"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = self._profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    @staticmethod
+    def _profiled(endpoint):
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            stats = _request_stats.get()
+            if stats is None or not stats.profile:
+                return endpoint(*args, **kwargs)
+            return _profile_call(stats, endpoint, *args, **kwargs)
+        return wrapper
+
+
+def route_template(scope) -> str:
+    """Шаблон маршрута запроса: значения параметров пути заменяются на {имя}"""
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    return getattr(route, "path", None) or scope["path"]
+
+
+def record(scope, status_code: int, duration_ms: float, stats: RequestStats):
+    key = (scope["method"], route_template(scope))
+    metrics = route_metrics.get(key)
+    if metrics is None:
+        metrics = route_metrics.setdefault(key, RouteMetrics())
+    metrics.latency_ms.observe(duration_ms)
+    metrics.journal_writes.observe(stats.journal_writes)
+    metrics.journal_ms += stats.journal_ms
+    metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+    if duration_ms >= SLOW_REQUEST_MS:
+        metrics.slow += 1
+        slow_samples.append({
+            "at": datetime.now().isoformat(),
+            "method": key[0],
+            "route": key[1],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "journal_writes": stats.journal_writes,
+            "journal_ms": round(stats.journal_ms, 2),
+            "profile": _profile_text(stats.profiler) if stats.profiler is not None else None,
+        })
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: время запроса, статус и записи в журнал по маршрутам"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats(PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            _request_stats.reset(token)
+            record(scope, status_code, duration_ms, stats)
+
+
+def slow_requests() -> List[dict]:
+    """Медленные запросы, новые первыми"""
+    return list(reversed(slow_samples))
+
+
+def _labels(**labels) -> str:
+    return ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels.items()
+    )
+
+
+def _histogram(name: str, labels: str, histogram: Histogram, scale: float = 1.0) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(list(histogram.bounds) + [None], histogram.counts):
+        cumulative += count
+        le = "+Inf" if bound is None else format(bound * scale, "g")
+        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.total * scale}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+def render_prometheus() -> str:
+    """Метрики запросов в текстовом формате Prometheus"""
+    routes = sorted(route_metrics.items())
+    families = [
+        ("youg_http_requests_total", "counter", "HTTP-запросы по маршрутам и статусам"),
+        ("youg_http_request_duration_seconds", "histogram", "Время обработки HTTP-запроса"),
+        ("youg_http_request_journal_writes", "histogram", "Записи в журнал изменений на HTTP-запрос"),
+        ("youg_http_request_journal_seconds_total", "counter", "Время записи в журнал в HTTP-запросах"),
+        ("youg_http_slow_requests_total", "counter", f"HTTP-запросы дольше {SLOW_REQUEST_MS:g} мс"),
+    ]
+    lines = []
+    for name, kind, help_text in families:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (method, route), metrics in routes:
+            labels = _labels(method=method, route=route)
+            if name == "youg_http_requests_total":
+                lines += [
+                    f'{name}{{{labels},status="{status_code}"}} {count}'
+                    for status_code, count in sorted(metrics.statuses.items())
+                ]
+            elif name == "youg_http_request_duration_seconds":
+                lines += _histogram(name, labels, metrics.latency_ms, 0.001)
+            elif name == "youg_http_request_journal_writes":
+                lines += _histogram(name, labels, metrics.journal_writes)
+            elif name == "youg_http_request_journal_seconds_total":
+                lines.append(f"{name}{{{labels}}} {metrics.journal_ms / 1000}")
+            else:
+                lines.append(f"{name}{{{labels}}} {metrics.slow}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,239 @@
+"""
+Хранилище данных: журнал изменений + отложенные снимки
+
+Каждое изменение дописывается одной строкой в журнал (`database.journal`),
+поэтому стоимость записи зависит от размера изменения, а не от объёма данных.
+Полный снимок `database.json` пишется в фоне, когда изменения затихли,
+через временный файл и атомарную замену (`os.replace`).
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+class JournalStorage:
+    """Журнал изменений с фоновым сохранением снимков"""
+
+    def __init__(
+        self,
+        data_file: Path,
+        collections: Callable[[], Dict[str, dict]],
+        snapshot_delay: float = 2.0,
+        max_snapshot_delay: float = 30.0,
+        max_journal_entries: int = 10000,
+        fsync: bool = False,
+        on_record: Optional[Callable[[float], None]] = None,
+    ):
+        self.data_file = Path(data_file)
+        self.journal_file = self.data_file.with_suffix(".journal")
+        # Журнал, попавший в снимок, который ещё не записан до конца
+        self.prev_journal_file = self.data_file.with_suffix(".journal.prev")
+        self.tmp_file = self.data_file.with_suffix(".json.tmp")
+
+        # Функция, возвращающая текущие хранилища {"users": users_db, ...}
+        self.collections = collections
+        self.snapshot_delay = snapshot_delay
+        self.max_snapshot_delay = max_snapshot_delay
+        self.max_journal_entries = max_journal_entries
+        self.fsync = fsync
+        # Вызывается после каждой записи в журнал с её длительностью (сек)
+        self.on_record = on_record
+
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._journal = None
+        self._seq = 0
+        self._pending = 0
+        self._first_dirty_at = 0.0
+        self._last_write_at = 0.0
+        self._thread = None
+        self._stopped = False
+
+    # ============= ЗАГРУЗКА =============
+
+    def load(self) -> Optional[dict]:
+        """Загружает снимок и применяет к нему журнал. None — данных нет."""
+        journals = [f for f in (self.prev_journal_file, self.journal_file) if f.exists()]
+        if not self.data_file.exists() and not journals:
+            return None
+
+        data = {}
+        if self.data_file.exists():
+            with open(self.data_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        snapshot_seq = data.pop("_meta", {}).get("seq", 0)
+        self._seq = snapshot_seq
+
+        replayed = 0
+        for journal in journals:
+            replayed += self._replay(journal, data, snapshot_seq)
+
+        # Сворачиваем журнал в новый снимок, чтобы начать с чистого файла
+        if journals:
+            self._write_snapshot(data, self._seq)
+            for journal in journals:
+                journal.unlink()
+            if replayed:
+                print(f"✅ Применено изменений из журнала: {replayed}")
+        return data
+
+    def _replay(self, journal: Path, data: dict, snapshot_seq: int) -> int:
+        """Применяет записи журнала новее снимка, возвращает их количество"""
+        replayed = 0
+        with open(journal, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Недописанная строка после аварийного завершения
+                    print(f"⚠️ Повреждённая запись в {journal.name}, остаток журнала пропущен")
+                    break
+                self._seq = max(self._seq, entry["seq"])
+                if entry["seq"] <= snapshot_seq:
+                    continue
+                items = data.setdefault(entry["c"], {})
+                if entry["v"] is None:
+                    items.pop(entry["k"], None)
+                else:
+                    items[entry["k"]] = entry["v"]
+                replayed += 1
+        return replayed
+
+    # ============= ЗАПИСЬ ИЗМЕНЕНИЙ =============
+
+    def record(self, collection: str, key: str, item=None):
+        """Дописывает изменение в журнал. item=None означает удаление."""
+        started = time.perf_counter()
+        value = item.dict() if item is not None else None
+        with self._lock:
+            self._seq += 1
+            line = json.dumps(
+                {"seq": self._seq, "c": collection, "k": key, "v": value},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            if self._journal is None:
+                self._journal = open(self.journal_file, "a", encoding="utf-8")
+            self._journal.write(line + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+
+            now = time.monotonic()
+            if not self._pending:
+                self._first_dirty_at = now
+            self._pending += 1
+            self._last_write_at = now
+            if self._pending == 1 or self._pending >= self.max_journal_entries:
+                self._cond.notify()
+        if self.on_record is not None:
+            self.on_record(time.perf_counter() - started)
+
+    # ============= СНИМКИ =============
+
+    def snapshot(self):
+        """Записывает полный снимок данных и сбрасывает журнал"""
+        with self._lock:
+            seq = self._seq
+            stores = {name: dict(store) for name, store in self.collections().items()}
+            self._rotate_journal()
+            self._pending = 0
+
+        # Сериализация вне блокировки: изменения, сделанные во время записи,
+        # остаются в новом журнале и применяются поверх снимка при загрузке
+        data = {name: {k: v.dict() for k, v in store.items()} for name, store in stores.items()}
+        try:
+            self._write_snapshot(data, seq)
+        except Exception:
+            # Повторим попытку после следующей паузы
+            with self._lock:
+                now = time.monotonic()
+                if not self._pending:
+                    self._first_dirty_at = now
+                self._pending += 1
+                self._last_write_at = now
+            raise
+        if self.prev_journal_file.exists():
+            self.prev_journal_file.unlink()
+
+    def _rotate_journal(self):
+        """Переносит текущий журнал в .prev (вызывается под блокировкой)"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if not self.journal_file.exists():
+            return
+        if self.prev_journal_file.exists():
+            # Предыдущий снимок не записался: не теряем его записи
+            with open(self.prev_journal_file, "a", encoding="utf-8") as prev, \
+                    open(self.journal_file, "r", encoding="utf-8") as current:
+                prev.write(current.read())
+            self.journal_file.unlink()
+        else:
+            os.replace(self.journal_file, self.prev_journal_file)
+
+    def _write_snapshot(self, data: dict, seq: int):
+        """Атомарная запись снимка через временный файл"""
+        payload = dict(data)
+        payload["_meta"] = {"seq": seq}
+        with open(self.tmp_file, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.tmp_file, self.data_file)
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(self.data_file.parent, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    # ============= ФОНОВЫЙ ПОТОК =============
+
+    def start(self):
+        """Запускает фоновое сохранение снимков"""
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="journal-snapshot", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Останавливает фоновый поток и сохраняет финальный снимок"""
+        with self._lock:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pending:
+            self.snapshot()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                # Ждём паузы в изменениях, но не дольше max_snapshot_delay
+                while not self._stopped:
+                    deadline = min(
+                        self._last_write_at + self.snapshot_delay,
+                        self._first_dirty_at + self.max_snapshot_delay,
+                    )
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0 or self._pending >= self.max_journal_entries:
+                        break
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"❌ Ошибка при сохранении снимка: {e}")
@@ -0,0 +1,316 @@
+"""
+Аналитика отклонений дозирования
+
+Отклонения компонентов накапливаются в агрегатах по рецептуре, компоненту,
+производственным суткам и смене (`deviation_rollups`: количество, сумма,
+сумма квадратов, минимум, максимум) и в гистограммах для процентилей
+(`deviation_histograms`). Агрегаты обновляются инкрементно в той же
+транзакции, что и логи дозирования, поэтому запросы за год читают
+сотни строк агрегатов, а не сотни тысяч логов.
+
+Статистика по агрегатам и контрольная карта считаются на массивах NumPy.
+"""
+import itertools
+import math
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, delete, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Batch, DeviationHistogram, DeviationRollup, DosingLog, Recipe
+from backend.upsert import upsert
+
+# Ширина корзины гистограммы отклонений (%): точность процентилей
+ANALYTICS_BIN_WIDTH = float(os.getenv("ANALYTICS_BIN_WIDTH", "0.1"))
+
+# Начало первой смены (час) и длительность смены (ч)
+FIRST_SHIFT_HOUR = int(os.getenv("FIRST_SHIFT_HOUR", "8"))
+SHIFT_HOURS = int(os.getenv("SHIFT_HOURS", "8"))
+
+# Измерения для группировки статистики
+GROUP_FIELDS = ("recipe", "component", "day", "shift")
+
+# Процентили в статистике отклонений
+PERCENTILES = (5, 50, 95)
+
+# Количество подряд идущих точек по одну сторону от центральной линии (правило серии)
+SPC_RUN_LENGTH = 8
+
+ROLLUP_KEY = ("recipe_id", "component_type", "day", "shift")
+
+
+def production_shift(timestamp: datetime) -> Tuple[date, int]:
+    """Производственные сутки и номер смены для момента времени"""
+    shifted = timestamp - timedelta(hours=FIRST_SHIFT_HOUR)
+    return shifted.date(), shifted.hour // SHIFT_HOURS + 1
+
+
+def _accumulate_rollup(table, new) -> dict:
+    """Сложение строки агрегата с новой порцией (new — столбцы excluded или значения)"""
+    return {
+        "count": table.c.count + new["count"],
+        "sum_pct": table.c.sum_pct + new["sum_pct"],
+        "sum_sq_pct": table.c.sum_sq_pct + new["sum_sq_pct"],
+        "min_pct": case((new["min_pct"] < table.c.min_pct, new["min_pct"]), else_=table.c.min_pct),
+        "max_pct": case((new["max_pct"] > table.c.max_pct, new["max_pct"]), else_=table.c.max_pct),
+    }
+
+
+def _accumulate_histogram(table, new) -> dict:
+    return {"count": table.c.count + new["count"]}
+
+
+async def add_to_rollups(db: AsyncSession, samples: Iterable[tuple]):
+    """Добавляет отклонения в агрегаты.
+
+    samples — (recipe_id, component_type, deviation_pct, timestamp).
+    Изменения фиксируются вместе с транзакцией вызывающего кода.
+    """
+    rollups: Dict[tuple, list] = {}
+    histograms: Dict[tuple, int] = {}
+    for recipe_id, component_type, deviation, timestamp in samples:
+        if deviation is None:
+            continue
+        key = (recipe_id, component_type, *production_shift(timestamp))
+        acc = rollups.get(key)
+        if acc is None:
+            rollups[key] = [1, deviation, deviation * deviation, deviation, deviation]
+        else:
+            acc[0] += 1
+            acc[1] += deviation
+            acc[2] += deviation * deviation
+            acc[3] = min(acc[3], deviation)
+            acc[4] = max(acc[4], deviation)
+        bin_key = key + (math.floor(deviation / ANALYTICS_BIN_WIDTH),)
+        histograms[bin_key] = histograms.get(bin_key, 0) + 1
+    if not rollups:
+        return
+
+    # Сортировка по ключу: одинаковый порядок блокировок в параллельных транзакциях
+    rollup_rows = [
+        dict(zip(ROLLUP_KEY, key), count=acc[0], sum_pct=acc[1], sum_sq_pct=acc[2], min_pct=acc[3], max_pct=acc[4])
+        for key, acc in sorted(rollups.items())
+    ]
+    histogram_rows = [
+        dict(zip((*ROLLUP_KEY, "bin"), key), count=count)
+        for key, count in sorted(histograms.items())
+    ]
+    await upsert(db, DeviationRollup.__table__, rollup_rows, ROLLUP_KEY, _accumulate_rollup)
+    await upsert(db, DeviationHistogram.__table__, histogram_rows, (*ROLLUP_KEY, "bin"), _accumulate_histogram)
+
+
+async def rebuild_rollups(db: AsyncSession, chunk_size: int = 10000) -> int:
+    """Пересчитывает агрегаты по всем логам дозирования, возвращает число логов"""
+    await db.execute(delete(DeviationHistogram))
+    await db.execute(delete(DeviationRollup))
+    query = (
+        select(Batch.recipe_id, DosingLog.component_type, DosingLog.deviation_pct, DosingLog.timestamp)
+        .join(Batch, DosingLog.batch_id == Batch.id)
+        .where(DosingLog.deviation_pct.is_not(None), DosingLog.timestamp.is_not(None))
+        .execution_options(yield_per=chunk_size)
+    )
+    total = 0
+    result = await db.stream(query)
+    async for rows in result.partitions():
+        total += len(rows)
+        await add_to_rollups(db, [tuple(row) for row in rows])
+    return total
+
+
+# ============= ЗАПРОСЫ =============
+
+def _dimensions(group_by: List[str]) -> list:
+    columns = {
+        "recipe": Recipe.code.label("recipe_code"),
+        "component": DeviationRollup.component_type,
+        "day": DeviationRollup.day,
+        "shift": DeviationRollup.shift,
+    }
+    return [columns[field] for field in group_by]
+
+
+def _filtered(query, model, date_from, date_to, recipe_code, component):
+    query = query.select_from(model).join(Recipe, model.recipe_id == Recipe.id)
+    if date_from:
+        query = query.where(model.day >= date_from)
+    if date_to:
+        query = query.where(model.day <= date_to)
+    if recipe_code:
+        query = query.where(Recipe.code == recipe_code)
+    if component:
+        query = query.where(model.component_type == component)
+    return query
+
+
+def _summarize(values: List[tuple], histogram: List[tuple]) -> List[dict]:
+    """Статистика групп по агрегатам и гистограммам одним проходом по массивам.
+
+    values — (count, sum, sum_sq, min, max) по группам; histogram — (номер
+    группы, корзина, count) по возрастанию группы и корзины. Процентиль —
+    линейно внутри корзины, в пределах минимума и максимума группы.
+    """
+    count, total, total_sq, low, high = np.array(values, dtype=float).T
+    columns = {
+        "mean_pct": total / count,
+        "stddev_pct": np.where(
+            count < 2, 0.0, np.sqrt(np.maximum(total_sq - total * total / count, 0.0) / np.maximum(count - 1, 1))
+        ),
+        "min_pct": low,
+        "max_pct": high,
+    }
+    if histogram:
+        # histogram упорядочен по группе и корзине; группа — отрезок [first, end)
+        group, bin_index, bin_count = np.fromiter(
+            itertools.chain.from_iterable(histogram), dtype=float, count=3 * len(histogram)
+        ).reshape(-1, 3).T
+        cumulative = np.cumsum(bin_count)
+        seen = cumulative - bin_count
+        groups = np.arange(len(values))
+        first = np.searchsorted(group, groups, side="left")
+        end = np.searchsorted(group, groups, side="right")
+        base = np.append(seen, cumulative[-1])[first]
+    for q in PERCENTILES:
+        if not histogram:
+            columns[f"p{q}_pct"] = high
+            continue
+        target = base + q / 100 * count
+        found = np.searchsorted(cumulative, target, side="left")
+        inside = found < end
+        found = np.minimum(found, len(cumulative) - 1)
+        value = (bin_index[found] + (target - seen[found]) / bin_count[found]) * ANALYTICS_BIN_WIDTH
+        columns[f"p{q}_pct"] = np.where(inside, np.clip(value, low, high), high)
+
+    names = ["count", *columns]
+    return [
+        dict(zip(names, row))
+        for row in zip([row[0] for row in values], *(column.tolist() for column in columns.values()))
+    ]
+
+
+async def deviation_stats(
+    db: AsyncSession,
+    group_by: List[str],
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    recipe_code: Optional[str] = None,
+    component: Optional[str] = None,
+) -> List[dict]:
+    """Среднее, СКО, минимум/максимум и процентили отклонений по группам"""
+    dimensions = _dimensions(group_by)
+    rollup_query = _filtered(
+        select(
+            *dimensions,
+            func.sum(DeviationRollup.count),
+            func.sum(DeviationRollup.sum_pct),
+            func.sum(DeviationRollup.sum_sq_pct),
+            func.min(DeviationRollup.min_pct),
+            func.max(DeviationRollup.max_pct),
+        ),
+        DeviationRollup, date_from, date_to, recipe_code, component,
+    ).group_by(*dimensions).order_by(*dimensions)
+
+    histogram_dimensions = [
+        DeviationHistogram.__table__.c[column.key] if column.key in ROLLUP_KEY else column
+        for column in dimensions
+    ]
+    # Номер группы считает БД: порядок групп тот же, что у агрегатов
+    group = (
+        func.dense_rank().over(order_by=histogram_dimensions) - 1 if histogram_dimensions else literal(0)
+    )
+    histogram_query = _filtered(
+        select(group, DeviationHistogram.bin, func.sum(DeviationHistogram.count)),
+        DeviationHistogram, date_from, date_to, recipe_code, component,
+    ).group_by(*histogram_dimensions, DeviationHistogram.bin).order_by(*histogram_dimensions, DeviationHistogram.bin)
+
+    width = len(dimensions)
+    groups = (await db.execute(rollup_query)).all()
+    if not groups:
+        return []
+    histogram = (await db.execute(histogram_query)).all()
+
+    stats = []
+    for row, summary in zip(groups, _summarize([tuple(row[width:]) for row in groups], histogram)):
+        item = dict(zip((column.key for column in dimensions), row[:width]))
+        item.update(summary)
+        stats.append(item)
+    return stats
+
+
+def _control_chart(subgroups: list) -> Tuple[float, float, List[float], List[float], List[List[str]]]:
+    """Центральная линия, σ, средние подгрупп, полуширина границ и нарушенные правила"""
+    count, total, total_sq = np.array(
+        [(row.count, row.sum_pct, row.sum_sq_pct) for row in subgroups], dtype=float
+    ).T
+    total_count = count.sum()
+    center = float(total.sum() / total_count)
+    degrees = total_count - len(subgroups)
+    # Объединённая внутригрупповая дисперсия
+    within = np.maximum(total_sq - total * total / count, 0.0).sum()
+    sigma = float(np.sqrt(within / degrees)) if degrees > 0 else 0.0
+
+    mean = total / count
+    limit = 3 * sigma / np.sqrt(count)
+    beyond = ((mean < center - limit) | (mean > center + limit)) & bool(sigma)
+
+    # Серия из SPC_RUN_LENGTH точек подряд по одну сторону от центральной линии:
+    # длина серии — расстояние до начала отрезка с той же стороной
+    side = np.sign(mean - center)
+    position = np.arange(len(side))
+    changed = np.concatenate(([True], side[1:] != side[:-1]))
+    start = np.maximum.accumulate(np.where(changed, position, 0))
+    run = (side != 0) & (position - start + 1 >= SPC_RUN_LENGTH)
+
+    rules = [
+        ["beyond_limits"] * is_beyond + ["run"] * is_run
+        for is_beyond, is_run in zip(beyond.tolist(), run.tolist())
+    ]
+    return center, sigma, mean.tolist(), limit.tolist(), rules
+
+
+async def spc_chart(
+    db: AsyncSession,
+    recipe_code: str,
+    component: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> dict:
+    """Контрольная карта средних (X̄) по сменам с границами ±3σ"""
+    query = _filtered(
+        select(
+            DeviationRollup.day,
+            DeviationRollup.shift,
+            DeviationRollup.count,
+            DeviationRollup.sum_pct,
+            DeviationRollup.sum_sq_pct,
+        ),
+        DeviationRollup, date_from, date_to, recipe_code, component,
+    ).order_by(DeviationRollup.day, DeviationRollup.shift)
+    subgroups = (await db.execute(query)).all()
+
+    center, sigma, points = 0.0, 0.0, []
+    if subgroups:
+        center, sigma, means, limits, rules = _control_chart(subgroups)
+        points = [
+            {
+                "day": row.day,
+                "shift": row.shift,
+                "count": row.count,
+                "mean_pct": mean,
+                "ucl_pct": center + limit,
+                "lcl_pct": center - limit,
+                "rules": point_rules,
+                "out_of_control": bool(point_rules),
+            }
+            for row, mean, limit, point_rules in zip(subgroups, means, limits, rules)
+        ]
+
+    return {
+        "recipe_code": recipe_code,
+        "component_type": component,
+        "center_line_pct": center,
+        "sigma_pct": sigma,
+        "points": points,
+    }
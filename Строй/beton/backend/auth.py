@@ -4,27 +4,28 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
 from backend.models import User
+from backend.passwords import pwd_context, verify_and_update
+from backend.principal_cache import principal_cache
 
 # Настройки JWT
 SECRET_KEY = "your-secret-key-change-in-production"  # В продакшене использовать переменную окружения
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверка пароля"""
+    """Проверка пароля (синхронно; в обработчиках — passwords.verify_and_update)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Хеширование пароля"""
+    """Хеширование пароля (синхронно; в обработчиках — passwords.hash_password)"""
     return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -38,20 +39,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
     """Аутентификация пользователя"""
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    # Соединение не держим, пока хеш считается в пуле потоков
+    await db.commit()
+    valid, new_hash = await verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
     if not user.is_active:
         return None
+    if new_hash:
+        # Параметры хеширования изменились: пересчитанный хеш сохраняем при входе
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Получение текущего пользователя из токена"""
     credentials_exception = HTTPException(
@@ -66,9 +74,12 @@ async def get_current_user(
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+    user = principal_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await db.scalar(select(User).where(User.username == username))
+        if user is None or not user.is_active:
+            raise credentials_exception
+        user = principal_cache.put(user)
     return user
 
 def require_role(allowed_roles: list):
@@ -0,0 +1,146 @@
+"""
+Переходы статуса партии
+
+Статус партии меняется только по таблице TRANSITIONS и только условным
+UPDATE (compare-and-swap): `UPDATE batches SET status = :target WHERE id = :id
+AND status = :observed`. Если параллельный запрос уже сменил статус, UPDATE
+не затрагивает строку, и повторное списание материалов и дубли логов
+дозирования не записываются.
+
+Запрос с заголовком `Idempotency-Key` сохраняет ключ в истории переходов
+(уникальный индекс). Повтор с тем же ключом ничего не меняет и получает
+текущее состояние партии.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.live_events import batch_event, queue_event
+from backend.models import Batch, BatchStatus, BatchTransition
+
+# Действие: (статусы, из которых оно допустимо, новый статус)
+TRANSITIONS: Dict[str, Tuple[Tuple[BatchStatus, ...], BatchStatus]] = {
+    "start": ((BatchStatus.PLANNED,), BatchStatus.DOSING),
+    "complete_dosing": ((BatchStatus.PLANNED, BatchStatus.DOSING), BatchStatus.MIXING),
+    "complete": ((BatchStatus.MIXING, BatchStatus.DISCHARGING), BatchStatus.COMPLETED),
+}
+
+
+def allowed_from(action: str) -> Tuple[BatchStatus, ...]:
+    return TRANSITIONS[action][0]
+
+
+def target_status(status: BatchStatus, action: str) -> BatchStatus:
+    """Новый статус партии после действия; 400, если из текущего статуса оно недоступно"""
+    allowed, target = TRANSITIONS[action]
+    if status not in allowed:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Действие {action} недоступно: партия в статусе {status.value}"
+        )
+    return target
+
+
+async def is_replay(db: AsyncSession, idempotency_key: Optional[str], batch_id: int, action: str) -> bool:
+    """True, если запрос с этим ключом идемпотентности уже выполнен"""
+    if not idempotency_key:
+        return False
+    done = (await db.execute(
+        select(BatchTransition.batch_id, BatchTransition.action)
+        .where(BatchTransition.idempotency_key == idempotency_key)
+    )).first()
+    if done is None:
+        return False
+    if (done.batch_id, done.action) != (batch_id, action):
+        raise HTTPException(status_code=409, detail="Ключ идемпотентности уже использован для другого запроса")
+    return True
+
+
+async def transition(
+    db: AsyncSession,
+    batch: Batch,
+    action: str,
+    user_id: Optional[int] = None,
+    idempotency_key: Optional[str] = None,
+    values: Optional[dict] = None,
+) -> bool:
+    """Переводит партию по действию; values — поля, записываемые вместе со статусом.
+
+    Возвращает False, если это повтор запроса и ничего не изменено.
+    Изменения фиксируются вместе с транзакцией вызывающего кода.
+    """
+    if await is_replay(db, idempotency_key, batch.id, action):
+        return False
+    observed = batch.status
+    target = target_status(observed, action)
+
+    claimed = (await db.execute(
+        update(Batch)
+        .where(Batch.id == batch.id, Batch.status == observed)
+        .values(status=target, **(values or {}))
+        .returning(Batch.id)
+    )).first()
+    if claimed is None:
+        # Статус сменил параллельный запрос — возможно, повтор с тем же ключом
+        if await is_replay(db, idempotency_key, batch.id, action):
+            return False
+        raise HTTPException(status_code=409, detail="Статус партии изменен параллельным запросом")
+
+    db.add(BatchTransition(
+        batch_id=batch.id,
+        action=action,
+        from_status=observed,
+        to_status=target,
+        idempotency_key=idempotency_key,
+        user_id=user_id,
+    ))
+    # UPDATE в обход unit of work: событие ставим явно
+    queue_event(db.sync_session, batch_event(batch, target, observed))
+    return True
+
+
+async def claim_batches(
+    db: AsyncSession,
+    batches: Iterable,
+    action: str,
+    user_id: Optional[int] = None,
+) -> Set[int]:
+    """Массовый переход: по одному условному UPDATE на каждый прочитанный статус.
+
+    batches — строки с id и status, прочитанные заранее. Возвращает id партий,
+    статус которых удалось сменить; остальные изменены параллельно.
+    """
+    by_status: Dict[BatchStatus, list] = {}
+    for batch in batches:
+        by_status.setdefault(batch.status, []).append(batch)
+
+    claimed: Set[int] = set()
+    history = []
+    now = datetime.now()
+    for observed, rows in by_status.items():
+        target = target_status(observed, action)
+        ids = set((await db.execute(
+            update(Batch)
+            .where(Batch.id.in_([row.id for row in rows]), Batch.status == observed)
+            .values(status=target)
+            .returning(Batch.id),
+            execution_options={"synchronize_session": False},
+        )).scalars())
+        for row in rows:
+            if row.id in ids:
+                history.append({
+                    "batch_id": row.id,
+                    "action": action,
+                    "from_status": observed,
+                    "to_status": target,
+                    "user_id": user_id,
+                    "created_at": now,
+                })
+                queue_event(db.sync_session, batch_event(row, target, observed))
+        claimed |= ids
+    if history:
+        await db.execute(insert(BatchTransition), history)
+    return claimed
@@ -0,0 +1,118 @@
+"""
+Кэш снимка дашборда мониторинга
+
+Снимок собирается один раз и отдаётся всем опрашивающим экранам в виде
+готового JSON с ETag. Снимок сбрасывается после коммита, изменившего
+партии, заказы, склад или оборудование; TTL ограничивает устаревание
+данных, изменённых другими процессами (воркерами uvicorn).
+"""
+import asyncio
+import hashlib
+import os
+import time
+from itertools import chain
+from typing import Awaitable, Callable, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.models import Batch, Order, WarehouseMaterial, EquipmentStatus
+
+# Максимальный возраст снимка (сек)
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+
+# Модели, изменение которых сбрасывает снимок
+WATCHED_MODELS = (Batch, Order, WarehouseMaterial, EquipmentStatus)
+
+
+class DashboardCache:
+    """Снимок дашборда с однократным пересчётом на изменение"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._body = b""
+        self._etag = ""
+        self._version = 0
+        self._built_version = -1
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def invalidate(self):
+        """Помечает снимок устаревшим"""
+        self._version += 1
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._built_version == self._version
+            and time.monotonic() - self._built_at < self.ttl
+        )
+
+    async def get(self, build: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, str, bool]:
+        """Возвращает (тело, ETag, из кэша). Параллельные запросы ждут один пересчёт."""
+        if self._is_fresh():
+            self.hits += 1
+            return self._body, self._etag, True
+        async with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return self._body, self._etag, True
+            # Изменения во время сборки увеличат версию и вызовут новый пересчёт
+            version = self._version
+            body = await build()
+            self._body = body
+            self._etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            self._built_version = version
+            self._built_at = time.monotonic()
+            self.misses += 1
+            return self._body, self._etag, False
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "version": self._version,
+        }
+
+
+dashboard_cache = DashboardCache(DASHBOARD_CACHE_TTL)
+
+
+def _is_watched(obj) -> bool:
+    return isinstance(obj, WATCHED_MODELS)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    if any(_is_watched(obj) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["dashboard_dirty"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statements(orm_execute_state):
+    # Массовые insert/update/delete в обход unit of work
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, WATCHED_MODELS):
+        orm_execute_state.session.info["dashboard_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.in_nested_transaction():
+        return
+    if session.info.pop("dashboard_dirty", False):
+        dashboard_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("dashboard_dirty", None)
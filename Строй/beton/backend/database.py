@@ -1,28 +1,226 @@
 """
 Настройка базы данных
 """
-from sqlalchemy import create_engine
+from sqlalchemy import Delete, Insert, Update, create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
 
+from backend.pool_metrics import timed_pool
+
 # SQLite для разработки, можно заменить на PostgreSQL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./beton_plant.db")
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+# Асинхронные драйверы для роутеров (соответствие синхронному URL)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def make_async_url(url: str) -> str:
+    """Преобразование синхронного URL в URL асинхронного драйвера"""
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+# Можно задать явно, например postgresql+psycopg://... для psycopg 3
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", make_async_url(DATABASE_URL))
+
+# Режим сессий роутеров: async — асинхронный драйвер; sync — синхронный драйвер прямо
+# в потоке event loop: медленный запрос останавливает все запросы процесса.
+# sync — только для сравнения задержек (benchmarks/README.md)
+DB_SESSION_MODE = os.getenv("DB_SESSION_MODE", "async")
+
+# Пул соединений (PostgreSQL и файловая SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Сколько ждать свободного соединения (сек)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Переоткрывать соединения старше (сек); -1 — не переоткрывать
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Проверять соединение перед выдачей (после рестарта БД или обрыва сети)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# Таймауты PostgreSQL (мс); 0 — отключено
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "10000"))
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "60000"))
+DB_APPLICATION_NAME = os.getenv("DB_APPLICATION_NAME", "beton")
+
+
+def is_memory_sqlite(url: str) -> bool:
+    """SQLite в памяти (sqlite://, :memory:) — без пула соединений"""
+    return url.startswith("sqlite") and (":memory:" in url or url.split("?")[0].endswith(("://", ":///")))
+
+
+def postgres_settings() -> dict:
+    """Параметры сеанса PostgreSQL: таймауты и имя приложения"""
+    settings = {"application_name": DB_APPLICATION_NAME}
+    if DB_STATEMENT_TIMEOUT_MS:
+        settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+    if DB_LOCK_TIMEOUT_MS:
+        settings["lock_timeout"] = str(DB_LOCK_TIMEOUT_MS)
+    if DB_IDLE_IN_TRANSACTION_TIMEOUT_MS:
+        settings["idle_in_transaction_session_timeout"] = str(DB_IDLE_IN_TRANSACTION_TIMEOUT_MS)
+    return settings
+
+
+def connect_args_for(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"check_same_thread": False}
+    if url.startswith("postgresql"):
+        if "asyncpg" in url:
+            return {"server_settings": postgres_settings()}
+        # psycopg2 / psycopg 3: параметры через options libpq
+        return {"options": " ".join(f"-c {key}={value}" for key, value in postgres_settings().items())}
+    return {}
+
+
+def engine_options(url: str, name: str = None, pool_size: int = DB_POOL_SIZE,
+                   max_overflow: int = DB_MAX_OVERFLOW, pool_timeout: float = DB_POOL_TIMEOUT,
+                   pool_class=AsyncAdaptedQueuePool) -> dict:
+    """Аргументы create_engine: пул, таймауты; name — имя пула в метриках"""
+    options = {"connect_args": connect_args_for(url)}
+    if is_memory_sqlite(url):
+        # Для БД в памяти SQLAlchemy выбирает свой пул — не настраиваем
+        return options
+    options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if name:
+        options["poolclass"] = timed_pool(pool_class, name, pool_size)
+    return options
+
+
+# Профиль SQLite: default или performance (WAL, настроенные PRAGMA, один писатель)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_READER_POOL_SIZE = int(os.getenv("SQLITE_READER_POOL_SIZE", "8"))
+# Сколько ждать очереди к соединению писателя (сек)
+SQLITE_WRITER_TIMEOUT = float(os.getenv("SQLITE_WRITER_TIMEOUT", "30"))
+
+SQLITE_PERFORMANCE = (
+    SQLITE_PROFILE == "performance"
+    and DATABASE_URL.startswith("sqlite")
+    and not is_memory_sqlite(DATABASE_URL)
+)
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
 )
 
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """PRAGMA профиля performance для каждого нового соединения"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+if SQLITE_PERFORMANCE and DB_SESSION_MODE == "sync":
+    # Синхронная сессия обходит писателя и пул читателей профиля
+    raise RuntimeError("SQLITE_PROFILE=performance работает только с DB_SESSION_MODE=async")
+
+# Синхронный движок: скрипты, init_db и сессии режима DB_SESSION_MODE=sync
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, "sync", pool_class=QueuePool))
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок: запросы роутеров не блокируют event loop
+if SQLITE_PERFORMANCE:
+    # Читатели — пул соединений; в режиме WAL они не блокируют писателя
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(
+        ASYNC_DATABASE_URL, "main", pool_size=SQLITE_READER_POOL_SIZE, max_overflow=0
+    ))
+    # Писатель — одно соединение: пул служит очередью записей вместо "database is locked"
+    async_writer_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(
+        ASYNC_DATABASE_URL, "writer", pool_size=1, max_overflow=0, pool_timeout=SQLITE_WRITER_TIMEOUT
+    ))
+    for sqlite_engine in (engine, async_engine.sync_engine, async_writer_engine.sync_engine):
+        event.listen(sqlite_engine, "connect", apply_sqlite_pragmas)
+else:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, "main"))
+    async_writer_engine = None
+
+
+def _is_write(clause) -> bool:
+    if isinstance(clause, (Insert, Update, Delete)):
+        return True
+    # SELECT ... FOR UPDATE: чтение перед записью должно видеть последние данные
+    return getattr(clause, "_for_update_arg", None) is not None
+
+
+class SQLiteRoutingSession(Session):
+    """Сессия профиля performance: запись через соединение писателя, чтение — через пул.
+
+    После первой записи вся транзакция идёт через писателя, чтобы видеть
+    собственные незафиксированные изменения.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("sqlite_writer") or self._flushing or _is_write(clause):
+            self.info["sqlite_writer"] = True
+            return async_writer_engine.sync_engine
+        return async_engine.sync_engine
+
+
+@event.listens_for(SQLiteRoutingSession, "after_commit")
+@event.listens_for(SQLiteRoutingSession, "after_rollback")
+def _release_writer(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("sqlite_writer", None)
+
+
+class BlockingSession(Session):
+    """Сессия режима DB_SESSION_MODE=sync: все запросы через синхронный движок"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        return engine
+
+
+if DB_SESSION_MODE == "sync":
+    # Код роутеров тот же, но синхронный драйвер блокирует event loop
+    AsyncSessionLocal = async_sessionmaker(
+        class_=AsyncSession,
+        sync_session_class=BlockingSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+else:
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine,
+        class_=AsyncSession,
+        sync_session_class=SQLiteRoutingSession if SQLITE_PERFORMANCE else Session,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
 Base = declarative_base()
 
 def get_db():
-    """Dependency для получения сессии БД"""
+    """Dependency для получения сессии БД (скрипты и init_db)"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependency для получения асинхронной сессии БД"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,214 @@
+"""
+Расчёт дозирования и массовая загрузка фактических весов
+
+Показания весов и контроллера (PLC) приходят пачками по многим партиям.
+Записи обрабатываются блоками: партии читаются одним запросом на блок,
+рецептуры берутся из кэша, план — из таблиц уставок с поправкой на
+влажность (backend/setpoints.py), отклонения считаются сразу для всего блока,
+прогноз прочности — по модели из памяти процесса (backend/strength.py),
+а строки `batches` и `dosing_logs` пишутся массовыми UPDATE/INSERT в одной
+транзакции вместе со списанием материалов со склада. Партии блока
+переводятся в `mixing` условным UPDATE (см. backend/batch_states.py): логи
+пишутся только для партий, статус которых сменил именно этот запрос.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.analytics import add_to_rollups
+from backend.batch_states import allowed_from, claim_batches
+from backend.models import Batch, DosingLog, Recipe
+from backend.recipe_cache import recipe_cache
+from backend.schemas import BulkDosingError, BulkDosingResult, DosingRecord
+from backend.setpoints import DOSING_COMPONENTS, setpoint_engine
+from backend.stock import consume_for_batches
+from backend.strength import strength_predictor
+
+# Компоненты, для которых у партии хранится отклонение
+DEVIATION_COMPONENTS = ("cement", "sand", "gravel", "water")
+
+# Размер блока записей, обрабатываемого за один проход
+BULK_CHUNK_SIZE = int(os.getenv("BULK_DOSING_CHUNK_SIZE", "1000"))
+
+# Сколько ошибок возвращать в ответе (остальные только считаются)
+BULK_MAX_ERRORS = int(os.getenv("BULK_DOSING_MAX_ERRORS", "100"))
+
+# Статусы, в которых партия принимает результаты дозирования
+DOSING_ALLOWED_STATUSES = allowed_from("complete_dosing")
+
+
+def calc_deviation(actual: float, planned: float) -> float:
+    """Отклонение факта от плана (%)"""
+    if planned == 0:
+        return 0
+    return ((actual - planned) / planned) * 100
+
+
+class BulkDosingIngest:
+    """Загрузка результатов дозирования блоками в рамках одной транзакции"""
+
+    def __init__(self, db: AsyncSession, user_id: Optional[int] = None):
+        self.db = db
+        self.user_id = user_id
+        self.recipes: Dict[int, Recipe] = {}
+        self.seen = set()
+        self.index = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.dosing_logs = 0
+        self.errors: List[BulkDosingError] = []
+
+    def reject(self, index: int, batch_id: Optional[int], error: str):
+        self.rejected += 1
+        if len(self.errors) < BULK_MAX_ERRORS:
+            self.errors.append(BulkDosingError(index=index, batch_id=batch_id, error=error))
+
+    def parse(self, items: Iterable) -> List[tuple]:
+        """Валидирует записи блока, возвращает [(номер, DosingRecord)]"""
+        records = []
+        for item in items:
+            index = self.index
+            self.index += 1
+            try:
+                data = json.loads(item) if isinstance(item, (bytes, str)) else item
+                record = DosingRecord.model_validate(data)
+            except ValidationError as e:
+                fields = ", ".join(".".join(map(str, err["loc"])) or "запись" for err in e.errors())
+                self.reject(index, None, f"Некорректные поля: {fields}")
+                continue
+            except ValueError:
+                self.reject(index, None, "Некорректный JSON")
+                continue
+            if record.batch_id in self.seen:
+                self.reject(index, record.batch_id, "Повторная запись для партии")
+                continue
+            self.seen.add(record.batch_id)
+            records.append((index, record))
+        return records
+
+    async def _load_recipes(self, recipe_ids: set):
+        missing = recipe_ids - self.recipes.keys()
+        if missing:
+            self.recipes.update(await recipe_cache.get_many(self.db, missing))
+
+    async def process(self, items: Iterable):
+        """Обрабатывает блок записей (dict или строки JSON)"""
+        records = self.parse(items)
+        if not records:
+            return
+
+        rows = await self.db.execute(
+            select(
+                Batch.id, Batch.batch_number, Batch.order_id, Batch.recipe_id,
+                Batch.volume_m3, Batch.status, Batch.started_at,
+            ).where(Batch.id.in_([record.batch_id for _, record in records]))
+        )
+        batches = {row.id: row for row in rows}
+        await self._load_recipes({row.recipe_id for row in batches.values()})
+
+        eligible = []
+        for index, record in records:
+            batch = batches.get(record.batch_id)
+            if batch is None:
+                self.reject(index, record.batch_id, "Партия не найдена")
+                continue
+            if batch.status not in DOSING_ALLOWED_STATUSES:
+                self.reject(index, record.batch_id, f"Партия в статусе {batch.status.value}")
+                continue
+            if batch.recipe_id not in self.recipes:
+                self.reject(index, record.batch_id, "Рецептура не найдена")
+                continue
+            eligible.append((index, record, batch))
+        if not eligible:
+            return
+        claimed = await claim_batches(
+            self.db, [batch for _, _, batch in eligible], "complete_dosing", self.user_id
+        )
+
+        accepted = []
+        planned_rows = []
+        for index, record, batch in eligible:
+            if batch.id not in claimed:
+                self.reject(index, record.batch_id, "Статус партии изменен параллельным запросом")
+                continue
+            recipe = self.recipes[batch.recipe_id]
+            planned = await setpoint_engine.targets(self.db, recipe, batch.volume_m3)
+            accepted.append((record, batch))
+            planned_rows.append([planned[c] for c in DOSING_COMPONENTS])
+        if not accepted:
+            return
+
+        # Отклонения всего блока одним расчетом по массивам (партии × компоненты)
+        actual = np.array(
+            [[getattr(record, f"actual_{c}") for c in DOSING_COMPONENTS] for record, _ in accepted], dtype=float
+        )
+        planned = np.array(planned_rows, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            deviation = np.where(planned == 0, 0.0, (actual - planned) / planned * 100)
+
+        now = datetime.now()
+        batch_rows = []
+        log_rows = []
+        consumption = []
+        for (record, batch), actual_kg, planned_kg, deviation_pct in zip(
+            accepted, actual.tolist(), planned.tolist(), deviation.tolist()
+        ):
+            timestamp = record.timestamp or now
+            row = {
+                "id": batch.id,
+                "started_at": batch.started_at or timestamp,
+            }
+            row.update({f"actual_{c}_kg": kg for c, kg in zip(DOSING_COMPONENTS, actual_kg)})
+            row.update({
+                f"deviation_{c}_pct": pct for c, pct in zip(DOSING_COMPONENTS, deviation_pct)
+                if c in DEVIATION_COMPONENTS
+            })
+            batch_rows.append(row)
+            consumption.append((batch.id, dict(zip(DOSING_COMPONENTS, actual_kg))))
+
+            log_rows.extend(
+                {
+                    "batch_id": batch.id,
+                    "component_type": c,
+                    "planned_kg": planned_c,
+                    "actual_kg": actual_c,
+                    "deviation_pct": deviation_c,
+                    "timestamp": timestamp,
+                }
+                for c, planned_c, actual_c, deviation_c in zip(DOSING_COMPONENTS, planned_kg, actual_kg, deviation_pct)
+                if planned_c > 0
+            )
+
+        model = await strength_predictor.current(self.db)
+        if model is not None:
+            predictions = model.predict_many(
+                ({**row, "volume_m3": batches[row["id"]].volume_m3}, self.recipes[batches[row["id"]].recipe_id])
+                for row in batch_rows
+            )
+            for row, strength in zip(batch_rows, predictions):
+                row["predicted_strength_mpa"] = strength
+                row["strength_model_version"] = model.version
+        await self.db.execute(update(Batch), batch_rows)
+        if log_rows:
+            await self.db.execute(insert(DosingLog), log_rows)
+            await add_to_rollups(self.db, (
+                (batches[row["batch_id"]].recipe_id, row["component_type"], row["deviation_pct"], row["timestamp"])
+                for row in log_rows
+            ))
+        await consume_for_batches(self.db, consumption)
+        self.accepted += len(batch_rows)
+        self.dosing_logs += len(log_rows)
+
+    def result(self) -> BulkDosingResult:
+        return BulkDosingResult(
+            accepted=self.accepted,
+            rejected=self.rejected,
+            dosing_logs=self.dosing_logs,
+            errors=sorted(self.errors, key=lambda error: error.index),
+        )
@@ -0,0 +1,157 @@
+"""
+Потоковая выгрузка результатов запросов в CSV и Parquet
+
+Строки читаются блоками через серверный курсор (`yield_per`) и сразу
+отправляются клиенту, поэтому память не растёт с размером выгрузки.
+Parquet доступен при установленном `pyarrow` (необязательная зависимость).
+"""
+import csv
+import enum
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator, List, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Boolean, DateTime, Float, Integer, Select
+
+from backend.database import AsyncSessionLocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Количество строк, читаемых и отправляемых за один раз
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+async def stream_partitions(query: Select, session_factory=AsyncSessionLocal) -> AsyncIterator[Sequence]:
+    """Результат запроса блоками по EXPORT_CHUNK_SIZE строк.
+
+    Сессия открывается внутри генератора: ответ отправляется уже после
+    выхода из зависимостей запроса.
+    """
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        async for partition in result.partitions():
+            yield partition
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _csv_cell(value):
+    value = _plain(value)
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+async def csv_stream(columns: List[str], partitions: AsyncIterator[Sequence]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM нужен Excel, чтобы открыть кириллицу в UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    async for rows in partitions:
+        writer.writerows([_csv_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _arrow_type(column_type):
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+class _StreamSink(io.RawIOBase):
+    """Файл для ParquetWriter, из которого записанное забирается по частям"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def parquet_stream(
+    columns: List[Tuple[str, object]],
+    partitions: AsyncIterator[Sequence],
+) -> AsyncIterator[bytes]:
+    """Parquet: одна группа строк на блок. columns — [(имя, тип SQLAlchemy)]"""
+    schema = pa.schema([(name, _arrow_type(column_type)) for name, column_type in columns])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema)
+    async for rows in partitions:
+        arrays = [
+            pa.array([_plain(row[i]) for row in rows], type=field.type)
+            for i, field in enumerate(schema)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_response(query: Select, fmt: str, filename: str) -> StreamingResponse:
+    """Потоковый ответ с результатом запроса; имена колонок — метки select"""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Формат должен быть одним из: {', '.join(EXPORT_FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Выгрузка в Parquet недоступна: не установлен pyarrow")
+
+    columns = [(column.name, column.type) for column in query.selected_columns]
+    partitions = stream_partitions(query)
+    if fmt == "csv":
+        body = csv_stream([name for name, _ in columns], partitions)
+    else:
+        body = parquet_stream(columns, partitions)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -0,0 +1,250 @@
+"""
+Клиенты полевых шин на asyncio: Modbus TCP и MQTT 3.1.1
+
+Реализовано ровно то, что нужно шлюзу оборудования (backend/gateway.py):
+чтение регистров хранения и входных регистров Modbus (функции 3 и 4) и
+подписка/публикация MQTT с QoS 0. Кадры разбираются здесь же, без
+сторонних библиотек; те же функции кодирования использует имитатор
+оборудования (backend/simulators.py).
+"""
+import asyncio
+import itertools
+import struct
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+# Функции Modbus: чтение регистров хранения и входных регистров
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+
+# Коды состояния оборудования в регистре Modbus (соглашение шлюза и контроллеров)
+STATUS_CODES = {0: "idle", 1: "working", 2: "error", 3: "maintenance"}
+
+# Типы пакетов MQTT (старшие 4 бита первого байта)
+MQTT_CONNECT = 1
+MQTT_CONNACK = 2
+MQTT_PUBLISH = 3
+MQTT_SUBSCRIBE = 8
+MQTT_SUBACK = 9
+MQTT_PINGREQ = 12
+MQTT_PINGRESP = 13
+MQTT_DISCONNECT = 14
+
+
+class FieldbusError(Exception):
+    """Ошибка обмена с устройством или брокером"""
+
+
+# ============= MODBUS TCP =============
+
+def modbus_request(transaction_id: int, unit: int, function: int, address: int, count: int) -> bytes:
+    """Кадр запроса чтения регистров (MBAP + PDU)"""
+    return struct.pack(">HHHBBHH", transaction_id, 0, 6, unit, function, address, count)
+
+
+async def read_modbus_frame(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """Кадр Modbus TCP: (transaction_id, unit, PDU)"""
+    header = await reader.readexactly(7)
+    transaction_id, protocol, length, unit = struct.unpack(">HHHB", header)
+    if protocol != 0 or length < 2:
+        raise FieldbusError(f"Некорректный кадр Modbus (протокол {protocol}, длина {length})")
+    return transaction_id, unit, await reader.readexactly(length - 1)
+
+
+def modbus_frame(transaction_id: int, unit: int, pdu: bytes) -> bytes:
+    return struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, unit) + pdu
+
+
+class ModbusClient:
+    """Соединение с устройством Modbus TCP; запросы выполняются по одному"""
+
+    def __init__(self, host: str, port: int = 502, timeout: float = 1.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._transactions = itertools.count(1)
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def read_registers(
+        self, unit: int, address: int, count: int, function: int = READ_HOLDING_REGISTERS
+    ) -> List[int]:
+        """Значения `count` регистров начиная с `address`; при ошибке соединение закрывается"""
+        async with self._lock:
+            try:
+                if not self.connected:
+                    await self.connect()
+                transaction_id = next(self._transactions) & 0xFFFF
+                self._writer.write(modbus_request(transaction_id, unit, function, address, count))
+                await self._writer.drain()
+                reply_id, reply_unit, pdu = await asyncio.wait_for(read_modbus_frame(self._reader), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, FieldbusError) as e:
+                await self.close()
+                raise FieldbusError(f"Modbus {self.host}:{self.port}: {e or type(e).__name__}") from e
+        if reply_id != transaction_id or reply_unit != unit:
+            await self.close()
+            raise FieldbusError(f"Modbus {self.host}:{self.port}: ответ на чужой запрос")
+        if pdu[0] == function | 0x80:
+            raise FieldbusError(f"Modbus {self.host}:{self.port} unit {unit}: исключение {pdu[1]}")
+        if pdu[0] != function or pdu[1] != 2 * count:
+            raise FieldbusError(f"Modbus {self.host}:{self.port}: неожиданный ответ функции {pdu[0]}")
+        return list(struct.unpack(f">{count}H", pdu[2:2 + 2 * count]))
+
+
+# ============= MQTT =============
+
+def _encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def _encode_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack(">H", len(data)) + data
+
+
+def mqtt_packet(packet_type: int, flags: int, body: bytes = b"") -> bytes:
+    return bytes([packet_type << 4 | flags]) + _encode_length(len(body)) + body
+
+
+def mqtt_publish(topic: str, payload: bytes) -> bytes:
+    """PUBLISH с QoS 0"""
+    return mqtt_packet(MQTT_PUBLISH, 0, _encode_string(topic) + payload)
+
+
+def parse_publish(flags: int, body: bytes) -> Tuple[str, bytes]:
+    """Тема и данные PUBLISH (идентификатор пакета при QoS > 0 пропускается)"""
+    (length,) = struct.unpack(">H", body[:2])
+    topic = body[2:2 + length].decode("utf-8")
+    offset = 2 + length + (2 if flags & 0x06 else 0)
+    return topic, body[offset:]
+
+
+def parse_strings(data: bytes) -> Iterable[Tuple[str, bytes]]:
+    """Строки с длиной и байт после каждой (тема и QoS в SUBSCRIBE)"""
+    offset = 0
+    while offset < len(data):
+        (length,) = struct.unpack(">H", data[offset:offset + 2])
+        value = data[offset + 2:offset + 2 + length].decode("utf-8")
+        offset += 2 + length
+        yield value, data[offset:offset + 1]
+        offset += 1
+
+
+async def read_mqtt_packet(reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+    """Пакет MQTT: (тип, флаги, тело)"""
+    first = (await reader.readexactly(1))[0]
+    length = shift = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+        if shift > 21:
+            raise FieldbusError("Некорректная длина пакета MQTT")
+    return first >> 4, first & 0x0F, await reader.readexactly(length)
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """Совпадение темы с фильтром подписки (`+` — один уровень, `#` — остаток)"""
+    pattern_levels = pattern.split("/")
+    topic_levels = topic.split("/")
+    for index, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if index >= len(topic_levels) or (level != "+" and level != topic_levels[index]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+class MqttClient:
+    """Клиент MQTT 3.1.1 с QoS 0: подписка, публикация, поддержание соединения"""
+
+    def __init__(self, host: str, port: int = 1883, client_id: str = "beton-gateway", keepalive: int = 30):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.keepalive = keepalive
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._ping: Optional[asyncio.Task] = None
+        self._packet_ids = itertools.count(1)
+
+    async def connect(self, timeout: float = 5.0):
+        self._reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), timeout)
+        # Протокол MQTT 3.1.1, чистая сессия
+        body = _encode_string("MQTT") + bytes([4, 0x02]) + struct.pack(">H", self.keepalive)
+        self._writer.write(mqtt_packet(MQTT_CONNECT, 0, body + _encode_string(self.client_id)))
+        packet_type, _, reply = await asyncio.wait_for(read_mqtt_packet(self._reader), timeout)
+        if packet_type != MQTT_CONNACK or reply[1] != 0:
+            await self.close()
+            raise FieldbusError(f"MQTT {self.host}:{self.port}: брокер отклонил подключение ({reply[1:2].hex()})")
+        if self.keepalive:
+            self._ping = asyncio.create_task(self._keepalive())
+
+    async def _keepalive(self):
+        # Разрыв соединения заметит чтение в messages()
+        try:
+            while True:
+                await asyncio.sleep(self.keepalive / 2)
+                self._writer.write(mqtt_packet(MQTT_PINGREQ, 0))
+                await self._writer.drain()
+        except (OSError, AttributeError):
+            pass
+
+    async def subscribe(self, topics: Iterable[str]):
+        """Подписка с QoS 0; SUBACK приходит в потоке `messages()`"""
+        payload = b"".join(_encode_string(topic) + b"\x00" for topic in topics)
+        packet_id = next(self._packet_ids) & 0xFFFF
+        self._writer.write(mqtt_packet(MQTT_SUBSCRIBE, 0x02, struct.pack(">H", packet_id) + payload))
+        await self._writer.drain()
+
+    async def publish(self, topic: str, payload: bytes):
+        self._writer.write(mqtt_publish(topic, payload))
+        await self._writer.drain()
+
+    async def messages(self) -> AsyncIterator[Tuple[str, bytes]]:
+        """Входящие публикации до разрыва соединения"""
+        try:
+            while True:
+                packet_type, flags, body = await read_mqtt_packet(self._reader)
+                if packet_type == MQTT_PUBLISH:
+                    yield parse_publish(flags, body)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            raise FieldbusError(f"MQTT {self.host}:{self.port}: соединение разорвано") from e
+
+    async def close(self):
+        if self._ping is not None:
+            self._ping.cancel()
+            self._ping = None
+        if self._writer is not None:
+            try:
+                self._writer.write(mqtt_packet(MQTT_DISCONNECT, 0))
+                self._writer.close()
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
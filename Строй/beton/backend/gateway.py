@@ -0,0 +1,458 @@
+"""
+Шлюз оборудования: опрос Modbus TCP и подписка MQTT
+
+Каждое устройство Modbus опрашивается своей задачей asyncio одним запросом
+на блок регистров. Интервал опроса адаптивный: при изменении регистров он
+сокращается вдвое (до min_interval_ms), пока значения стоят — растет в
+полтора раза (до max_interval_ms). Устройства, публикующие состояние в MQTT,
+присылают JSON в тему `<topic_prefix><название оборудования>`.
+
+Обновления не пишутся в БД по одному: последнее состояние каждого устройства
+накапливается в памяти (повторные обновления склеиваются) и раз в
+GATEWAY_FLUSH_MS сбрасывается одним INSERT ... ON CONFLICT DO UPDATE в
+`equipment_status` (на других СУБД — UPDATE/INSERT по строке, backend/upsert.py) —
+только для устройств, состояние которых изменилось или не подтверждалось
+дольше GATEWAY_HEARTBEAT_SEC. Показания датчиков в той же
+транзакции уходят во временные ряды (backend/telemetry.py). Если БД
+недоступна, накопленное возвращается в буфер и пишется следующим сбросом.
+
+Конфигурация — JSON-файл GATEWAY_CONFIG (пример пишет
+`python -m backend.simulators --config gateway.json`). Шлюз запускается
+вместе с API; при нескольких процессах uvicorn его лучше запускать отдельно:
+
+    python -m backend.gateway --config gateway.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from backend import telemetry
+from backend.database import AsyncSessionLocal
+from backend.fieldbus import READ_HOLDING_REGISTERS, STATUS_CODES, FieldbusError, ModbusClient, MqttClient
+from backend.live_events import equipment_event, queue_event
+from backend.models import EquipmentStatus
+from backend.schemas import TelemetryBatch
+from backend.upsert import upsert
+
+# Путь к JSON-конфигурации шлюза; пусто — шлюз не запускается
+GATEWAY_CONFIG = os.getenv("GATEWAY_CONFIG", "")
+
+# Период сброса накопленных обновлений в БД (мс)
+GATEWAY_FLUSH_MS = float(os.getenv("GATEWAY_FLUSH_MS", "500"))
+
+# Сколько показаний накопить до внепланового сброса
+GATEWAY_FLUSH_READINGS = int(os.getenv("GATEWAY_FLUSH_READINGS", "20000"))
+
+# Сколько показаний держать в памяти, пока БД недоступна (старые отбрасываются)
+GATEWAY_MAX_BUFFERED = int(os.getenv("GATEWAY_MAX_BUFFERED", "200000"))
+
+# Как часто подтверждать неизменное состояние в БД (обновлять last_update), сек
+GATEWAY_HEARTBEAT_SEC = float(os.getenv("GATEWAY_HEARTBEAT_SEC", "30"))
+
+# Сколько неудачных опросов подряд до перевода устройства в error
+GATEWAY_FAILURES_BEFORE_ERROR = int(os.getenv("GATEWAY_FAILURES_BEFORE_ERROR", "3"))
+
+# Таймаут запроса Modbus и пауза перед переподключением к брокеру MQTT (сек)
+GATEWAY_MODBUS_TIMEOUT_SEC = float(os.getenv("GATEWAY_MODBUS_TIMEOUT_SEC", "1"))
+GATEWAY_RECONNECT_SEC = float(os.getenv("GATEWAY_RECONNECT_SEC", "5"))
+
+# Строк equipment_status в одном INSERT
+GATEWAY_UPSERT_CHUNK = 500
+
+STATE_FIELDS = ("status", "is_operational", "error_message")
+
+
+def _replace_state(table, new) -> dict:
+    """Состояние и время из новой строки (new — столбцы excluded или значения)"""
+    return {field: new[field] for field in (*STATE_FIELDS, "last_update")}
+
+
+def load_config(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+class ModbusDevice:
+    """Устройство Modbus: блок регистров, разбор и адаптивный интервал опроса"""
+
+    def __init__(self, config: dict):
+        self.name = config["equipment"]
+        self.equipment_type = config.get("equipment_type")
+        self.host = config["host"]
+        self.port = config.get("port", 502)
+        self.unit = config.get("unit", 1)
+        self.function = config.get("function", READ_HOLDING_REGISTERS)
+        self.status_register = config.get("status_register")
+        self.metrics: Dict[str, Tuple[int, float]] = {
+            metric: (spec["register"], spec.get("scale", 1.0))
+            for metric, spec in config.get("metrics", {}).items()
+        }
+        registers = list(self.metrics.values())
+        addresses = [register for register, _ in registers]
+        if self.status_register is not None:
+            addresses.append(self.status_register)
+        if not addresses:
+            raise ValueError(f"У устройства {self.name} не заданы регистры")
+        # Все регистры устройства читаются одним запросом
+        self.address = min(addresses)
+        self.count = max(addresses) - self.address + 1
+        self.min_interval = config.get("min_interval_ms", 200) / 1000
+        self.max_interval = max(config.get("max_interval_ms", 5000) / 1000, self.min_interval)
+        self.interval = self.min_interval
+        self.registers: Optional[List[int]] = None
+        self.failures = 0
+        self.polls = 0
+        self.errors = 0
+
+    def decode(self, registers: List[int]) -> Tuple[dict, Dict[str, float]]:
+        """Состояние (поля equipment_status) и показания по регистрам"""
+        state = {"is_operational": True, "error_message": None}
+        if self.status_register is not None:
+            code = registers[self.status_register - self.address]
+            status = STATUS_CODES.get(code)
+            state["status"] = status or "error"
+            state["is_operational"] = status not in (None, "error", "maintenance")
+            if status is None or status == "error":
+                state["error_message"] = f"Код состояния устройства: {code}"
+        readings = {
+            metric: registers[register - self.address] * scale
+            for metric, (register, scale) in self.metrics.items()
+        }
+        return state, readings
+
+    def adapt(self, registers: List[int]):
+        """Чаще опрашивает меняющееся устройство, реже — стоящее"""
+        if registers != self.registers:
+            self.interval = max(self.interval / 2, self.min_interval)
+        else:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+        self.registers = registers
+
+
+class Gateway:
+    """Опрос устройств и пакетная запись состояния и показаний в БД"""
+
+    def __init__(self, config: dict, session_factory=AsyncSessionLocal, flush_ms: float = GATEWAY_FLUSH_MS):
+        self.devices = [ModbusDevice(device) for device in config.get("modbus", [])]
+        self.brokers = config.get("mqtt", [])
+        self.session_factory = session_factory
+        self.flush_interval = flush_ms / 1000
+        # Последнее записанное в БД состояние и тип по названию оборудования
+        self._state: Dict[str, tuple] = {}
+        self._types: Dict[str, Optional[str]] = {}
+        self._written_at: Dict[str, float] = {}
+        # Накопленные с прошлого сброса состояния и показания
+        self._pending: Dict[str, dict] = {}
+        self._readings: Dict[Tuple[str, str], list] = {}
+        self._buffered = 0
+        self._reload = False
+        self._reloaded_at = time.monotonic()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._polling = False
+        self._tasks: List[asyncio.Task] = []
+        self._started_at = time.monotonic()
+        self.polls = 0
+        self.poll_errors = 0
+        self.mqtt_messages = 0
+        self.mqtt_invalid = 0
+        self.unknown_equipment = 0
+        self.updates = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.rows_written = 0
+        self.readings_written = 0
+        self.readings_dropped = 0
+        self.last_flush_ms = 0.0
+
+    async def _load_equipment(self):
+        """Создает оборудование из конфигурации и читает текущее состояние"""
+        async with self.session_factory() as db:
+            configured = {device.name: device.equipment_type for device in self.devices}
+            if configured:
+                await upsert(db, EquipmentStatus.__table__, [
+                    {"equipment_name": name, "equipment_type": equipment_type, "status": "idle"}
+                    for name, equipment_type in sorted(configured.items())
+                ], ("equipment_name",))
+                await db.commit()
+            rows = await db.execute(select(
+                EquipmentStatus.equipment_name, EquipmentStatus.equipment_type,
+                EquipmentStatus.status, EquipmentStatus.is_operational, EquipmentStatus.error_message,
+            ))
+            for name, equipment_type, *state in rows:
+                self._types[name] = equipment_type
+                self._state.setdefault(name, tuple(state))
+
+    async def start(self):
+        await self._load_equipment()
+        self._stopping = False
+        self._polling = True
+        self._started_at = time.monotonic()
+        self._tasks = [asyncio.create_task(self._poll(device)) for device in self.devices]
+        self._tasks += [asyncio.create_task(self._subscribe(broker)) for broker in self.brokers]
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+
+    async def stop(self):
+        """Останавливает опрос и дописывает накопленное"""
+        pollers, flusher = self._tasks[:-1], self._tasks[-1:]
+        # asyncio.wait_for в Python 3.11 теряет отмену, если ответ пришел в тот же
+        # момент: циклы опроса проверяют флаг и завершаются на следующем круге
+        self._polling = False
+        for task in pollers:
+            task.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        # Сброс не отменяется посреди транзакции: цикл допишет буфер и завершится сам
+        self._stopping = True
+        self._wake.set()
+        await asyncio.gather(*flusher, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    def submit(self, name: str, state: dict, readings: Dict[str, float], ts: Optional[datetime] = None):
+        """Принимает обновление устройства; пишется в БД ближайшим сбросом"""
+        if name not in self._types:
+            self.unknown_equipment += 1
+            self._reload = True
+            return
+        self.updates += 1
+        if state:
+            pending = self._pending.get(name)
+            if pending is None:
+                self._pending[name] = dict(state)
+            else:
+                pending.update(state)
+                self.coalesced += 1
+        if readings:
+            ts = ts or datetime.now()
+            for metric, value in readings.items():
+                self._readings.setdefault((name, metric), []).append((ts, value))
+            self._buffered += len(readings)
+            if self._buffered >= GATEWAY_FLUSH_READINGS:
+                self._wake.set()
+
+    async def _poll(self, device: ModbusDevice):
+        client = ModbusClient(device.host, device.port, GATEWAY_MODBUS_TIMEOUT_SEC)
+        loop = asyncio.get_running_loop()
+        try:
+            while self._polling:
+                started = loop.time()
+                try:
+                    registers = await client.read_registers(device.unit, device.address, device.count, device.function)
+                except FieldbusError as e:
+                    device.errors += 1
+                    device.failures += 1
+                    self.poll_errors += 1
+                    if device.failures == GATEWAY_FAILURES_BEFORE_ERROR:
+                        self.submit(device.name, {
+                            "status": "error", "is_operational": False, "error_message": f"Нет связи: {e}",
+                        }, {})
+                    # Недоступное устройство опрашивается с наибольшим интервалом
+                    device.interval = device.max_interval
+                else:
+                    device.polls += 1
+                    device.failures = 0
+                    self.polls += 1
+                    device.adapt(registers)
+                    self.submit(device.name, *device.decode(registers))
+                await asyncio.sleep(max(device.interval - (loop.time() - started), 0))
+        finally:
+            await client.close()
+
+    async def _subscribe(self, broker: dict):
+        prefix = broker.get("topic_prefix", "beton/equipment/")
+        while self._polling:
+            client = MqttClient(broker["host"], broker.get("port", 1883), broker.get("client_id", f"beton-gateway-{os.getpid()}"))
+            try:
+                await client.connect()
+                await client.subscribe([prefix + "#"])
+                async for topic, payload in client.messages():
+                    self.on_message(topic[len(prefix):], payload)
+            except (FieldbusError, OSError, asyncio.TimeoutError) as e:
+                print(f"Шлюз: брокер MQTT {client.host}:{client.port} недоступен: {e}")
+            finally:
+                await client.close()
+            await asyncio.sleep(GATEWAY_RECONNECT_SEC)
+
+    def on_message(self, name: str, payload: bytes):
+        """Сообщение MQTT: {status, is_operational, error_message, readings: {величина: значение}, ts}"""
+        self.mqtt_messages += 1
+        try:
+            data = json.loads(payload)
+            state = {field: data[field] for field in STATE_FIELDS if field in data}
+            readings = {
+                metric: float(value) for metric, value in (data.get("readings") or {}).items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+            }
+            ts = telemetry.local_time(datetime.fromisoformat(data["ts"])) if data.get("ts") else None
+        except (ValueError, TypeError, AttributeError):
+            self.mqtt_invalid += 1
+            return
+        self.submit(name, state, readings, ts)
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def _requeue(self, pending: Dict[str, dict], readings: Dict[Tuple[str, str], list], count: int):
+        """Возвращает несохраненное в буфер (новые обновления важнее старых)"""
+        for name, state in pending.items():
+            self._pending[name] = {**state, **self._pending.get(name, {})}
+        if self._buffered + count > GATEWAY_MAX_BUFFERED:
+            self.readings_dropped += count
+            return
+        for key, points in readings.items():
+            self._readings[key] = points + self._readings.get(key, [])
+        self._buffered += count
+
+    async def flush(self):
+        """Пишет накопленное одной транзакцией: upsert состояний и показания"""
+        # Новое оборудование из неизвестных тем подхватывается не чаще раза в GATEWAY_HEARTBEAT_SEC
+        if self._reload and time.monotonic() - self._reloaded_at >= GATEWAY_HEARTBEAT_SEC:
+            self._reload = False
+            self._reloaded_at = time.monotonic()
+            try:
+                await self._load_equipment()
+            except Exception as e:
+                print(f"Шлюз: не удалось обновить список оборудования: {e}")
+        now = time.monotonic()
+        pending, self._pending = self._pending, {}
+        readings, self._readings = self._readings, {}
+        count, self._buffered = self._buffered, 0
+
+        rows = []
+        for name, update in pending.items():
+            previous = self._state.get(name, (None, None, None))
+            state = tuple(update.get(field, previous[index]) for index, field in enumerate(STATE_FIELDS))
+            if state != previous or now - self._written_at.get(name, 0) >= GATEWAY_HEARTBEAT_SEC:
+                rows.append((name, state, state != previous))
+        if not rows and not readings:
+            return
+
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as db:
+                for start in range(0, len(rows), GATEWAY_UPSERT_CHUNK):
+                    await self._upsert(db, rows[start:start + GATEWAY_UPSERT_CHUNK])
+                if readings:
+                    await telemetry.ingest(db, [
+                        TelemetryBatch.model_construct(equipment=name, metric=metric, points=points)
+                        for (name, metric), points in readings.items()
+                    ])
+                await db.commit()
+        except Exception as e:
+            self.flush_errors += 1
+            self._requeue(pending, readings, count)
+            print(f"Шлюз: ошибка записи в БД: {e}")
+            return
+
+        for name, state, _ in rows:
+            self._state[name] = state
+            self._written_at[name] = now
+        self.flushes += 1
+        self.rows_written += len(rows)
+        self.readings_written += count
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    async def _upsert(self, db, rows: list):
+        timestamp = datetime.now()
+        # Сортировка по ключу: одинаковый порядок блокировок при нескольких шлюзах
+        written = await upsert(db, EquipmentStatus.__table__, sorted([
+            {
+                "equipment_name": name,
+                "equipment_type": self._types.get(name),
+                "status": state[0],
+                "is_operational": state[1],
+                "error_message": state[2],
+                "last_update": timestamp,
+            }
+            for name, state, _ in rows
+        ], key=lambda row: row["equipment_name"]), ("equipment_name",), _replace_state, returning=(
+            EquipmentStatus.id, EquipmentStatus.equipment_name, EquipmentStatus.equipment_type,
+            EquipmentStatus.status, EquipmentStatus.is_operational, EquipmentStatus.error_message,
+        ))
+        changed = {name for name, _, is_changed in rows if is_changed}
+        for row in written:
+            if row.equipment_name in changed:
+                queue_event(db.sync_session, equipment_event(row))
+
+    def stats(self) -> dict:
+        uptime = max(time.monotonic() - self._started_at, 1e-9)
+        intervals = [device.interval for device in self.devices]
+        return {
+            "devices": len(self.devices),
+            "brokers": len(self.brokers),
+            "devices_offline": sum(device.failures >= GATEWAY_FAILURES_BEFORE_ERROR for device in self.devices),
+            "polls": self.polls,
+            "polls_per_sec": round(self.polls / uptime, 1),
+            "poll_errors": self.poll_errors,
+            "avg_interval_ms": round(sum(intervals) / len(intervals) * 1000, 1) if intervals else None,
+            "mqtt_messages": self.mqtt_messages,
+            "mqtt_invalid": self.mqtt_invalid,
+            "unknown_equipment": self.unknown_equipment,
+            "updates": self.updates,
+            "coalesced": self.coalesced,
+            "pending_devices": len(self._pending),
+            "pending_readings": self._buffered,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "rows_written": self.rows_written,
+            "readings_written": self.readings_written,
+            "readings_dropped": self.readings_dropped,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+
+# Шлюз, запущенный в этом процессе (None — не настроен)
+gateway: Optional[Gateway] = None
+
+
+async def start_gateway() -> Optional[Gateway]:
+    """Запускает шлюз по GATEWAY_CONFIG, если путь задан"""
+    global gateway
+    if not GATEWAY_CONFIG:
+        return None
+    gateway = Gateway(load_config(GATEWAY_CONFIG))
+    await gateway.start()
+    print(f"Шлюз оборудования: устройств Modbus {len(gateway.devices)}, брокеров MQTT {len(gateway.brokers)}")
+    return gateway
+
+
+async def stop_gateway():
+    global gateway
+    if gateway is not None:
+        await gateway.stop()
+        gateway = None
+
+
+async def run(config_path: str):
+    instance = Gateway(load_config(config_path))
+    await instance.start()
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(f"Шлюз: {instance.stats()}")
+    finally:
+        await instance.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Шлюз оборудования Modbus TCP / MQTT")
+    parser.add_argument("--config", default=GATEWAY_CONFIG, required=not GATEWAY_CONFIG)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.config))
+    except KeyboardInterrupt:
+        pass
@@ -2,16 +2,18 @@
 Скрипт для инициализации базы данных с тестовыми данными
 """
 from sqlalchemy.orm import Session
-from backend.database import SessionLocal, engine, Base
+from backend.database import SessionLocal, engine
+from backend.migrate import upgrade
 from backend.models import (
-    User, Recipe, Order, Batch, WarehouseMaterial, EquipmentStatus, UserRole
+    User, Recipe, Order, Batch, WarehouseMaterial, EquipmentStatus, UserRole, StockMovement
 )
 from backend import auth
 from datetime import datetime, timedelta
 
 def init_db():
     """Инициализация базы данных"""
-    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        upgrade(connection)
     db = SessionLocal()
     
     try:
@@ -143,13 +145,21 @@ def init_db():
             if not existing:
                 material = WarehouseMaterial(**mat_data)
                 db.add(material)
+                db.flush()
+                # Начальный остаток — первая запись журнала склада
+                db.add(StockMovement(
+                    material_id=material.id,
+                    quantity_kg=material.current_stock_kg,
+                    reason="receipt",
+                    comment="Начальный остаток"
+                ))
         
         # Создание оборудования
         equipment_list = [
             {"equipment_name": "Весы цемента", "equipment_type": "scale", "status": "working"},
             {"equipment_name": "Весы песка", "equipment_type": "scale", "status": "working"},
             {"equipment_name": "Весы щебня", "equipment_type": "scale", "status": "working"},
-            {"equipment_name": "Смеситель №1", "equipment_type": "mixer", "status": "idle"},
+            {"equipment_name": "Смеситель №1", "equipment_type": "mixer", "status": "idle", "capacity_m3": 3.0},
             {"equipment_name": "Конвейер №1", "equipment_type": "conveyor", "status": "working"},
             {"equipment_name": "Силос цемента №1", "equipment_type": "silo", "status": "working"},
         ]
@@ -0,0 +1,228 @@
+"""
+Поток событий производства для экранов мониторинга (SSE / WebSocket)
+
+События собираются из изменений сессии SQLAlchemy и рассылаются подписчикам
+только после успешного коммита:
+- batch      — смена статуса партии (запуск, дозирование, завершение)
+- equipment  — смена статуса оборудования
+- low_stock  — остаток материала опустился до минимального
+
+У каждого подписчика ограниченная очередь: медленный клиент теряет самые
+старые события и получает уведомление `lagged`, не задерживая остальных.
+"""
+import asyncio
+import json
+import os
+from itertools import chain
+from typing import List, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend.models import Batch, EquipmentStatus, WarehouseMaterial
+
+# Размер очереди одного подписчика
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+
+EVENT_TYPES = ("batch", "equipment", "low_stock")
+
+
+class Subscription:
+    """Подписка одного клиента с фильтром и ограниченной очередью"""
+
+    def __init__(
+        self,
+        types: Optional[Set[str]] = None,
+        order_id: Optional[int] = None,
+        batch_id: Optional[int] = None,
+        equipment_type: Optional[str] = None,
+        maxsize: int = LIVE_QUEUE_SIZE,
+    ):
+        self.types = types or set(EVENT_TYPES)
+        self.order_id = order_id
+        self.batch_id = batch_id
+        self.equipment_type = equipment_type
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def matches(self, data: dict) -> bool:
+        if data["type"] not in self.types:
+            return False
+        if data["type"] == "batch":
+            if self.order_id is not None and data["order_id"] != self.order_id:
+                return False
+            if self.batch_id is not None and data["id"] != self.batch_id:
+                return False
+        if data["type"] == "equipment":
+            if self.equipment_type is not None and data["equipment_type"] != self.equipment_type:
+                return False
+        return True
+
+    def offer(self, message: tuple) -> bool:
+        """Кладёт событие в очередь, вытесняя самое старое при переполнении"""
+        dropped = False
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            dropped = True
+        self.queue.put_nowait(message)
+        return dropped
+
+    async def get(self) -> List[tuple]:
+        """Следующие сообщения (event_type, json); первым — уведомление о потерях"""
+        message = await self.queue.get()
+        if not self.dropped:
+            return [message]
+        lagged = json.dumps({"type": "lagged", "dropped": self.dropped})
+        self.dropped = 0
+        return [("lagged", lagged), message]
+
+
+class LiveBroker:
+    """Рассылка событий подписчикам текущего процесса"""
+
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, subscription: Subscription) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, data: dict):
+        """Отправляет событие; безопасно вызывать из любого потока"""
+        if not self._subscriptions:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._dispatch(data)
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, data)
+        except RuntimeError:
+            # Цикл подписчиков закрыт (перезапуск lifespan, остановка процесса):
+            # их уже некому обслуживать, а коммит, вызвавший рассылку, не должен падать
+            self._subscriptions.clear()
+
+    def _dispatch(self, data: dict):
+        self.published += 1
+        # Сериализуем один раз для всех подписчиков
+        message = (data["type"], json.dumps(data, ensure_ascii=False, default=str))
+        for subscription in list(self._subscriptions):
+            if subscription.matches(data):
+                self.delivered += 1
+                if subscription.offer(message):
+                    self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+live_broker = LiveBroker()
+
+
+def queue_event(session: Session, data: dict):
+    """Добавляет событие к сессии; оно уйдёт подписчикам после коммита"""
+    session.info.setdefault("live_events", []).append(data)
+
+
+def batch_event(batch, status, previous_status) -> dict:
+    """Событие смены статуса партии (batch — модель или строка выборки)"""
+    return {
+        "type": "batch",
+        "id": batch.id,
+        "batch_number": batch.batch_number,
+        "order_id": batch.order_id,
+        "recipe_id": batch.recipe_id,
+        "status": _status_value(status),
+        "previous_status": _status_value(previous_status),
+    }
+
+
+def equipment_event(equipment) -> dict:
+    """Событие смены состояния оборудования (equipment — модель или строка выборки)"""
+    return {
+        "type": "equipment",
+        "id": equipment.id,
+        "equipment_name": equipment.equipment_name,
+        "equipment_type": equipment.equipment_type,
+        "status": equipment.status,
+        "is_operational": equipment.is_operational,
+        "error_message": equipment.error_message,
+    }
+
+
+def low_stock_event(material: WarehouseMaterial) -> dict:
+    return {
+        "type": "low_stock",
+        "id": material.id,
+        "material_type": material.material_type,
+        "material_name": material.material_name,
+        "storage_location": material.storage_location,
+        "current_stock_kg": material.current_stock_kg,
+        "min_stock_kg": material.min_stock_kg,
+    }
+
+
+def _changed(obj, *attrs) -> bool:
+    state = inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+def _previous(obj, attr):
+    deleted = inspect(obj).attrs[attr].history.deleted
+    return deleted[0] if deleted else None
+
+
+def _status_value(status):
+    return status.value if hasattr(status, "value") else status
+
+
+def _is_low(stock, min_stock) -> bool:
+    return stock is not None and min_stock is not None and stock <= min_stock
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_events(session, flush_context):
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Batch) and _changed(obj, "status"):
+            queue_event(session, batch_event(obj, obj.status, _previous(obj, "status")))
+        elif isinstance(obj, EquipmentStatus) and _changed(obj, "status", "is_operational", "error_message"):
+            queue_event(session, equipment_event(obj))
+        elif isinstance(obj, WarehouseMaterial) and _changed(obj, "current_stock_kg", "min_stock_kg"):
+            was_low = obj not in session.new and _is_low(
+                _previous(obj, "current_stock_kg") if _changed(obj, "current_stock_kg") else obj.current_stock_kg,
+                _previous(obj, "min_stock_kg") if _changed(obj, "min_stock_kg") else obj.min_stock_kg,
+            )
+            if _is_low(obj.current_stock_kg, obj.min_stock_kg) and not was_low:
+                queue_event(session, low_stock_event(obj))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    if session.in_nested_transaction():
+        return
+    for data in session.info.pop("live_events", ()):
+        live_broker.publish(data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("live_events", None)
@@ -1,21 +1,47 @@
 """
 Главный файл FastAPI приложения для автоматизации бетонного завода
 """
-from fastapi import FastAPI
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 
-from backend.database import engine, Base
+from backend.database import async_engine, async_writer_engine
+from backend.gateway import start_gateway, stop_gateway
+from backend.migrate import DB_AUTO_MIGRATE, upgrade
+from backend.profiling import (
+    METRICS_TOKEN, PROMETHEUS_CONTENT_TYPE, RequestMetricsMiddleware, render_prometheus
+)
+from backend.stock import STOCK_COMPACTION_INTERVAL_HOURS, run_compaction
+from backend.strength import STRENGTH_RETRAIN_INTERVAL_HOURS, run_retraining
+from backend.telemetry import TELEMETRY_RETENTION_INTERVAL_MIN, run_retention
 from backend.routers import (
     auth, orders, recipes, batches, warehouse, 
-    quality, monitoring, users
+    quality, monitoring, users, reports, analytics, telemetry
 )
 
-# Создание таблиц при запуске
+# Миграции схемы при запуске
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    if DB_AUTO_MIGRATE:
+        async with (async_writer_engine or async_engine).begin() as conn:
+            await conn.run_sync(upgrade)
+    compaction = asyncio.create_task(run_compaction()) if STOCK_COMPACTION_INTERVAL_HOURS > 0 else None
+    retention = asyncio.create_task(run_retention()) if TELEMETRY_RETENTION_INTERVAL_MIN > 0 else None
+    retraining = asyncio.create_task(run_retraining()) if STRENGTH_RETRAIN_INTERVAL_HOURS > 0 else None
+    await start_gateway()
     yield
+    await stop_gateway()
+    if compaction:
+        compaction.cancel()
+    if retention:
+        retention.cancel()
+    if retraining:
+        retraining.cancel()
+    await async_engine.dispose()
+    if async_writer_engine is not None:
+        await async_writer_engine.dispose()
 
 app = FastAPI(
     title="АСУ ТП Бетонного завода",
@@ -31,8 +57,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Время запросов и SQL по маршрутам (GET /metrics)
+app.add_middleware(RequestMetricsMiddleware)
+
 # Подключение роутеров
 app.include_router(auth.router, prefix="/api/auth", tags=["Аутентификация"])
 app.include_router(users.router, prefix="/api/users", tags=["Пользователи"])
@@ -42,6 +72,9 @@ app.include_router(batches.router, prefix="/api/batches", tags=["Партии"])
 app.include_router(warehouse.router, prefix="/api/warehouse", tags=["Склад"])
 app.include_router(quality.router, prefix="/api/quality", tags=["Качество"])
 app.include_router(monitoring.router, prefix="/api/monitoring", tags=["Мониторинг"])
+app.include_router(reports.router, prefix="/api/reports", tags=["Отчеты"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Аналитика"])
+app.include_router(telemetry.router, prefix="/api/telemetry", tags=["Телеметрия"])
 
 @app.get("/")
 async def root():
@@ -51,3 +84,9 @@ async def root():
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Метрики в текстовом формате Prometheus"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Неверный токен метрик")
+    return Response(content=render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
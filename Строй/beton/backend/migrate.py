@@ -0,0 +1,64 @@
+"""
+Миграции схемы БД (Alembic)
+
+Схема создается и обновляется миграциями из backend/migrations, а не
+`create_all`. Базы, созданные до появления миграций, помечаются исходной
+ревизией и догоняются обычным `upgrade`; базы, в которых `create_all` уже
+создал все таблицы и колонки текущих моделей, помечаются последней ревизией.
+
+Запуск вручную: `alembic upgrade head` или `python -m backend.migrate`.
+"""
+import os
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+
+from backend.database import Base, engine
+from backend import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Ревизия схемы, созданной create_all до появления миграций
+BASELINE_REVISION = "0001"
+
+# Применять миграции при запуске приложения. При нескольких воркерах лучше
+# отключить и запускать `alembic upgrade head` при деплое
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def matches_models(connection) -> bool:
+    """True, если в БД есть все таблицы и колонки текущих моделей (create_all)"""
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            return False
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        if not set(table.columns.keys()) <= columns:
+            return False
+    return True
+
+
+def upgrade(connection, revision: str = "head"):
+    """Обновляет схему до ревизии (синхронно; для AsyncConnection — через run_sync)"""
+    config = alembic_config(connection)
+    tables = set(inspect(connection).get_table_names())
+    if "alembic_version" not in tables and "users" in tables:
+        command.stamp(config, "head" if matches_models(connection) else BASELINE_REVISION)
+    command.upgrade(config, revision)
+
+
+if __name__ == "__main__":
+    with engine.begin() as connection:
+        upgrade(connection)
+    print("Схема БД обновлена")
@@ -0,0 +1,55 @@
+"""
+Окружение Alembic: метаданные моделей и подключение к БД
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from backend.database import DATABASE_URL, Base
+from backend import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def configure(**kwargs):
+    # render_as_batch: SQLite не умеет ALTER COLUMN, изменения идут через копию таблицы
+    context.configure(target_metadata=target_metadata, render_as_batch=True, compare_type=True, **kwargs)
+
+
+def run_migrations_offline():
+    """SQL-скрипт миграций без подключения к БД (alembic upgrade head --sql)"""
+    configure(url=DATABASE_URL, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection):
+    configure(connection=connection)
+    with context.begin_transaction():
+        if connection.dialect.name == "postgresql":
+            # Создание индекса на большой таблице может идти дольше DB_STATEMENT_TIMEOUT_MS
+            context.execute("SET LOCAL statement_timeout = 0")
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # Соединение передает backend.migrate при запуске приложения
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations(connection)
+        return
+
+    engine = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,183 @@
+"""Исходная схема (таблицы до появления миграций)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('equipment_status',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('equipment_name', sa.String(), nullable=False),
+    sa.Column('equipment_type', sa.String(), nullable=True),
+    sa.Column('is_operational', sa.Boolean(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('last_update', sa.DateTime(), nullable=True),
+    sa.Column('error_message', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_equipment_status_equipment_name'), 'equipment_status', ['equipment_name'], unique=True)
+    op.create_index(op.f('ix_equipment_status_id'), 'equipment_status', ['id'], unique=False)
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('full_name', sa.String(), nullable=True),
+    sa.Column('role', sa.Enum('OPERATOR', 'TECHNOLOGIST', 'SHIFT_MASTER', 'LABORATORY', 'PRODUCTION_HEAD', 'LOGISTICS', 'ADMIN', name='userrole'), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+    op.create_table('warehouse_materials',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('material_type', sa.String(), nullable=False),
+    sa.Column('material_name', sa.String(), nullable=False),
+    sa.Column('storage_location', sa.String(), nullable=True),
+    sa.Column('current_stock_kg', sa.Float(), nullable=True),
+    sa.Column('min_stock_kg', sa.Float(), nullable=True),
+    sa.Column('max_stock_kg', sa.Float(), nullable=True),
+    sa.Column('moisture_pct', sa.Float(), nullable=True),
+    sa.Column('last_updated', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_warehouse_materials_id'), 'warehouse_materials', ['id'], unique=False)
+    op.create_index(op.f('ix_warehouse_materials_material_type'), 'warehouse_materials', ['material_type'], unique=False)
+    op.create_table('recipes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('code', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('version', sa.Integer(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('is_gost', sa.Boolean(), nullable=True),
+    sa.Column('cement_kg', sa.Float(), nullable=False),
+    sa.Column('sand_kg', sa.Float(), nullable=False),
+    sa.Column('gravel_kg', sa.Float(), nullable=False),
+    sa.Column('water_kg', sa.Float(), nullable=False),
+    sa.Column('additive1_kg', sa.Float(), nullable=True),
+    sa.Column('additive2_kg', sa.Float(), nullable=True),
+    sa.Column('mixing_time_sec', sa.Integer(), nullable=True),
+    sa.Column('discharge_time_sec', sa.Integer(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_recipes_code'), 'recipes', ['code'], unique=True)
+    op.create_index(op.f('ix_recipes_id'), 'recipes', ['id'], unique=False)
+    op.create_index(op.f('ix_recipes_name'), 'recipes', ['name'], unique=False)
+    op.create_table('orders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_number', sa.String(), nullable=False),
+    sa.Column('concrete_grade', sa.String(), nullable=False),
+    sa.Column('volume_m3', sa.Float(), nullable=False),
+    sa.Column('planned_time', sa.DateTime(), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'IN_PROGRESS', 'COMPLETED', 'CANCELLED', name='orderstatus'), nullable=True),
+    sa.Column('recipe_id', sa.Integer(), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('customer_name', sa.String(), nullable=True),
+    sa.Column('delivery_address', sa.String(), nullable=True),
+    sa.Column('vehicle_number', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_orders_id'), 'orders', ['id'], unique=False)
+    op.create_index(op.f('ix_orders_order_number'), 'orders', ['order_number'], unique=True)
+    op.create_table('batches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_number', sa.String(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('recipe_id', sa.Integer(), nullable=False),
+    sa.Column('volume_m3', sa.Float(), nullable=False),
+    sa.Column('status', sa.Enum('PLANNED', 'DOSING', 'MIXING', 'DISCHARGING', 'COMPLETED', 'ERROR', name='batchstatus'), nullable=True),
+    sa.Column('actual_cement_kg', sa.Float(), nullable=True),
+    sa.Column('actual_sand_kg', sa.Float(), nullable=True),
+    sa.Column('actual_gravel_kg', sa.Float(), nullable=True),
+    sa.Column('actual_water_kg', sa.Float(), nullable=True),
+    sa.Column('actual_additive1_kg', sa.Float(), nullable=True),
+    sa.Column('actual_additive2_kg', sa.Float(), nullable=True),
+    sa.Column('deviation_cement_pct', sa.Float(), nullable=True),
+    sa.Column('deviation_sand_pct', sa.Float(), nullable=True),
+    sa.Column('deviation_gravel_pct', sa.Float(), nullable=True),
+    sa.Column('deviation_water_pct', sa.Float(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ),
+    sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_batches_batch_number'), 'batches', ['batch_number'], unique=True)
+    op.create_index(op.f('ix_batches_id'), 'batches', ['id'], unique=False)
+    op.create_table('dosing_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=False),
+    sa.Column('component_type', sa.String(), nullable=False),
+    sa.Column('planned_kg', sa.Float(), nullable=False),
+    sa.Column('actual_kg', sa.Float(), nullable=False),
+    sa.Column('deviation_pct', sa.Float(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['batches.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_dosing_logs_id'), 'dosing_logs', ['id'], unique=False)
+    op.create_table('quality_checks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=False),
+    sa.Column('mobility_cm', sa.Float(), nullable=True),
+    sa.Column('strength_mpa', sa.Float(), nullable=True),
+    sa.Column('moisture_pct', sa.Float(), nullable=True),
+    sa.Column('deviations', sa.Text(), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'APPROVED', 'REJECTED', name='qualitystatus'), nullable=True),
+    sa.Column('checked_by', sa.Integer(), nullable=True),
+    sa.Column('checked_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['batches.id'], ),
+    sa.ForeignKeyConstraint(['checked_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('batch_id')
+    )
+    op.create_index(op.f('ix_quality_checks_id'), 'quality_checks', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_quality_checks_id'), table_name='quality_checks')
+    op.drop_table('quality_checks')
+    op.drop_index(op.f('ix_dosing_logs_id'), table_name='dosing_logs')
+    op.drop_table('dosing_logs')
+    op.drop_index(op.f('ix_batches_id'), table_name='batches')
+    op.drop_index(op.f('ix_batches_batch_number'), table_name='batches')
+    op.drop_table('batches')
+    op.drop_index(op.f('ix_orders_order_number'), table_name='orders')
+    op.drop_index(op.f('ix_orders_id'), table_name='orders')
+    op.drop_table('orders')
+    op.drop_index(op.f('ix_recipes_name'), table_name='recipes')
+    op.drop_index(op.f('ix_recipes_id'), table_name='recipes')
+    op.drop_index(op.f('ix_recipes_code'), table_name='recipes')
+    op.drop_table('recipes')
+    op.drop_index(op.f('ix_warehouse_materials_material_type'), table_name='warehouse_materials')
+    op.drop_index(op.f('ix_warehouse_materials_id'), table_name='warehouse_materials')
+    op.drop_table('warehouse_materials')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_equipment_status_id'), table_name='equipment_status')
+    op.drop_index(op.f('ix_equipment_status_equipment_name'), table_name='equipment_status')
+    op.drop_table('equipment_status')
@@ -0,0 +1,120 @@
+"""Журнал склада, агрегаты отклонений и индексы пагинации/выгрузки
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Базы, созданные через create_all до появления миграций, могут уже
+содержать часть этих таблиц и индексов, поэтому таблицы и индексы
+создаются, только если их еще нет.
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('deviation_histograms'):
+        op.create_table('deviation_histograms',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recipe_id', sa.Integer(), nullable=False),
+        sa.Column('component_type', sa.String(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('shift', sa.Integer(), nullable=False),
+        sa.Column('bin', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('recipe_id', 'component_type', 'day', 'shift', 'bin', name='uq_deviation_histograms_key')
+        )
+    op.create_index('ix_deviation_histograms_day', 'deviation_histograms', ['day'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_deviation_histograms_id'), 'deviation_histograms', ['id'], unique=False, if_not_exists=True)
+    if not inspector.has_table('deviation_rollups'):
+        op.create_table('deviation_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recipe_id', sa.Integer(), nullable=False),
+        sa.Column('component_type', sa.String(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('shift', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('sum_pct', sa.Float(), nullable=False),
+        sa.Column('sum_sq_pct', sa.Float(), nullable=False),
+        sa.Column('min_pct', sa.Float(), nullable=True),
+        sa.Column('max_pct', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['recipe_id'], ['recipes.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('recipe_id', 'component_type', 'day', 'shift', name='uq_deviation_rollups_key')
+        )
+    op.create_index('ix_deviation_rollups_day', 'deviation_rollups', ['day'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_deviation_rollups_id'), 'deviation_rollups', ['id'], unique=False, if_not_exists=True)
+    if not inspector.has_table('stock_movements'):
+        op.create_table('stock_movements',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('material_id', sa.Integer(), nullable=False),
+        sa.Column('quantity_kg', sa.Float(), nullable=False),
+        sa.Column('reason', sa.String(), nullable=False),
+        sa.Column('batch_id', sa.Integer(), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('comment', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['batch_id'], ['batches.id'], ),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['material_id'], ['warehouse_materials.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    op.create_index('ix_stock_movements_created_at', 'stock_movements', ['created_at'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_stock_movements_id'), 'stock_movements', ['id'], unique=False, if_not_exists=True)
+    op.create_index('ix_stock_movements_material_id_created_at', 'stock_movements', ['material_id', 'created_at'], unique=False, if_not_exists=True)
+    # Начальный остаток — первая запись журнала, как в init_db и при создании материала.
+    # Для материалов, созданных до журнала, это весь остаток; если журнал уже был
+    # (create_all), — только часть остатка, которую журнал не объясняет
+    op.execute(sa.text("""
+        INSERT INTO stock_movements (material_id, quantity_kg, reason, comment, created_at)
+        SELECT id, current_stock_kg - logged_kg, 'receipt', 'Начальный остаток', :now
+        FROM (
+            SELECT m.id, m.current_stock_kg,
+                   COALESCE((SELECT SUM(s.quantity_kg) FROM stock_movements s WHERE s.material_id = m.id), 0) AS logged_kg
+            FROM warehouse_materials m
+            WHERE m.current_stock_kg IS NOT NULL
+        ) balances
+        WHERE current_stock_kg <> logged_kg
+    """).bindparams(now=datetime.now()))
+    op.create_index('ix_batches_created_at_id', 'batches', ['created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_batches_order_id_created_at', 'batches', ['order_id', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_batches_status_created_at', 'batches', ['status', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_dosing_logs_batch_id', 'dosing_logs', ['batch_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_dosing_logs_timestamp_id', 'dosing_logs', ['timestamp', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_orders_status_created_at', 'orders', ['status', 'created_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_quality_checks_checked_at_id', 'quality_checks', ['checked_at', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_quality_checks_status_checked_at', 'quality_checks', ['status', 'checked_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_quality_checks_status_checked_at', table_name='quality_checks')
+    op.drop_index('ix_quality_checks_checked_at_id', table_name='quality_checks')
+    op.drop_index('ix_orders_status_created_at', table_name='orders')
+    op.drop_index('ix_orders_created_at_id', table_name='orders')
+    op.drop_index('ix_dosing_logs_timestamp_id', table_name='dosing_logs')
+    op.drop_index('ix_dosing_logs_batch_id', table_name='dosing_logs')
+    op.drop_index('ix_batches_status_created_at', table_name='batches')
+    op.drop_index('ix_batches_order_id_created_at', table_name='batches')
+    op.drop_index('ix_batches_created_at_id', table_name='batches')
+    op.drop_index('ix_stock_movements_material_id_created_at', table_name='stock_movements')
+    op.drop_index(op.f('ix_stock_movements_id'), table_name='stock_movements')
+    op.drop_index('ix_stock_movements_created_at', table_name='stock_movements')
+    op.drop_table('stock_movements')
+    op.drop_index(op.f('ix_deviation_rollups_id'), table_name='deviation_rollups')
+    op.drop_index('ix_deviation_rollups_day', table_name='deviation_rollups')
+    op.drop_table('deviation_rollups')
+    op.drop_index(op.f('ix_deviation_histograms_id'), table_name='deviation_histograms')
+    op.drop_index('ix_deviation_histograms_day', table_name='deviation_histograms')
+    op.drop_table('deviation_histograms')
@@ -0,0 +1,36 @@
+"""Частичные индексы горячих фильтров: активные партии, ожидающие заказы, низкий остаток
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Условия индексов совпадают с ACTIVE_BATCH_FILTER, PENDING_ORDER_FILTER и
+LOW_STOCK_FILTER из backend/models.py.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+ACTIVE_BATCH = sa.text("status IN ('DOSING', 'MIXING', 'DISCHARGING')")
+PENDING_ORDER = sa.text("status = 'PENDING'")
+LOW_STOCK = sa.text("current_stock_kg <= min_stock_kg")
+
+
+def upgrade():
+    op.create_index('ix_batches_active_created_at', 'batches', ['created_at'], unique=False,
+                    sqlite_where=ACTIVE_BATCH, postgresql_where=ACTIVE_BATCH, if_not_exists=True)
+    op.create_index('ix_orders_pending_created_at', 'orders', ['created_at'], unique=False,
+                    sqlite_where=PENDING_ORDER, postgresql_where=PENDING_ORDER, if_not_exists=True)
+    op.create_index('ix_warehouse_materials_low_stock', 'warehouse_materials', ['id'], unique=False,
+                    sqlite_where=LOW_STOCK, postgresql_where=LOW_STOCK, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_warehouse_materials_low_stock', table_name='warehouse_materials')
+    op.drop_index('ix_orders_pending_created_at', table_name='orders')
+    op.drop_index('ix_batches_active_created_at', table_name='batches')
@@ -0,0 +1,38 @@
+"""План производства: объем замеса смесителя и расписание партий
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('batches', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('mixer_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('planned_start', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('planned_end', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_batches_mixer_id_planned_end', ['mixer_id', 'planned_end'], unique=False)
+        batch_op.create_foreign_key('fk_batches_mixer_id', 'equipment_status', ['mixer_id'], ['id'])
+
+    with op.batch_alter_table('equipment_status', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity_m3', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('equipment_status', schema=None) as batch_op:
+        batch_op.drop_column('capacity_m3')
+
+    with op.batch_alter_table('batches', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_batches_mixer_id', type_='foreignkey')
+        batch_op.drop_index('ix_batches_mixer_id_planned_end')
+        batch_op.drop_column('planned_end')
+        batch_op.drop_column('planned_start')
+        batch_op.drop_column('mixer_id')
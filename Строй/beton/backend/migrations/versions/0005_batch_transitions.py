@@ -0,0 +1,50 @@
+"""История переходов статуса партии с ключами идемпотентности
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+BATCH_STATUSES = ('PLANNED', 'DOSING', 'MIXING', 'DISCHARGING', 'COMPLETED', 'ERROR')
+
+# Тип batchstatus в PostgreSQL уже создан таблицей batches
+batch_status = sa.Enum(*BATCH_STATUSES, name='batchstatus').with_variant(
+    postgresql.ENUM(*BATCH_STATUSES, name='batchstatus', create_type=False), 'postgresql'
+)
+
+
+def upgrade():
+    op.create_table('batch_transitions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('from_status', batch_status, nullable=False),
+    sa.Column('to_status', batch_status, nullable=False),
+    sa.Column('idempotency_key', sa.String(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['batches.id'], name='fk_batch_transitions_batch_id'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name='fk_batch_transitions_user_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key', name='uq_batch_transitions_idempotency_key')
+    )
+    with op.batch_alter_table('batch_transitions', schema=None) as batch_op:
+        batch_op.create_index('ix_batch_transitions_batch_id_id', ['batch_id', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_batch_transitions_id'), ['id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('batch_transitions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_batch_transitions_id'))
+        batch_op.drop_index('ix_batch_transitions_batch_id_id')
+
+    op.drop_table('batch_transitions')
@@ -0,0 +1,72 @@
+"""Временные ряды показаний датчиков оборудования и их агрегаты
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('telemetry_series',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('equipment_id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipment_status.id'], name='fk_telemetry_series_equipment_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('equipment_id', 'metric', name='uq_telemetry_series_key')
+    )
+    with op.batch_alter_table('telemetry_series', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_telemetry_series_id'), ['id'], unique=False)
+
+    op.create_table('telemetry_readings',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('series_id', sa.Integer(), nullable=False),
+    sa.Column('ts', sa.DateTime(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['series_id'], ['telemetry_series.id'], name='fk_telemetry_readings_series_id'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('telemetry_readings', schema=None) as batch_op:
+        batch_op.create_index('ix_telemetry_readings_series_id_ts', ['series_id', 'ts'], unique=False)
+        batch_op.create_index('ix_telemetry_readings_ts', ['ts'], unique=False)
+
+    op.create_table('telemetry_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('series_id', sa.Integer(), nullable=False),
+    sa.Column('resolution', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.Float(), nullable=False),
+    sa.Column('min', sa.Float(), nullable=True),
+    sa.Column('max', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['series_id'], ['telemetry_series.id'], name='fk_telemetry_rollups_series_id'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('series_id', 'resolution', 'bucket', name='uq_telemetry_rollups_key')
+    )
+    with op.batch_alter_table('telemetry_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_telemetry_rollups_resolution_bucket', ['resolution', 'bucket'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('telemetry_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_telemetry_rollups_resolution_bucket')
+
+    op.drop_table('telemetry_rollups')
+    with op.batch_alter_table('telemetry_readings', schema=None) as batch_op:
+        batch_op.drop_index('ix_telemetry_readings_ts')
+        batch_op.drop_index('ix_telemetry_readings_series_id_ts')
+
+    op.drop_table('telemetry_readings')
+    with op.batch_alter_table('telemetry_series', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_telemetry_series_id'))
+
+    op.drop_table('telemetry_series')
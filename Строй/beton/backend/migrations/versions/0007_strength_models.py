@@ -0,0 +1,53 @@
+"""Модели прогноза прочности и прогноз у партий
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('strength_models',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('features', sa.Text(), nullable=False),
+    sa.Column('intercept', sa.Float(), nullable=False),
+    sa.Column('coefficients', sa.Text(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('rmse_mpa', sa.Float(), nullable=True),
+    sa.Column('r2', sa.Float(), nullable=True),
+    sa.Column('holdout_samples', sa.Integer(), nullable=True),
+    sa.Column('holdout_rmse_mpa', sa.Float(), nullable=True),
+    sa.Column('holdout_r2', sa.Float(), nullable=True),
+    sa.Column('train_ms', sa.Float(), nullable=True),
+    sa.Column('trained_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['trained_by'], ['users.id'], name='fk_strength_models_trained_by'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('strength_models', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_strength_models_id'), ['id'], unique=False)
+
+    with op.batch_alter_table('batches', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('predicted_strength_mpa', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('strength_model_version', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_batches_strength_model_version', 'strength_models', ['strength_model_version'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('batches', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_batches_strength_model_version', type_='foreignkey')
+        batch_op.drop_column('strength_model_version')
+        batch_op.drop_column('predicted_strength_mpa')
+
+    with op.batch_alter_table('strength_models', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_strength_models_id'))
+
+    op.drop_table('strength_models')
@@ -2,8 +2,8 @@
 Модели базы данных
 """
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, Boolean, 
-    ForeignKey, Text, Enum as SQLEnum
+    Column, Integer, BigInteger, String, Float, DateTime, Date, Boolean, 
+    ForeignKey, Text, Enum as SQLEnum, Index, UniqueConstraint, bindparam
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -126,6 +126,30 @@ class Order(Base):
     # Связи
     batches = relationship("Batch", back_populates="order", cascade="all, delete-orphan")
 
+    # Индексы для курсорной пагинации списка (см. backend/pagination.py)
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
+
+
+def literal_param(name: str, value, column):
+    """Значение, подставляемое в SQL литералом.
+
+    Частичный индекс применяется, только если условие запроса совпадает с
+    условием индекса; с параметром (`status = ?`) планировщик этого не видит.
+    """
+    return bindparam(name, value, type_=column.type, literal_execute=True)
+
+
+# Условия частичных индексов — использовать их же в запросах
+PENDING_ORDER_FILTER = Order.status == literal_param("pending_status", OrderStatus.PENDING, Order.status)
+
+Index(
+    "ix_orders_pending_created_at", Order.created_at,
+    sqlite_where=PENDING_ORDER_FILTER, postgresql_where=PENDING_ORDER_FILTER,
+)
+
 
 class Batch(Base):
     """Производственная партия"""
@@ -153,6 +177,15 @@ class Batch(Base):
     deviation_gravel_pct = Column(Float)
     deviation_water_pct = Column(Float)
     
+    # Прогноз прочности в 28 суток на момент дозирования (см. backend/strength.py)
+    predicted_strength_mpa = Column(Float)
+    strength_model_version = Column(Integer, ForeignKey("strength_models.id"))
+    
+    # План производства (см. backend/planner.py)
+    mixer_id = Column(Integer, ForeignKey("equipment_status.id"))
+    planned_start = Column(DateTime)
+    planned_end = Column(DateTime)
+    
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
     created_at = Column(DateTime, default=func.now())
@@ -163,6 +196,45 @@ class Batch(Base):
     quality_check = relationship("QualityCheck", back_populates="batch", uselist=False)
     dosing_logs = relationship("DosingLog", back_populates="batch")
 
+    # Индексы для курсорной пагинации списка (см. backend/pagination.py)
+    __table_args__ = (
+        Index("ix_batches_created_at_id", "created_at", "id"),
+        Index("ix_batches_status_created_at", "status", "created_at"),
+        Index("ix_batches_order_id_created_at", "order_id", "created_at"),
+        Index("ix_batches_mixer_id_planned_end", "mixer_id", "planned_end"),
+    )
+
+
+ACTIVE_BATCH_STATUSES = [BatchStatus.DOSING, BatchStatus.MIXING, BatchStatus.DISCHARGING]
+
+ACTIVE_BATCH_FILTER = Batch.status.in_(
+    bindparam("active_statuses", ACTIVE_BATCH_STATUSES, type_=Batch.status.type, expanding=True, literal_execute=True)
+)
+
+Index(
+    "ix_batches_active_created_at", Batch.created_at,
+    sqlite_where=ACTIVE_BATCH_FILTER, postgresql_where=ACTIVE_BATCH_FILTER,
+)
+
+
+class BatchTransition(Base):
+    """История переходов статуса партии (см. backend/batch_states.py)"""
+    __tablename__ = "batch_transitions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(Integer, ForeignKey("batches.id"), nullable=False)
+    action = Column(String, nullable=False)  # start, complete_dosing, complete
+    from_status = Column(SQLEnum(BatchStatus), nullable=False)
+    to_status = Column(SQLEnum(BatchStatus), nullable=False)
+    # Ключ идемпотентности запроса (заголовок Idempotency-Key)
+    idempotency_key = Column(String, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        Index("ix_batch_transitions_batch_id_id", "batch_id", "id"),
+    )
+
 
 class DosingLog(Base):
     """Лог дозирования компонентов"""
@@ -179,6 +251,12 @@ class DosingLog(Base):
     # Связи
     batch = relationship("Batch", back_populates="dosing_logs")
 
+    # Выгрузка за период и выборка логов партии
+    __table_args__ = (
+        Index("ix_dosing_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_dosing_logs_batch_id", "batch_id"),
+    )
+
 
 class QualityCheck(Base):
     """Контроль качества"""
@@ -203,6 +281,33 @@ class QualityCheck(Base):
     batch = relationship("Batch", back_populates="quality_check")
     lab_technician = relationship("User", back_populates="quality_checks")
 
+    __table_args__ = (
+        Index("ix_quality_checks_checked_at_id", "checked_at", "id"),
+        Index("ix_quality_checks_status_checked_at", "status", "checked_at"),
+    )
+
+
+class StrengthModel(Base):
+    """Версия модели прогноза прочности (гребневая регрессия по признакам партии)"""
+    __tablename__ = "strength_models"
+    
+    id = Column(Integer, primary_key=True, index=True)  # Номер версии
+    features = Column(Text, nullable=False)  # JSON: имена признаков
+    intercept = Column(Float, nullable=False)
+    coefficients = Column(Text, nullable=False)  # JSON: веса признаков в исходных единицах
+    
+    # Качество: на всей выборке и на контрольной части (не участвовала в подборе весов)
+    samples = Column(Integer, nullable=False)
+    rmse_mpa = Column(Float)
+    r2 = Column(Float)
+    holdout_samples = Column(Integer)
+    holdout_rmse_mpa = Column(Float)
+    holdout_r2 = Column(Float)
+    
+    train_ms = Column(Float)  # Время обучения
+    trained_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, default=func.now())
+
 
 class WarehouseMaterial(Base):
     """Склад сырья"""
@@ -223,6 +328,33 @@ class WarehouseMaterial(Base):
     last_updated = Column(DateTime, default=func.now(), onupdate=func.now())
 
 
+LOW_STOCK_FILTER = WarehouseMaterial.current_stock_kg <= WarehouseMaterial.min_stock_kg
+
+Index(
+    "ix_warehouse_materials_low_stock", WarehouseMaterial.id,
+    sqlite_where=LOW_STOCK_FILTER, postgresql_where=LOW_STOCK_FILTER,
+)
+
+
+class StockMovement(Base):
+    """Движение материала на складе (журнал только дописывается)"""
+    __tablename__ = "stock_movements"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    material_id = Column(Integer, ForeignKey("warehouse_materials.id"), nullable=False)
+    quantity_kg = Column(Float, nullable=False)  # > 0 приход, < 0 расход
+    reason = Column(String, nullable=False)  # dosing, receipt, adjustment, inventory, compaction
+    batch_id = Column(Integer, ForeignKey("batches.id"))
+    created_by = Column(Integer, ForeignKey("users.id"))
+    comment = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        Index("ix_stock_movements_material_id_created_at", "material_id", "created_at"),
+        Index("ix_stock_movements_created_at", "created_at"),
+    )
+
+
 class EquipmentStatus(Base):
     """Статус оборудования"""
     __tablename__ = "equipment_status"
@@ -230,8 +362,100 @@ class EquipmentStatus(Base):
     id = Column(Integer, primary_key=True, index=True)
     equipment_name = Column(String, nullable=False, unique=True, index=True)
     equipment_type = Column(String)  # scale, mixer, conveyor, silo, etc.
+    capacity_m3 = Column(Float)  # Объем замеса смесителя (м³)
     is_operational = Column(Boolean, default=True)
     status = Column(String)  # working, idle, error, maintenance
     last_update = Column(DateTime, default=func.now(), onupdate=func.now())
     error_message = Column(Text)
 
+
+class TelemetrySeries(Base):
+    """Ряд показаний датчика: оборудование × измеряемая величина"""
+    __tablename__ = "telemetry_series"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    equipment_id = Column(Integer, ForeignKey("equipment_status.id"), nullable=False)
+    metric = Column(String, nullable=False)  # weight_kg, level_pct, temperature_c, vibration_mm_s, ...
+    created_at = Column(DateTime, default=func.now())
+    
+    equipment = relationship("EquipmentStatus")
+    
+    __table_args__ = (
+        UniqueConstraint("equipment_id", "metric", name="uq_telemetry_series_key"),
+    )
+
+
+class TelemetryReading(Base):
+    """Сырые показания датчиков (только добавление, хранятся TELEMETRY_RAW_KEEP_HOURS)"""
+    __tablename__ = "telemetry_readings"
+    
+    # Без отдельного индекса по id: таблица пишется потоком, читается по ряду и времени
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    series_id = Column(Integer, ForeignKey("telemetry_series.id"), nullable=False)
+    ts = Column(DateTime, nullable=False)
+    value = Column(Float, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_telemetry_readings_series_id_ts", "series_id", "ts"),
+        Index("ix_telemetry_readings_ts", "ts"),
+    )
+
+
+class TelemetryRollup(Base):
+    """Агрегаты показаний за интервал: 1 с, 1 мин, 1 ч (resolution — длина интервала, с)"""
+    __tablename__ = "telemetry_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    series_id = Column(Integer, ForeignKey("telemetry_series.id"), nullable=False)
+    resolution = Column(Integer, nullable=False)
+    bucket = Column(DateTime, nullable=False)  # Начало интервала
+    
+    count = Column(Integer, nullable=False, default=0)
+    sum = Column(Float, nullable=False, default=0)
+    min = Column(Float)
+    max = Column(Float)
+    
+    __table_args__ = (
+        UniqueConstraint("series_id", "resolution", "bucket", name="uq_telemetry_rollups_key"),
+        Index("ix_telemetry_rollups_resolution_bucket", "resolution", "bucket"),
+    )
+
+
+class DeviationRollup(Base):
+    """Агрегаты отклонений дозирования: рецептура × компонент × сутки × смена"""
+    __tablename__ = "deviation_rollups"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), nullable=False)
+    component_type = Column(String, nullable=False)
+    day = Column(Date, nullable=False)  # Производственные сутки
+    shift = Column(Integer, nullable=False)  # Номер смены (1..N)
+    
+    count = Column(Integer, nullable=False, default=0)
+    sum_pct = Column(Float, nullable=False, default=0)  # Сумма отклонений
+    sum_sq_pct = Column(Float, nullable=False, default=0)  # Сумма квадратов отклонений
+    min_pct = Column(Float)
+    max_pct = Column(Float)
+    
+    __table_args__ = (
+        UniqueConstraint("recipe_id", "component_type", "day", "shift", name="uq_deviation_rollups_key"),
+        Index("ix_deviation_rollups_day", "day"),
+    )
+
+
+class DeviationHistogram(Base):
+    """Гистограмма отклонений для процентилей (ширина корзины — ANALYTICS_BIN_WIDTH, %)"""
+    __tablename__ = "deviation_histograms"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    recipe_id = Column(Integer, ForeignKey("recipes.id"), nullable=False)
+    component_type = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    shift = Column(Integer, nullable=False)
+    bin = Column(Integer, nullable=False)  # floor(отклонение / ширина корзины)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("recipe_id", "component_type", "day", "shift", "bin", name="uq_deviation_histograms_key"),
+        Index("ix_deviation_histograms_day", "day"),
+    )
@@ -0,0 +1,90 @@
+"""
+Курсорная (keyset) пагинация списков
+
+Списки упорядочены по (время создания, id) по убыванию. Курсор кодирует
+эту пару для последней строки страницы, и следующая страница выбирается
+условием `(created_at, id) < (курсор)` по составному индексу — без
+просмотра и отбрасывания пропущенных строк, как при OFFSET.
+Курсор следующей страницы возвращается в заголовке `X-Next-Cursor`.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Select, String, TypeDecorator, literal, tuple_
+
+# Заголовок с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class StoredDateTime(TypeDecorator):
+    """Время для сравнения с колонкой в формате, в котором оно хранится в БД.
+
+    В SQLite даты хранятся строками: значения по умолчанию `func.now()`
+    (CURRENT_TIMESTAMP) — без микросекунд, а значения из Python — с ними.
+    Сравнение строк требует того же формата, иначе строки с равным временем
+    попадут на следующую страницу курсора повторно.
+
+    Время с часовым поясом переводится в местное без пояса, как хранятся
+    колонки: SQLite иначе отбросит смещение, а PostgreSQL сравнит время
+    с поясом с колонкой без пояса.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(DateTime())
+
+    def process_bind_param(self, value, dialect):
+        if value.tzinfo:
+            value = value.astimezone().replace(tzinfo=None)
+        if dialect.name == "sqlite":
+            if value.microsecond:
+                return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+            return value.strftime("%Y-%m-%d %H:%M:%S")
+        return value
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """Непрозрачный курсор для строки (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), item_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def paginate(
+    query: Select,
+    time_column,
+    id_column,
+    cursor: Optional[str],
+    skip: int,
+    limit: int,
+) -> Select:
+    """Сортировка и окно страницы: по курсору, а без него — по skip (OFFSET)"""
+    query = query.order_by(time_column.desc(), id_column.desc()).limit(limit)
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        return query.where(
+            tuple_(time_column, id_column) < tuple_(literal(created_at, StoredDateTime()), item_id)
+        )
+    return query.offset(skip)
+
+
+def next_cursor_headers(rows: List[dict], limit: int, time_key: str = "created_at") -> Dict[str, str]:
+    """Заголовок с курсором, если страница заполнена целиком (строки — из fetch_rows)"""
+    if len(rows) == limit:
+        last = rows[-1]
+        return {NEXT_CURSOR_HEADER: encode_cursor(last[time_key], last["id"])}
+    return {}
@@ -0,0 +1,123 @@
+"""
+Хеширование и проверка паролей в ограниченном пуле потоков
+
+PBKDF2 — десятки миллисекунд CPU на вызов. В обработчике `async def` он
+останавливает event loop: при пересменке, когда входят десятки человек, ждут
+все запросы воркера. Поэтому хеши считаются в пуле из PASSWORD_HASH_WORKERS
+потоков (hashlib отпускает GIL). Очередь ограничена PASSWORD_HASH_QUEUE:
+сверх нее вход сразу получает 503 с Retry-After, а не ждет дольше таймаута
+клиента.
+
+Параметры хеша задает PASSWORD_HASH_ROUNDS. Хеши со старыми параметрами
+пересчитываются при следующем успешном входе (`verify_and_update`).
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from backend.pool_metrics import WAIT_BUCKETS_MS, Histogram
+
+# Потоков хеширования (0 — считать в event loop, как раньше; только для сравнения)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Сколько задач может ждать свободного потока, дальше — 503
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+# Число раундов PBKDF2; хеши с другим числом пересчитываются при входе
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+
+# Границы корзин времени хеширования (мс)
+HASH_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Число раундов задается явно: только тогда passlib считает хеш с другим числом устаревшим
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__rounds=PASSWORD_HASH_ROUNDS,
+)
+
+
+class HashPool:
+    """Пул потоков для хеширования с ограниченной очередью и метриками"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="password-hash") if workers else None
+        # Счетчики меняются и из потоков пула
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self.hash_ms = Histogram(HASH_BUCKETS_MS)
+
+    def _observe(self, started: float):
+        self.completed += 1
+        self.hash_ms.observe((time.perf_counter() - started) * 1000)
+
+    async def run(self, call, *args):
+        if self._executor is None:
+            started = time.perf_counter()
+            try:
+                return call(*args)
+            finally:
+                self._observe(started)
+
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Слишком много одновременных входов, повторите позже",
+                    headers={"Retry-After": "1"},
+                )
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.wait_ms.observe((started - submitted) * 1000)
+            try:
+                return call(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self._observe(started)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, task)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "active": self.active,
+            "peak_queued": self.peak_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms": self.wait_ms.snapshot(),
+            "hash_ms": self.hash_ms.snapshot(),
+        }
+
+
+hash_pool = HashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
+
+async def hash_password(password: str) -> str:
+    return await hash_pool.run(pwd_context.hash, password)
+
+
+async def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля; второй элемент — новый хеш, если параметры хеша устарели"""
+    return await hash_pool.run(pwd_context.verify_and_update, password, hashed_password)
@@ -0,0 +1,215 @@
+"""
+Планирование производства: разбиение заказов на замесы и расписание смесителей
+
+Каждый заказ делится на замесы по объему смесителя (равными частями), а
+замесы распределяются по работающим смесителям жадным списочным
+алгоритмом: заказы — по времени подачи машины, каждый замес — на
+смеситель, который освободится раньше всех. Смесителей немного, поэтому
+выбор из кучи стоит O(log M), и план на 1000+ заказов строится за
+миллисекунды. Замесы одного заказа могут идти на разных смесителях
+параллельно — так машина ждет меньше.
+
+План сохраняется одним массовым INSERT партий со статусом `planned`.
+"""
+import heapq
+import math
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.live_events import batch_event, queue_event
+from backend.models import (
+    Batch, BatchStatus, EquipmentStatus, Order, PENDING_ORDER_FILTER
+)
+from backend.recipe_cache import recipe_cache
+
+# Объем замеса смесителя, если у смесителя не задан capacity_m3 (м³)
+MIXER_CAPACITY_M3 = float(os.getenv("MIXER_CAPACITY_M3", "3.0"))
+
+# Дозирование и загрузка смесителя на замес сверх времени рецептуры (сек)
+PLAN_DOSING_TIME_SEC = int(os.getenv("PLAN_DOSING_TIME_SEC", "60"))
+
+# Время рецептуры, если оно не задано (сек)
+DEFAULT_MIXING_TIME_SEC = 120
+DEFAULT_DISCHARGE_TIME_SEC = 60
+
+# Партии, которые еще занимают смеситель по плану
+OPEN_BATCH_STATUSES = [BatchStatus.PLANNED, BatchStatus.DOSING, BatchStatus.MIXING, BatchStatus.DISCHARGING]
+
+# Точность объема замеса (м³)
+VOLUME_PRECISION = 3
+
+
+def new_batch_number(now: Optional[datetime] = None) -> str:
+    """Номер партии: BATCH-<дата>-<8 символов uuid>"""
+    return f"BATCH-{(now or datetime.now()).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+
+def cycle_seconds(recipe) -> int:
+    """Длительность замеса на смесителе: дозирование, перемешивание, выгрузка"""
+    mixing = recipe.mixing_time_sec if recipe.mixing_time_sec is not None else DEFAULT_MIXING_TIME_SEC
+    discharge = recipe.discharge_time_sec if recipe.discharge_time_sec is not None else DEFAULT_DISCHARGE_TIME_SEC
+    return PLAN_DOSING_TIME_SEC + mixing + discharge
+
+
+def schedule(
+    jobs: Iterable[Tuple[int, int, datetime, float, int]],
+    mixers: Iterable[Tuple[int, float, datetime]],
+) -> List[dict]:
+    """Расписание замесов.
+
+    jobs — (order_id, recipe_id, время подачи машины, объем м³, длительность замеса сек);
+    mixers — (mixer_id, объем замеса м³, свободен с). Возвращает замесы
+    в порядке начала по каждому заказу.
+    """
+    heap = [(free_at, mixer_id, capacity) for mixer_id, capacity, free_at in mixers]
+    if not heap:
+        return []
+    heapq.heapify(heap)
+
+    planned = []
+    # Раньше подача — раньше в очереди; при равной — короткие заказы первыми
+    for order_id, recipe_id, release, volume, cycle in sorted(jobs, key=lambda job: (job[2], job[3], job[0])):
+        duration = timedelta(seconds=cycle)
+        remaining = volume
+        while remaining > 1e-9:
+            free_at, mixer_id, capacity = heapq.heappop(heap)
+            # Равные замесы: 7 м³ на смесителе 3 м³ — три по 2.333, а не 3 + 3 + 1
+            part = round(remaining / math.ceil(remaining / capacity - 1e-9), VOLUME_PRECISION)
+            if remaining - part < 10 ** -VOLUME_PRECISION:
+                part = round(remaining, VOLUME_PRECISION)
+            start = max(free_at, release)
+            end = start + duration
+            planned.append({
+                "order_id": order_id,
+                "recipe_id": recipe_id,
+                "mixer_id": mixer_id,
+                "volume_m3": part,
+                "planned_start": start,
+                "planned_end": end,
+                "release": release,
+            })
+            remaining -= part
+            heapq.heappush(heap, (end, mixer_id, capacity))
+    return planned
+
+
+def plan_summary(planned: List[dict]) -> dict:
+    """Окончание плана и ожидание машин (от подачи до конца последнего замеса заказа)"""
+    finished: Dict[int, Tuple[datetime, datetime]] = {}
+    for batch in planned:
+        release, end = finished.get(batch["order_id"], (batch["release"], batch["planned_end"]))
+        finished[batch["order_id"]] = (release, max(end, batch["planned_end"]))
+    waits = [(end - release).total_seconds() for release, end in finished.values()]
+    return {
+        "orders_planned": len(finished),
+        "makespan_end": max((batch["planned_end"] for batch in planned), default=None),
+        "total_truck_wait_sec": sum(waits),
+        "max_truck_wait_sec": max(waits, default=0.0),
+    }
+
+
+async def load_mixers(db: AsyncSession, start_at: datetime) -> List[Tuple[int, float, datetime]]:
+    """Работающие смесители и время, с которого каждый свободен по уже имеющемуся плану"""
+    mixers = (await db.execute(
+        select(EquipmentStatus.id, EquipmentStatus.capacity_m3)
+        .where(EquipmentStatus.equipment_type == "mixer", EquipmentStatus.is_operational.is_(True))
+        .order_by(EquipmentStatus.id)
+    )).all()
+    if not mixers:
+        return []
+    busy_until = dict((await db.execute(
+        select(Batch.mixer_id, func.max(Batch.planned_end))
+        .where(Batch.mixer_id.in_([mixer.id for mixer in mixers]), Batch.status.in_(OPEN_BATCH_STATUSES))
+        .group_by(Batch.mixer_id)
+    )).all())
+    return [
+        (mixer.id, mixer.capacity_m3 or MIXER_CAPACITY_M3, max(start_at, busy_until.get(mixer.id) or start_at))
+        for mixer in mixers
+    ]
+
+
+async def load_jobs(
+    db: AsyncSession,
+    start_at: datetime,
+    order_ids: Optional[List[int]] = None,
+) -> Tuple[List[tuple], List[int]]:
+    """Ожидающие заказы с еще не запланированным объемом; вторым — пропущенные (без рецептуры)"""
+    query = (
+        select(Order.id, Order.recipe_id, Order.volume_m3, Order.planned_time)
+        .where(PENDING_ORDER_FILTER)
+        .order_by(Order.id)
+        # Блокировка заказов: два планировщика не распланируют один объем дважды
+        .with_for_update()
+    )
+    if order_ids:
+        query = query.where(Order.id.in_(order_ids))
+    orders = (await db.execute(query)).all()
+    if not orders:
+        return [], []
+
+    planned_volume = dict((await db.execute(
+        select(Batch.order_id, func.sum(Batch.volume_m3))
+        .where(Batch.order_id.in_([order.id for order in orders]), Batch.status != BatchStatus.ERROR)
+        .group_by(Batch.order_id)
+    )).all())
+    recipes = await recipe_cache.get_many(db, {order.recipe_id for order in orders if order.recipe_id})
+
+    jobs, skipped = [], []
+    for order in orders:
+        recipe = recipes.get(order.recipe_id)
+        if recipe is None:
+            skipped.append(order.id)
+            continue
+        remaining = round(order.volume_m3 - (planned_volume.get(order.id) or 0), VOLUME_PRECISION)
+        if remaining <= 0:
+            continue
+        release = max(order.planned_time or start_at, start_at)
+        jobs.append((order.id, order.recipe_id, release, remaining, cycle_seconds(recipe)))
+    return jobs, skipped
+
+
+async def plan_production(
+    db: AsyncSession,
+    start_at: Optional[datetime] = None,
+    order_ids: Optional[List[int]] = None,
+    dry_run: bool = False,
+) -> dict:
+    """Строит план для ожидающих заказов и (если не dry_run) сохраняет партии.
+
+    Изменения фиксируются вместе с транзакцией вызывающего кода.
+    """
+    start_at = (start_at or datetime.now()).replace(microsecond=0)
+    jobs, skipped = await load_jobs(db, start_at, order_ids)
+    mixers = await load_mixers(db, start_at) if jobs else []
+    if not mixers:
+        # Нет работающих смесителей — планировать не на что
+        skipped = sorted(skipped + [job[0] for job in jobs])
+        jobs = []
+    planned = schedule(jobs, mixers)
+    result = plan_summary(planned)
+    result["skipped_orders"] = skipped
+
+    now = datetime.now()
+    for batch in planned:
+        batch["batch_number"] = new_batch_number(now)
+        batch.pop("release")
+
+    if planned and not dry_run:
+        rows = (await db.execute(
+            insert(Batch).returning(
+                Batch.id, Batch.batch_number, Batch.order_id, Batch.recipe_id, sort_by_parameter_order=True
+            ),
+            [dict(batch, status=BatchStatus.PLANNED) for batch in planned],
+        )).all()
+        # INSERT в обход unit of work: события о новых партиях ставим явно
+        for batch, row in zip(planned, rows):
+            batch["id"] = row.id
+            queue_event(db.sync_session, batch_event(row, BatchStatus.PLANNED, None))
+
+    result["batches"] = planned
+    return result
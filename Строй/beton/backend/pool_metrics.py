@@ -0,0 +1,116 @@
+"""
+Метрики пулов соединений с БД
+
+Пулы асинхронных движков создаются с классом из `timed_pool`: он замеряет
+ожидание свободного соединения и загрузку пула в момент выдачи. По ним видно,
+откуда задержка — из самой БД или из очереди за соединением.
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, Sequence, Type
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool
+
+# Границы корзин времени ожидания соединения (мс)
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (le — включительно)"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        labels = [str(bound) for bound in self.bounds] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class PoolMetrics:
+    """Счетчики одного пула: выдачи, таймауты, ожидание и загрузка"""
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        self.pool = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        # Загрузка пула в момент выдачи: 1..size — из пула, дальше — overflow
+        self.checked_out = Histogram(range(1, size + 1))
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+
+    def observe_checkout(self, pool: Pool, waited_ms: float):
+        self.checkouts += 1
+        self.wait_ms.observe(waited_ms)
+        checked_out = pool.checkedout()
+        self.checked_out.observe(checked_out)
+        self.peak_checked_out = max(self.peak_checked_out, checked_out)
+        self.peak_overflow = max(self.peak_overflow, pool.overflow())
+
+    def stats(self) -> dict:
+        pool = self.pool
+        return {
+            "pool_size": self.size,
+            "checked_out": pool.checkedout() if pool is not None else 0,
+            "checked_in": pool.checkedin() if pool is not None else 0,
+            "overflow": max(pool.overflow(), 0) if pool is not None else 0,
+            "peak_checked_out": self.peak_checked_out,
+            "peak_overflow": max(self.peak_overflow, 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms": self.wait_ms.snapshot(),
+            "checked_out_at_checkout": self.checked_out.snapshot(),
+        }
+
+
+# Метрики по имени пула (main, writer)
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def timed_pool(base: Type[Pool], name: str, size: int) -> Type[Pool]:
+    """Класс пула с замером ожидания соединения.
+
+    Метрики хранятся в атрибуте класса, поэтому сохраняются при пересоздании
+    пула (dispose).
+    """
+    metrics = pool_metrics.setdefault(name, PoolMetrics(name, size))
+
+    class TimedPool(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            metrics.pool = self
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except PoolTimeoutError:
+                metrics.timeouts += 1
+                raise
+            metrics.observe_checkout(self, (time.perf_counter() - started) * 1000)
+            return connection
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def pool_stats() -> dict:
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
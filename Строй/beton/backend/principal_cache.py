@@ -0,0 +1,81 @@
+"""
+Кэш пользователей для проверки токенов
+
+`get_current_user` вызывается на каждый авторизованный запрос; кэш избавляет
+от запроса к таблице users при каждом опросе дашборда и списков.
+Записи живут не дольше `PRINCIPAL_CACHE_TTL` и сбрасываются явно при изменении
+или деактивации пользователя (routers/users.py). TTL ограничивает устаревание
+данных, изменённых другими процессами (воркерами uvicorn).
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from backend.models import User
+
+# Время жизни записи (сек)
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+
+# Максимальное количество пользователей в кэше
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+
+
+def snapshot_user(user: User) -> User:
+    """Копия пользователя вне сессии: её безопасно отдавать разным запросам"""
+    return User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+
+class PrincipalCache:
+    """Ограниченный LRU-кэш пользователей с TTL по имени (subject токена)"""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username: str) -> Optional[User]:
+        entry = self._entries.get(username)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[username]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user: User) -> User:
+        """Кладёт копию пользователя в кэш и возвращает её"""
+        if self.ttl <= 0:
+            return user
+        cached = snapshot_user(user)
+        self._entries[user.username] = (time.monotonic() + self.ttl, cached)
+        self._entries.move_to_end(user.username)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return cached
+
+    def invalidate(self, username: str):
+        """Сбрасывает запись пользователя (после изменения или деактивации)"""
+        if self._entries.pop(username, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+        }
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_SIZE)
@@ -0,0 +1,310 @@
+"""
+Профилирование запросов: время по маршрутам и SQL на запрос
+
+`RequestMetricsMiddleware` замеряет каждый HTTP-запрос и относит его к шаблону
+маршрута (`/api/batches/{batch_id}`), а не к конкретному пути, — число серий
+метрик не растет. Обработчики событий движка SQLAlchemy считают выполненные
+SQL-запросы и их время для текущего HTTP-запроса (через contextvar).
+
+Запросы дольше SLOW_REQUEST_MS попадают в кольцевой буфер образцов. Доля
+запросов PROFILE_SAMPLE_RATE выполняется под профилировщиком, и у медленных
+из них в образце сохраняется профиль. cProfile профилирует весь поток
+event loop, поэтому в профиль попадают и параллельные запросы; pyinstrument
+(если установлен) следит только за задачей запроса.
+
+Метрики отдаются в текстовом формате Prometheus: `GET /metrics`.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.passwords import hash_pool
+from backend.pool_metrics import Histogram, pool_metrics
+
+try:
+    from pyinstrument import Profiler as Pyinstrument
+except ImportError:
+    Pyinstrument = None
+
+# Порог медленного запроса (мс)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+
+# Сколько последних медленных запросов хранить
+SLOW_REQUEST_SAMPLES = int(os.getenv("SLOW_REQUEST_SAMPLES", "50"))
+
+# Доля запросов под профилировщиком (0 — профилирование выключено)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Профилировщик: cprofile или pyinstrument
+PROFILER = os.getenv("PROFILER", "cprofile").lower()
+
+# Токен для GET /metrics (Authorization: Bearer ...); пустой — без проверки
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Сколько строк профиля cProfile сохранять в образце
+PROFILE_TOP = 30
+
+# Границы корзин времени запроса (мс)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Границы корзин числа SQL-запросов на HTTP-запрос
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    """SQL текущего HTTP-запроса"""
+    __slots__ = ("sql_count", "sql_ms")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_ms = 0.0
+
+
+class RouteMetrics:
+    """Счетчики одного маршрута"""
+
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.sql_count = Histogram(SQL_COUNT_BUCKETS)
+        self.sql_ms = 0.0
+        self.statuses: Dict[int, int] = {}
+        self.slow = 0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+# Метрики по (метод, шаблон маршрута)
+route_metrics: Dict[Tuple[str, str], RouteMetrics] = {}
+
+# Последние медленные запросы
+slow_samples = deque(maxlen=SLOW_REQUEST_SAMPLES)
+
+# cProfile нельзя запускать вложенно: профилируется один запрос за раз
+_profiling = False
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _request_stats.get() is not None:
+        context._profiling_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    started = getattr(context, "_profiling_started", None)
+    if stats is not None and started is not None:
+        stats.sql_count += 1
+        stats.sql_ms += (time.perf_counter() - started) * 1000
+
+
+def _start_profiler():
+    global _profiling
+    if _profiling or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    _profiling = True
+    if PROFILER == "pyinstrument" and Pyinstrument is not None:
+        profiler = Pyinstrument(async_mode="enabled")
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler):
+    global _profiling
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+    _profiling = False
+
+
+def _profile_text(profiler) -> str:
+    if isinstance(profiler, cProfile.Profile):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        return out.getvalue()
+    return profiler.output_text()
+
+
+def route_template(scope) -> str:
+    """Шаблон маршрута запроса: значения параметров пути заменяются на {имя}"""
+    if scope.get("route") is None:
+        return UNMATCHED_ROUTE
+    params = {str(value): name for name, value in scope.get("path_params", {}).items()}
+    if not params:
+        return scope["path"]
+    return "/".join(
+        f"{{{params[segment]}}}" if segment in params else segment
+        for segment in scope["path"].split("/")
+    )
+
+
+def record(method: str, route: str, status_code: int, duration_ms: float, stats: RequestStats, path: str, profiler=None):
+    metrics = route_metrics.get((method, route))
+    if metrics is None:
+        metrics = route_metrics.setdefault((method, route), RouteMetrics())
+    metrics.latency_ms.observe(duration_ms)
+    metrics.sql_count.observe(stats.sql_count)
+    metrics.sql_ms += stats.sql_ms
+    metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+    if duration_ms >= SLOW_REQUEST_MS:
+        metrics.slow += 1
+        slow_samples.append({
+            "at": datetime.now(),
+            "method": method,
+            "route": route,
+            "path": path,
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "sql_count": stats.sql_count,
+            "sql_ms": round(stats.sql_ms, 2),
+            "profile": _profile_text(profiler) if profiler is not None else None,
+        })
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: время запроса, статус и SQL по маршрутам"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        event_stream = False
+
+        async def send_wrapper(message):
+            nonlocal status_code, event_stream
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                event_stream = any(
+                    name == b"content-type" and value.startswith(b"text/event-stream")
+                    for name, value in message.get("headers", ())
+                )
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        profiler = _start_profiler() if PROFILE_SAMPLE_RATE > 0 else None
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if profiler is not None:
+                _stop_profiler(profiler)
+            _request_stats.reset(token)
+            # Поток событий открыт часами — его длительность не время ответа
+            if not event_stream:
+                record(scope["method"], route_template(scope), status_code, duration_ms, stats, scope["path"], profiler)
+
+
+def slow_requests() -> List[dict]:
+    """Медленные запросы, новые первыми"""
+    return list(reversed(slow_samples))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _series(name: str, labels: str, value) -> str:
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+def _histogram(name: str, labels: str, histogram: Histogram, scale: float = 1.0) -> Iterator[str]:
+    cumulative = 0
+    prefix = f"{labels}," if labels else ""
+    for bound, count in zip(list(histogram.bounds) + [None], histogram.counts):
+        cumulative += count
+        le = "+Inf" if bound is None else format(bound * scale, "g")
+        yield f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}'
+    yield _series(f"{name}_sum", labels, histogram.total * scale)
+    yield _series(f"{name}_count", labels, histogram.count)
+
+
+def _family(name: str, kind: str, help_text: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def render_prometheus() -> str:
+    """Метрики запросов, пулов соединений и хеширования паролей в текстовом формате Prometheus"""
+    routes = sorted(route_metrics.items())
+    lines = _family("beton_http_requests_total", "counter", "HTTP-запросы по маршрутам и статусам")
+    for (method, route), metrics in routes:
+        for status_code, count in sorted(metrics.statuses.items()):
+            lines.append(_series(
+                "beton_http_requests_total", _labels(method=method, route=route, status=status_code), count
+            ))
+
+    lines += _family("beton_http_request_duration_seconds", "histogram", "Время обработки HTTP-запроса")
+    for (method, route), metrics in routes:
+        lines.extend(_histogram(
+            "beton_http_request_duration_seconds", _labels(method=method, route=route), metrics.latency_ms, 0.001
+        ))
+
+    lines += _family("beton_http_request_sql_queries", "histogram", "Число SQL-запросов на HTTP-запрос")
+    for (method, route), metrics in routes:
+        lines.extend(_histogram("beton_http_request_sql_queries", _labels(method=method, route=route), metrics.sql_count))
+
+    lines += _family("beton_http_request_sql_seconds_total", "counter", "Время выполнения SQL в HTTP-запросах")
+    for (method, route), metrics in routes:
+        lines.append(_series(
+            "beton_http_request_sql_seconds_total", _labels(method=method, route=route), metrics.sql_ms / 1000
+        ))
+
+    lines += _family("beton_http_slow_requests_total", "counter", f"HTTP-запросы дольше {SLOW_REQUEST_MS:g} мс")
+    for (method, route), metrics in routes:
+        lines.append(_series("beton_http_slow_requests_total", _labels(method=method, route=route), metrics.slow))
+
+    pools = sorted(pool_metrics.items())
+    lines += _family("beton_db_pool_size", "gauge", "Размер пула соединений")
+    lines += [_series("beton_db_pool_size", _labels(pool=name), metrics.size) for name, metrics in pools]
+    lines += _family("beton_db_pool_checked_out", "gauge", "Выданные соединения")
+    lines += [
+        _series("beton_db_pool_checked_out", _labels(pool=name), metrics.stats()["checked_out"])
+        for name, metrics in pools
+    ]
+    lines += _family("beton_db_pool_timeouts_total", "counter", "Таймауты ожидания соединения")
+    lines += [_series("beton_db_pool_timeouts_total", _labels(pool=name), metrics.timeouts) for name, metrics in pools]
+    lines += _family("beton_db_pool_wait_seconds", "histogram", "Ожидание свободного соединения")
+    for name, metrics in pools:
+        lines.extend(_histogram("beton_db_pool_wait_seconds", _labels(pool=name), metrics.wait_ms, 0.001))
+
+    lines += _family("beton_password_hash_workers", "gauge", "Потоки хеширования паролей")
+    lines.append(_series("beton_password_hash_workers", "", hash_pool.workers))
+    lines += _family("beton_password_hash_queue_depth", "gauge", "Задачи хеширования в очереди")
+    lines.append(_series("beton_password_hash_queue_depth", "", hash_pool.queued))
+    lines += _family("beton_password_hash_active", "gauge", "Задачи хеширования в работе")
+    lines.append(_series("beton_password_hash_active", "", hash_pool.active))
+    lines += _family("beton_password_hash_rejected_total", "counter", "Отказы при переполненной очереди хеширования")
+    lines.append(_series("beton_password_hash_rejected_total", "", hash_pool.rejected))
+    lines += _family("beton_password_hash_wait_seconds", "histogram", "Ожидание свободного потока хеширования")
+    lines.extend(_histogram("beton_password_hash_wait_seconds", "", hash_pool.wait_ms, 0.001))
+    lines += _family("beton_password_hash_duration_seconds", "histogram", "Время хеширования или проверки пароля")
+    lines.extend(_histogram("beton_password_hash_duration_seconds", "", hash_pool.hash_ms, 0.001))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,159 @@
+"""
+Кэш рецептур для горячего пути партий
+
+Рецептур немного, и меняются они редко, поэтому создание партий и
+дозирование берут их из памяти процесса (по id и по коду). Кэш сбрасывается
+после коммита, изменившего рецептуры в этом процессе. Изменения из других
+процессов (воркеров uvicorn) обнаруживаются дешевой проверкой версии набора
+рецептур — не чаще раза в `RECIPE_CACHE_CHECK_SEC`.
+
+Рецептуры из кэша — копии вне сессии, только для чтения.
+"""
+import asyncio
+import os
+import time
+from itertools import chain
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.models import Recipe
+
+# Период проверки версии рецептур в БД (сек)
+RECIPE_CACHE_CHECK_SEC = float(os.getenv("RECIPE_CACHE_CHECK_SEC", "5"))
+
+
+def snapshot_recipe(recipe: Recipe) -> Recipe:
+    """Копия рецептуры вне сессии: её безопасно отдавать разным запросам"""
+    return Recipe(**{column.key: getattr(recipe, column.key) for column in Recipe.__table__.columns})
+
+
+class RecipeCache:
+    """Кэш рецептур с проверкой версии набора в БД"""
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._by_id: Dict[int, Recipe] = {}
+        self._by_code: Dict[str, Recipe] = {}
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.version_checks = 0
+        self.invalidations = 0
+
+    def invalidate(self):
+        """Сбрасывает кэш; следующее обращение перечитает версию из БД"""
+        self._by_id.clear()
+        self._by_code.clear()
+        self._fingerprint = None
+        self.invalidations += 1
+
+    async def _check_version(self, db: AsyncSession):
+        if self._fingerprint is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if self._fingerprint is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            # Версия набора: update_recipe увеличивает version, создание и удаление меняют count/max(id)
+            fingerprint = tuple((await db.execute(
+                select(func.count(Recipe.id), func.sum(Recipe.version), func.max(Recipe.id))
+            )).one())
+            self.version_checks += 1
+            if fingerprint != self._fingerprint:
+                self._by_id.clear()
+                self._by_code.clear()
+                self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+
+    def _put(self, recipe: Recipe) -> Recipe:
+        cached = snapshot_recipe(recipe)
+        self._by_id[cached.id] = cached
+        if cached.code:
+            self._by_code[cached.code] = cached
+        return cached
+
+    async def get(self, db: AsyncSession, recipe_id: int) -> Optional[Recipe]:
+        await self._check_version(db)
+        recipe = self._by_id.get(recipe_id)
+        if recipe is not None:
+            self.hits += 1
+            return recipe
+        self.misses += 1
+        recipe = await db.get(Recipe, recipe_id)
+        return self._put(recipe) if recipe is not None else None
+
+    async def get_by_code(self, db: AsyncSession, code: str) -> Optional[Recipe]:
+        await self._check_version(db)
+        recipe = self._by_code.get(code)
+        if recipe is not None:
+            self.hits += 1
+            return recipe
+        self.misses += 1
+        recipe = await db.scalar(select(Recipe).where(Recipe.code == code))
+        return self._put(recipe) if recipe is not None else None
+
+    async def get_many(self, db: AsyncSession, recipe_ids: Iterable[int]) -> Dict[int, Recipe]:
+        """Несколько рецептур; недостающие читаются одним запросом"""
+        await self._check_version(db)
+        found = {}
+        missing = set()
+        for recipe_id in set(recipe_ids):
+            recipe = self._by_id.get(recipe_id)
+            if recipe is None:
+                missing.add(recipe_id)
+            else:
+                found[recipe_id] = recipe
+        self.hits += len(found)
+        if missing:
+            self.misses += len(missing)
+            for recipe in await db.scalars(select(Recipe).where(Recipe.id.in_(missing))):
+                found[recipe.id] = self._put(recipe)
+        return found
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "size": len(self._by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "version_checks": self.version_checks,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+        }
+
+
+recipe_cache = RecipeCache(RECIPE_CACHE_CHECK_SEC)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    if any(isinstance(obj, Recipe) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["recipes_dirty"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statements(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, Recipe):
+        orm_execute_state.session.info["recipes_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.in_nested_transaction():
+        return
+    if session.info.pop("recipes_dirty", False):
+        recipe_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("recipes_dirty", None)
@@ -0,0 +1,55 @@
+"""
+Роутер для аналитики отклонений дозирования
+"""
+from typing import List, Optional
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend import auth
+from backend.analytics import GROUP_FIELDS, deviation_stats, rebuild_rollups, spc_chart
+from backend.models import User
+from backend.schemas import DeviationStats, SpcChart
+
+router = APIRouter()
+
+ANALYTICS_ROLES = ["admin", "technologist", "production_head", "laboratory", "shift_master"]
+
+@router.get("/deviations", response_model=List[DeviationStats])
+async def get_deviation_stats(
+    group_by: str = Query("recipe,component", description="Через запятую: recipe, component, day, shift"),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    recipe_code: Optional[str] = Query(None),
+    component: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(ANALYTICS_ROLES))
+):
+    """Статистика отклонений дозирования (среднее, СКО, процентили) по группам"""
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    unknown = set(fields) - set(GROUP_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные поля группировки: {', '.join(sorted(unknown))}")
+    return await deviation_stats(db, fields, date_from, date_to, recipe_code, component)
+
+@router.get("/spc", response_model=SpcChart)
+async def get_spc_chart(
+    recipe_code: str,
+    component: str,
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(ANALYTICS_ROLES))
+):
+    """Контрольная карта средних отклонений по сменам с отметками выхода из-под контроля"""
+    return await spc_chart(db, recipe_code, component, date_from, date_to)
+
+@router.post("/rollups/rebuild")
+async def rebuild_deviation_rollups(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Полный пересчет агрегатов по логам дозирования"""
+    samples = await rebuild_rollups(db)
+    await db.commit()
+    return {"samples": samples}
@@ -3,9 +3,12 @@
 """
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
 from backend import auth
+from backend.passwords import hash_password, hash_pool
+from backend.principal_cache import principal_cache
 from backend.models import User
 from backend.schemas import UserLogin, Token, UserCreate, UserResponse
 
@@ -14,10 +17,10 @@ router = APIRouter()
 @router.post("/login", response_model=Token)
 async def login(
     user_credentials: UserLogin,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Вход в систему"""
-    user = auth.authenticate_user(db, user_credentials.username, user_credentials.password)
+    user = await auth.authenticate_user(db, user_credentials.username, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,12 +36,12 @@ async def login(
 @router.post("/register", response_model=UserResponse)
 async def register(
     user_data: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["admin"]))
 ):
     """Регистрация нового пользователя (только для администраторов)"""
     # Проверка существования пользователя
-    existing_user = db.query(User).filter(User.username == user_data.username).first()
+    existing_user = await db.scalar(select(User).where(User.username == user_data.username))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -46,7 +49,7 @@ async def register(
         )
     
     # Создание пользователя
-    hashed_password = auth.get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     db_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -55,8 +58,8 @@ async def register(
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.get("/me", response_model=UserResponse)
@@ -66,3 +69,16 @@ async def get_current_user_info(
     """Получение информации о текущем пользователе"""
     return current_user
 
+@router.get("/cache-stats")
+async def get_auth_cache_stats(
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Статистика кэша пользователей для проверки токенов"""
+    return principal_cache.stats()
+
+@router.get("/hash-pool")
+async def get_hash_pool_stats(
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Пул хеширования паролей: очередь, занятые потоки, отказы, время ожидания и хеширования"""
+    return hash_pool.stats()
@@ -3,98 +3,173 @@
 """
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from backend.database import get_db
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend.pagination import next_cursor_headers, paginate
+from backend.serialization import fast_response, fetch_rows, project
 from backend import auth
-from backend.models import User, Batch, BatchStatus, Order, Recipe, DosingLog
-from backend.schemas import BatchCreate, BatchResponse, DosingLogResponse
-import uuid
+from backend.models import User, Batch, BatchStatus, BatchTransition, Order, DosingLog
+from backend.recipe_cache import recipe_cache
+from backend.schemas import (
+    BatchCreate, BatchResponse, BatchSetpoints, BatchTransitionResponse, BulkDosingResult,
+    DosingLogResponse, PlanRequest, PlanResult
+)
+from backend.batch_states import transition
+from backend.analytics import add_to_rollups
+from backend.stock import consume_for_batches
+from backend.planner import new_batch_number, plan_production
+from backend.dosing import (
+    BULK_CHUNK_SIZE, DEVIATION_COMPONENTS, DOSING_COMPONENTS,
+    BulkDosingIngest, calc_deviation,
+)
+from backend.setpoints import setpoint_engine
+from backend.strength import strength_predictor
 
 router = APIRouter()
 
 @router.post("/", response_model=BatchResponse)
 async def create_batch(
     batch_data: BatchCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["operator", "admin"]))
 ):
     """Создание новой производственной партии"""
     # Проверка существования заказа и рецепта
-    order = db.query(Order).filter(Order.id == batch_data.order_id).first()
+    order = await db.get(Order, batch_data.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     
-    recipe = db.query(Recipe).filter(Recipe.id == batch_data.recipe_id).first()
+    recipe = await recipe_cache.get(db, batch_data.recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Рецептура не найдена")
     
-    # Генерация номера партии
-    batch_number = f"BATCH-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-    
     db_batch = Batch(
-        batch_number=batch_number,
+        batch_number=new_batch_number(),
         order_id=batch_data.order_id,
         recipe_id=batch_data.recipe_id,
         volume_m3=batch_data.volume_m3,
         status=BatchStatus.PLANNED
     )
     db.add(db_batch)
-    db.commit()
-    db.refresh(db_batch)
+    await db.commit()
+    await db.refresh(db_batch)
     return db_batch
 
 @router.get("/", response_model=List[BatchResponse])
 async def get_batches(
+    request: Request,
     status: Optional[BatchStatus] = Query(None),
     order_id: Optional[int] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение списка партий"""
-    query = db.query(Batch)
+    query = project(Batch, BatchResponse)
     if status:
-        query = query.filter(Batch.status == status)
+        query = query.where(Batch.status == status)
     if order_id:
-        query = query.filter(Batch.order_id == order_id)
-    batches = query.order_by(Batch.created_at.desc()).offset(skip).limit(limit).all()
-    return batches
+        query = query.where(Batch.order_id == order_id)
+    batches = await fetch_rows(db, paginate(query, Batch.created_at, Batch.id, cursor, skip, limit))
+    return fast_response(request, batches, next_cursor_headers(batches, limit))
+
+@router.post("/plan", response_model=PlanResult)
+async def plan_batches(
+    plan_request: PlanRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["operator", "shift_master", "production_head", "admin"]))
+):
+    """Разбиение ожидающих заказов на замесы и расписание смесителей"""
+    plan = await plan_production(db, plan_request.start_at, plan_request.order_ids, plan_request.dry_run)
+    if not plan_request.dry_run:
+        await db.commit()
+    return plan
+
+async def iter_ndjson_chunks(request: Request):
+    """Строки NDJSON из тела запроса блоками по BULK_CHUNK_SIZE"""
+    buffer = b""
+    chunk = []
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                chunk.append(line)
+                if len(chunk) >= BULK_CHUNK_SIZE:
+                    yield chunk
+                    chunk = []
+    if buffer.strip():
+        chunk.append(buffer)
+    if chunk:
+        yield chunk
+
+@router.post("/dosing/bulk", response_model=BulkDosingResult)
+async def bulk_complete_dosing(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["operator", "admin"]))
+):
+    """Массовая загрузка результатов дозирования (JSON-массив или NDJSON)"""
+    ingest = BulkDosingIngest(db, current_user.id)
+    if "ndjson" in request.headers.get("content-type", ""):
+        async for chunk in iter_ndjson_chunks(request):
+            await ingest.process(chunk)
+    else:
+        try:
+            records = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный JSON")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Ожидается массив записей")
+        for start in range(0, len(records), BULK_CHUNK_SIZE):
+            await ingest.process(records[start:start + BULK_CHUNK_SIZE])
+    
+    # Все принятые записи фиксируются одной транзакцией
+    await db.commit()
+    return ingest.result()
+
+async def get_batch_or_404(db: AsyncSession, batch_id: int) -> Batch:
+    batch = await db.get(Batch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Партия не найдена")
+    return batch
+
+@router.get("/setpoints/stats")
+async def get_setpoint_stats(
+    current_user: User = Depends(auth.require_role(["admin", "technologist"]))
+):
+    """Статистика таблиц уставок"""
+    return setpoint_engine.stats()
 
 @router.get("/{batch_id}", response_model=BatchResponse)
 async def get_batch(
     batch_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение партии по ID"""
-    batch = db.query(Batch).filter(Batch.id == batch_id).first()
-    if not batch:
-        raise HTTPException(status_code=404, detail="Партия не найдена")
-    return batch
+    return await get_batch_or_404(db, batch_id)
 
 @router.post("/{batch_id}/start", response_model=BatchResponse)
 async def start_batch(
     batch_id: int,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["operator", "admin"]))
 ):
     """Запуск производства партии"""
-    batch = db.query(Batch).filter(Batch.id == batch_id).first()
-    if not batch:
-        raise HTTPException(status_code=404, detail="Партия не найдена")
-    
-    if batch.status != BatchStatus.PLANNED:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Партия уже в статусе {batch.status}"
-        )
-    
-    batch.status = BatchStatus.DOSING
-    batch.started_at = datetime.now()
-    db.commit()
-    db.refresh(batch)
+    batch = await get_batch_or_404(db, batch_id)
+    await transition(
+        db, batch, "start", current_user.id, idempotency_key,
+        values={"started_at": datetime.now()},
+    )
+    await db.commit()
+    await db.refresh(batch)
     return batch
 
 @router.post("/{batch_id}/complete-dosing", response_model=BatchResponse)
@@ -106,92 +181,116 @@ async def complete_dosing(
     actual_water: float,
     actual_additive1: float = 0,
     actual_additive2: float = 0,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["operator", "admin"]))
 ):
     """Завершение дозирования с фактическими значениями"""
-    batch = db.query(Batch).filter(Batch.id == batch_id).first()
-    if not batch:
-        raise HTTPException(status_code=404, detail="Партия не найдена")
-    
-    recipe = db.query(Recipe).filter(Recipe.id == batch.recipe_id).first()
+    batch = await get_batch_or_404(db, batch_id)
+    recipe = await recipe_cache.get(db, batch.recipe_id)
     
-    # Расчет плановых значений с учетом объема
-    planned_cement = recipe.cement_kg * batch.volume_m3
-    planned_sand = recipe.sand_kg * batch.volume_m3
-    planned_gravel = recipe.gravel_kg * batch.volume_m3
-    planned_water = recipe.water_kg * batch.volume_m3
-    planned_additive1 = recipe.additive1_kg * batch.volume_m3
-    planned_additive2 = recipe.additive2_kg * batch.volume_m3
+    # Плановые значения с учетом объема и влажности заполнителей
+    planned = await setpoint_engine.targets(db, recipe, batch.volume_m3)
+    actual = {
+        "cement": actual_cement,
+        "sand": actual_sand,
+        "gravel": actual_gravel,
+        "water": actual_water,
+        "additive1": actual_additive1,
+        "additive2": actual_additive2,
+    }
     
-    # Расчет отклонений
-    def calc_deviation(actual, planned):
-        if planned == 0:
-            return 0
-        return ((actual - planned) / planned) * 100
+    # Фактические массы и отклонения пишутся тем же условным UPDATE, что и статус
+    values = {f"actual_{component}_kg": actual[component] for component in DOSING_COMPONENTS}
+    values.update({
+        f"deviation_{component}_pct": calc_deviation(actual[component], planned[component])
+        for component in DEVIATION_COMPONENTS
+    })
+    if not await transition(db, batch, "complete_dosing", current_user.id, idempotency_key, values):
+        # Повтор запроса: логи, списание и прогноз уже записаны
+        await db.refresh(batch)
+        return batch
     
-    batch.actual_cement_kg = actual_cement
-    batch.actual_sand_kg = actual_sand
-    batch.actual_gravel_kg = actual_gravel
-    batch.actual_water_kg = actual_water
-    batch.actual_additive1_kg = actual_additive1
-    batch.actual_additive2_kg = actual_additive2
-    
-    batch.deviation_cement_pct = calc_deviation(actual_cement, planned_cement)
-    batch.deviation_sand_pct = calc_deviation(actual_sand, planned_sand)
-    batch.deviation_gravel_pct = calc_deviation(actual_gravel, planned_gravel)
-    batch.deviation_water_pct = calc_deviation(actual_water, planned_water)
+    # Прогноз прочности в 28 суток по тем же фактическим массам и отклонениям —
+    # только для запроса, выполнившего переход
+    batch.predicted_strength_mpa, batch.strength_model_version = await strength_predictor.predict(
+        db, {**values, "volume_m3": batch.volume_m3}, recipe
+    )
     
     # Создание логов дозирования
-    components = [
-        ("cement", actual_cement, planned_cement),
-        ("sand", actual_sand, planned_sand),
-        ("gravel", actual_gravel, planned_gravel),
-        ("water", actual_water, planned_water),
-        ("additive1", actual_additive1, planned_additive1),
-        ("additive2", actual_additive2, planned_additive2),
-    ]
-    
-    for comp_type, actual, planned in components:
-        if planned > 0:
+    timestamp = datetime.now()
+    samples = []
+    for comp_type in DOSING_COMPONENTS:
+        if planned[comp_type] > 0:
             log = DosingLog(
                 batch_id=batch_id,
                 component_type=comp_type,
-                planned_kg=planned,
-                actual_kg=actual,
-                deviation_pct=calc_deviation(actual, planned)
+                planned_kg=planned[comp_type],
+                actual_kg=actual[comp_type],
+                deviation_pct=calc_deviation(actual[comp_type], planned[comp_type]),
+                timestamp=timestamp
             )
             db.add(log)
+            samples.append((batch.recipe_id, comp_type, log.deviation_pct, timestamp))
+    await add_to_rollups(db, samples)
     
-    batch.status = BatchStatus.MIXING
-    db.commit()
-    db.refresh(batch)
+    # Списание материалов со склада в той же транзакции
+    await consume_for_batches(db, [(batch.id, actual)])
+    
+    await db.commit()
+    await db.refresh(batch)
     return batch
 
 @router.post("/{batch_id}/complete", response_model=BatchResponse)
 async def complete_batch(
     batch_id: int,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["operator", "admin"]))
 ):
     """Завершение производства партии"""
-    batch = db.query(Batch).filter(Batch.id == batch_id).first()
-    if not batch:
-        raise HTTPException(status_code=404, detail="Партия не найдена")
-    
-    batch.status = BatchStatus.COMPLETED
-    batch.completed_at = datetime.now()
-    db.commit()
-    db.refresh(batch)
+    batch = await get_batch_or_404(db, batch_id)
+    await transition(
+        db, batch, "complete", current_user.id, idempotency_key,
+        values={"completed_at": datetime.now()},
+    )
+    await db.commit()
+    await db.refresh(batch)
     return batch
 
+@router.get("/{batch_id}/setpoints", response_model=BatchSetpoints)
+async def get_batch_setpoints(
+    batch_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Уставки дозирования партии с поправкой на влажность (для контроллера)"""
+    setpoints = await setpoint_engine.for_batch(db, batch_id)
+    if setpoints is None:
+        raise HTTPException(status_code=404, detail="Партия не найдена")
+    return fast_response(request, {"batch_id": batch_id, **setpoints})
+
+@router.get("/{batch_id}/transitions", response_model=List[BatchTransitionResponse])
+async def get_batch_transitions(
+    batch_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """История переходов статуса партии"""
+    result = await db.execute(
+        select(BatchTransition).where(BatchTransition.batch_id == batch_id).order_by(BatchTransition.id)
+    )
+    return result.scalars().all()
+
 @router.get("/{batch_id}/dosing-logs", response_model=List[DosingLogResponse])
 async def get_dosing_logs(
     batch_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение логов дозирования для партии"""
-    logs = db.query(DosingLog).filter(DosingLog.batch_id == batch_id).all()
-    return logs
+    logs = await fetch_rows(db, project(DosingLog, DosingLogResponse).where(DosingLog.batch_id == batch_id))
+    return fast_response(request, logs)
 
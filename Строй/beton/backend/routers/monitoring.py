@@ -1,60 +1,248 @@
 """
 Роутер для мониторинга производства
 """
-from typing import List
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from backend.database import get_db
+import asyncio
+import os
+from typing import List, Optional
+from fastapi import (
+    APIRouter, Depends, HTTPException, Query, Request, Response,
+    WebSocket, WebSocketDisconnect, status
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import AsyncSessionLocal, get_async_db
 from backend import auth
-from backend.models import User, Batch, Order, EquipmentStatus, WarehouseMaterial, BatchStatus, OrderStatus
+from backend.dashboard_cache import dashboard_cache
+from backend import gateway
+from backend.live_events import EVENT_TYPES, Subscription, live_broker
+from backend.pool_metrics import pool_stats
+from backend.profiling import slow_requests
+from backend.serialization import dumps, fetch_rows, project
+from backend.models import (
+    User, Batch, Order, EquipmentStatus, WarehouseMaterial,
+    ACTIVE_BATCH_FILTER, LOW_STOCK_FILTER, PENDING_ORDER_FILTER
+)
 from backend.schemas import MonitoringDashboard, EquipmentStatusResponse, BatchResponse, WarehouseMaterialResponse
 
 router = APIRouter()
 
-@router.get("/dashboard", response_model=MonitoringDashboard)
-async def get_dashboard(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(auth.get_current_user)
-):
-    """Получение данных для дашборда мониторинга"""
+# Интервал keep-alive сообщений в потоке событий (сек)
+LIVE_HEARTBEAT_SEC = float(os.getenv("LIVE_HEARTBEAT_SEC", "15"))
+
+async def build_dashboard(db: AsyncSession) -> dict:
+    """Сборка данных дашборда из БД (поля схемы MonitoringDashboard)"""
     # Активные партии
-    active_batches = db.query(Batch).filter(
-        Batch.status.in_([BatchStatus.DOSING, BatchStatus.MIXING, BatchStatus.DISCHARGING])
-    ).count()
+    active_batches = await db.scalar(
+        select(func.count()).select_from(Batch).where(ACTIVE_BATCH_FILTER)
+    )
     
     # Ожидающие заказы
-    pending_orders = db.query(Order).filter(Order.status == OrderStatus.PENDING).count()
+    pending_orders = await db.scalar(
+        select(func.count()).select_from(Order).where(PENDING_ORDER_FILTER)
+    )
     
     # Статус оборудования
-    equipment = db.query(EquipmentStatus).all()
-    equipment_status = [EquipmentStatusResponse.model_validate(eq) for eq in equipment]
+    equipment_status = await fetch_rows(db, project(EquipmentStatus, EquipmentStatusResponse))
     
     # Последние 100 партий
-    recent_batches = db.query(Batch).order_by(
-        Batch.created_at.desc()
-    ).limit(100).all()
-    recent_batches_response = [BatchResponse.model_validate(b) for b in recent_batches]
+    recent_batches = await fetch_rows(
+        db, project(Batch, BatchResponse).order_by(Batch.created_at.desc()).limit(100)
+    )
     
     # Материалы с низким остатком
-    low_stock = db.query(WarehouseMaterial).filter(
-        WarehouseMaterial.current_stock_kg <= WarehouseMaterial.min_stock_kg
-    ).all()
-    low_stock_response = [WarehouseMaterialResponse.model_validate(m) for m in low_stock]
-    
-    return MonitoringDashboard(
-        active_batches=active_batches,
-        pending_orders=pending_orders,
-        equipment_status=equipment_status,
-        recent_batches=recent_batches_response,
-        low_stock_materials=low_stock_response
+    low_stock = await fetch_rows(
+        db, project(WarehouseMaterial, WarehouseMaterialResponse).where(LOW_STOCK_FILTER)
     )
+    
+    return {
+        "active_batches": active_batches,
+        "pending_orders": pending_orders,
+        "equipment_status": equipment_status,
+        "recent_batches": recent_batches,
+        "low_stock_materials": low_stock,
+    }
+
+@router.get("/dashboard", response_model=MonitoringDashboard)
+async def get_dashboard(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Получение данных для дашборда мониторинга (кэшированный снимок с ETag)"""
+    async def build() -> bytes:
+        return dumps(await build_dashboard(db))
+
+    body, etag, cached = await dashboard_cache.get(build)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "X-Cache": "HIT" if cached else "MISS",
+    }
+    if request.headers.get("if-none-match") == etag:
+        dashboard_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/dashboard/cache-stats")
+async def get_dashboard_cache_stats(
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Статистика кэша дашборда (доля попаданий)"""
+    return dashboard_cache.stats()
+
+@router.get("/db-pool")
+async def get_db_pool_stats(
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Загрузка пулов соединений с БД: выдано, overflow, гистограммы ожидания"""
+    return pool_stats()
+
+@router.get("/slow-requests")
+async def get_slow_requests(
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Последние медленные запросы: маршрут, время, SQL и профиль (если снят)"""
+    return slow_requests()
+
+@router.get("/gateway")
+async def get_gateway_stats(
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Работа шлюза оборудования: опросы, склеенные обновления, сбросы в БД"""
+    if gateway.gateway is None:
+        raise HTTPException(status_code=404, detail="Шлюз оборудования не запущен")
+    return gateway.gateway.stats()
 
 @router.get("/equipment", response_model=List[EquipmentStatusResponse])
 async def get_equipment_status(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение статуса всего оборудования"""
-    equipment = db.query(EquipmentStatus).all()
+    equipment = await db.scalars(select(EquipmentStatus))
     return [EquipmentStatusResponse.model_validate(eq) for eq in equipment]
 
+
+async def authenticate_stream(request: Request, token: Optional[str]) -> User:
+    """Проверка токена для потока событий (из заголовка или параметра token)"""
+    if token is None:
+        token = await auth.oauth2_scheme(request)
+    # Короткая сессия: соединение с БД не удерживается на время потока
+    async with AsyncSessionLocal() as db:
+        return await auth.get_current_user(token=token, db=db)
+
+def make_subscription(
+    types: Optional[str],
+    order_id: Optional[int],
+    batch_id: Optional[int],
+    equipment_type: Optional[str],
+) -> Subscription:
+    """Подписка с фильтром из параметров запроса"""
+    selected = None
+    if types:
+        selected = {t.strip() for t in types.split(",") if t.strip()}
+        unknown = selected - set(EVENT_TYPES)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестные типы событий: {', '.join(sorted(unknown))}"
+            )
+    return Subscription(
+        types=selected,
+        order_id=order_id,
+        batch_id=batch_id,
+        equipment_type=equipment_type,
+    )
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    types: Optional[str] = Query(None, description="batch,equipment,low_stock"),
+    order_id: Optional[int] = Query(None),
+    batch_id: Optional[int] = Query(None),
+    equipment_type: Optional[str] = Query(None),
+    token: Optional[str] = Query(None),
+):
+    """Поток событий производства (Server-Sent Events)"""
+    await authenticate_stream(request, token)
+    subscription = live_broker.subscribe(
+        make_subscription(types, order_id, batch_id, equipment_type)
+    )
+
+    async def event_source():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    messages = await asyncio.wait_for(subscription.get(), LIVE_HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                for event_type, data in messages:
+                    yield f"event: {event_type}\ndata: {data}\n\n"
+        finally:
+            live_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws")
+async def live_websocket(
+    websocket: WebSocket,
+    token: str = Query(...),
+    types: Optional[str] = Query(None),
+    order_id: Optional[int] = Query(None),
+    batch_id: Optional[int] = Query(None),
+    equipment_type: Optional[str] = Query(None),
+):
+    """Поток событий производства (WebSocket)"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await auth.get_current_user(token=token, db=db)
+        subscription = make_subscription(types, order_id, batch_id, equipment_type)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    async def send_events():
+        while True:
+            try:
+                messages = await asyncio.wait_for(subscription.get(), LIVE_HEARTBEAT_SEC)
+            except asyncio.TimeoutError:
+                await websocket.send_text('{"type":"ping"}')
+                continue
+            for _, data in messages:
+                await websocket.send_text(data)
+
+    async def wait_disconnect():
+        # Сообщения клиента не нужны: чтение лишь сразу замечает отключение
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    await websocket.accept()
+    live_broker.subscribe(subscription)
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(wait_disconnect())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                raise error
+    finally:
+        live_broker.unsubscribe(subscription)
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
+
+@router.get("/stream/stats")
+async def get_stream_stats(
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Статистика рассылки событий: подписчики, доставлено, потеряно"""
+    return live_broker.stats()
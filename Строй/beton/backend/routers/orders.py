@@ -3,9 +3,11 @@
 """
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend.pagination import next_cursor_headers, paginate
+from backend.serialization import fast_response, fetch_rows, project
 from backend import auth
 from backend.models import User, Order, OrderStatus
 from backend.schemas import OrderCreate, OrderResponse, OrderUpdate
@@ -16,7 +18,7 @@ router = APIRouter()
 @router.post("/", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Создание нового заказа"""
@@ -36,33 +38,35 @@ async def create_order(
         status=OrderStatus.PENDING
     )
     db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
+    await db.commit()
+    await db.refresh(db_order)
     return db_order
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_orders(
+    request: Request,
     status: Optional[OrderStatus] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение списка заказов"""
-    query = db.query(Order)
+    query = project(Order, OrderResponse)
     if status:
-        query = query.filter(Order.status == status)
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-    return orders
+        query = query.where(Order.status == status)
+    orders = await fetch_rows(db, paginate(query, Order.created_at, Order.id, cursor, skip, limit))
+    return fast_response(request, orders, next_cursor_headers(orders, limit))
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение заказа по ID"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     return order
@@ -71,11 +75,11 @@ async def get_order(
 async def update_order(
     order_id: int,
     order_update: OrderUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["operator", "logistics", "admin"]))
 ):
     """Обновление заказа"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     
@@ -90,21 +94,21 @@ async def update_order(
     if order_update.vehicle_number:
         order.vehicle_number = order_update.vehicle_number
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     return order
 
 @router.delete("/{order_id}")
 async def delete_order(
     order_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["admin"]))
 ):
     """Удаление заказа"""
-    order = db.query(Order).filter(Order.id == order_id).first()
+    order = await db.get(Order, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
-    db.delete(order)
-    db.commit()
+    await db.delete(order)
+    await db.commit()
     return {"message": "Заказ удален"}
 
@@ -2,13 +2,21 @@
 Роутер для управления контролем качества
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend.dosing import DEVIATION_COMPONENTS, calc_deviation
+from backend.pagination import next_cursor_headers, paginate
+from backend.serialization import fast_response, fetch_rows, project
 from backend import auth
-from backend.models import User, QualityCheck, Batch, QualityStatus
+from backend.models import User, QualityCheck, Batch, QualityStatus, StrengthModel
+from backend.recipe_cache import recipe_cache
+from backend.setpoints import setpoint_engine
+from backend.strength import STRENGTH_BULK_MAX_ITEMS, model_info, strength_predictor, train
 from backend.schemas import (
-    QualityCheckCreate, QualityCheckResponse, QualityCheckUpdate
+    QualityCheckCreate, QualityCheckResponse, QualityCheckUpdate,
+    StrengthModelResponse, StrengthPrediction, StrengthPredictionBulk, StrengthPredictionInput
 )
 
 router = APIRouter()
@@ -16,17 +24,19 @@ router = APIRouter()
 @router.post("/", response_model=QualityCheckResponse)
 async def create_quality_check(
     quality_data: QualityCheckCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["laboratory", "admin"]))
 ):
     """Создание записи контроля качества (только лаборант)"""
     # Проверка существования партии
-    batch = db.query(Batch).filter(Batch.id == quality_data.batch_id).first()
+    batch = await db.get(Batch, quality_data.batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Партия не найдена")
     
     # Проверка, что запись еще не создана
-    existing = db.query(QualityCheck).filter(QualityCheck.batch_id == quality_data.batch_id).first()
+    existing = await db.scalar(
+        select(QualityCheck).where(QualityCheck.batch_id == quality_data.batch_id)
+    )
     if existing:
         raise HTTPException(
             status_code=400,
@@ -38,36 +48,38 @@ async def create_quality_check(
         checked_by=current_user.id
     )
     db.add(db_quality)
-    db.commit()
-    db.refresh(db_quality)
+    await db.commit()
+    await db.refresh(db_quality)
     return db_quality
 
 @router.get("/", response_model=List[QualityCheckResponse])
 async def get_quality_checks(
+    request: Request,
     status: Optional[QualityStatus] = Query(None),
     batch_id: Optional[int] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (заголовок X-Next-Cursor)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение списка проверок качества"""
-    query = db.query(QualityCheck)
+    query = project(QualityCheck, QualityCheckResponse)
     if status:
-        query = query.filter(QualityCheck.status == status)
+        query = query.where(QualityCheck.status == status)
     if batch_id:
-        query = query.filter(QualityCheck.batch_id == batch_id)
-    checks = query.order_by(QualityCheck.checked_at.desc()).offset(skip).limit(limit).all()
-    return checks
+        query = query.where(QualityCheck.batch_id == batch_id)
+    checks = await fetch_rows(db, paginate(query, QualityCheck.checked_at, QualityCheck.id, cursor, skip, limit))
+    return fast_response(request, checks, next_cursor_headers(checks, limit, "checked_at"))
 
 @router.get("/{check_id}", response_model=QualityCheckResponse)
 async def get_quality_check(
     check_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение проверки качества по ID"""
-    check = db.query(QualityCheck).filter(QualityCheck.id == check_id).first()
+    check = await db.get(QualityCheck, check_id)
     if not check:
         raise HTTPException(status_code=404, detail="Проверка качества не найдена")
     return check
@@ -76,11 +88,11 @@ async def get_quality_check(
 async def update_quality_check(
     check_id: int,
     quality_update: QualityCheckUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["laboratory", "technologist", "admin"]))
 ):
     """Обновление проверки качества"""
-    check = db.query(QualityCheck).filter(QualityCheck.id == check_id).first()
+    check = await db.get(QualityCheck, check_id)
     if not check:
         raise HTTPException(status_code=404, detail="Проверка качества не найдена")
     
@@ -88,7 +100,85 @@ async def update_quality_check(
     for field, value in update_data.items():
         setattr(check, field, value)
     
-    db.commit()
-    db.refresh(check)
+    await db.commit()
+    await db.refresh(check)
     return check
 
+# ============= ПРОГНОЗ ПРОЧНОСТИ =============
+
+@router.post("/strength/train", response_model=StrengthModelResponse)
+async def train_strength_model(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["technologist", "admin"]))
+):
+    """Обучение новой версии модели прочности по партиям с результатами лаборатории"""
+    model = await train(db, current_user.id)
+    await db.commit()
+    return model_info(model)
+
+@router.get("/strength/models", response_model=List[StrengthModelResponse])
+async def get_strength_models(
+    limit: int = Query(20, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Версии модели прочности с метриками качества, новые первыми"""
+    models = await db.scalars(select(StrengthModel).order_by(StrengthModel.id.desc()).limit(limit))
+    return [model_info(model) for model in models]
+
+@router.get("/strength/stats")
+async def get_strength_stats(
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Версия модели в памяти процесса и число прогнозов"""
+    return strength_predictor.stats()
+
+async def prediction_inputs(db: AsyncSession, items: List[StrengthPredictionInput]) -> list:
+    """[(поля партии, рецептура)]; незаданные отклонения считаются от уставок рецептуры"""
+    recipes = await recipe_cache.get_many(db, {item.recipe_id for item in items})
+    inputs = []
+    for item in items:
+        values = item.model_dump()
+        recipe = recipes.get(item.recipe_id)
+        missing = [c for c in DEVIATION_COMPONENTS if values[f"deviation_{c}_pct"] is None]
+        if recipe is not None and missing and item.volume_m3 > 0:
+            planned = await setpoint_engine.targets(db, recipe, item.volume_m3)
+            for c in missing:
+                values[f"deviation_{c}_pct"] = calc_deviation(values[f"actual_{c}_kg"], planned[c])
+        inputs.append((values, recipe))
+    return inputs
+
+async def current_model_or_409(db: AsyncSession):
+    model = await strength_predictor.current(db)
+    if model is None:
+        raise HTTPException(status_code=409, detail="Модель прочности еще не обучена")
+    return model
+
+@router.post("/strength/predict", response_model=StrengthPrediction)
+async def predict_strength(
+    item: StrengthPredictionInput,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Прогноз прочности в 28 суток для одного замеса"""
+    model = await current_model_or_409(db)
+    [(values, recipe)] = await prediction_inputs(db, [item])
+    if recipe is None:
+        raise HTTPException(status_code=404, detail="Рецептура не найдена")
+    strength_predictor.predictions += 1
+    return StrengthPrediction(model_version=model.version, predicted_strength_mpa=model.predict(values, recipe))
+
+@router.post("/strength/predict/bulk", response_model=StrengthPredictionBulk)
+async def predict_strength_bulk(
+    request: Request,
+    items: List[StrengthPredictionInput],
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Прогноз для многих замесов одной версией модели (null — рецептура не найдена или данных не хватает)"""
+    if len(items) > STRENGTH_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Не больше {STRENGTH_BULK_MAX_ITEMS} записей в запросе")
+    model = await current_model_or_409(db)
+    inputs = await prediction_inputs(db, items)
+    strength_predictor.predictions += len(inputs)
+    return fast_response(request, {"model_version": model.version, "predictions": model.predict_many(inputs)})
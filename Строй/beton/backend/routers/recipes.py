@@ -3,10 +3,12 @@
 """
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
 from backend import auth
 from backend.models import User, Recipe
+from backend.recipe_cache import recipe_cache
 from backend.schemas import RecipeCreate, RecipeResponse, RecipeUpdate
 
 router = APIRouter()
@@ -14,12 +16,12 @@ router = APIRouter()
 @router.post("/", response_model=RecipeResponse)
 async def create_recipe(
     recipe_data: RecipeCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["technologist", "admin"]))
 ):
     """Создание новой рецептуры (только технолог)"""
     # Проверка уникальности кода
-    existing = db.query(Recipe).filter(Recipe.code == recipe_data.code).first()
+    existing = await db.scalar(select(Recipe).where(Recipe.code == recipe_data.code))
     if existing:
         raise HTTPException(
             status_code=400,
@@ -31,8 +33,8 @@ async def create_recipe(
         created_by=current_user.id
     )
     db.add(db_recipe)
-    db.commit()
-    db.refresh(db_recipe)
+    await db.commit()
+    await db.refresh(db_recipe)
     return db_recipe
 
 @router.get("/", response_model=List[RecipeResponse])
@@ -41,26 +43,33 @@ async def get_recipes(
     is_gost: Optional[bool] = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение списка рецептур"""
-    query = db.query(Recipe)
+    query = select(Recipe)
     if is_active is not None:
-        query = query.filter(Recipe.is_active == is_active)
+        query = query.where(Recipe.is_active == is_active)
     if is_gost is not None:
-        query = query.filter(Recipe.is_gost == is_gost)
-    recipes = query.order_by(Recipe.name).offset(skip).limit(limit).all()
-    return recipes
+        query = query.where(Recipe.is_gost == is_gost)
+    recipes = await db.scalars(query.order_by(Recipe.name).offset(skip).limit(limit))
+    return recipes.all()
+
+@router.get("/cache-stats")
+async def get_recipe_cache_stats(
+    current_user: User = Depends(auth.require_role(["admin", "technologist"]))
+):
+    """Статистика кэша рецептур"""
+    return recipe_cache.stats()
 
 @router.get("/{recipe_id}", response_model=RecipeResponse)
 async def get_recipe(
     recipe_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение рецептуры по ID"""
-    recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
+    recipe = await db.get(Recipe, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Рецептура не найдена")
     return recipe
@@ -69,11 +78,11 @@ async def get_recipe(
 async def update_recipe(
     recipe_id: int,
     recipe_update: RecipeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["technologist", "admin"]))
 ):
     """Обновление рецептуры (только технолог)"""
-    recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
+    recipe = await db.get(Recipe, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Рецептура не найдена")
     
@@ -82,21 +91,21 @@ async def update_recipe(
         setattr(recipe, field, value)
     
     recipe.version += 1
-    db.commit()
-    db.refresh(recipe)
+    await db.commit()
+    await db.refresh(recipe)
     return recipe
 
 @router.delete("/{recipe_id}")
 async def delete_recipe(
     recipe_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["admin"]))
 ):
     """Удаление рецептуры (только администратор)"""
-    recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
+    recipe = await db.get(Recipe, recipe_id)
     if not recipe:
         raise HTTPException(status_code=404, detail="Рецептура не найдена")
-    db.delete(recipe)
-    db.commit()
+    await db.delete(recipe)
+    await db.commit()
     return {"message": "Рецептура удалена"}
 
@@ -0,0 +1,103 @@
+"""
+Роутер для выгрузки истории производства (отчеты, аудит по ГОСТ)
+"""
+from typing import Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import literal, select
+from backend import auth
+from backend.export import export_response
+from backend.pagination import StoredDateTime
+from backend.models import User, Batch, Order, Recipe, DosingLog, QualityCheck
+
+router = APIRouter()
+
+REPORT_ROLES = ["admin", "technologist", "production_head", "laboratory", "shift_master"]
+
+def filter_period(query, column, date_from: Optional[datetime], date_to: Optional[datetime]):
+    """Период [date_from, date_to)"""
+    if date_from:
+        query = query.where(column >= literal(date_from, StoredDateTime()))
+    if date_to:
+        query = query.where(column < literal(date_to, StoredDateTime()))
+    return query
+
+def batches_export_query(date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """Партии с заказом, рецептурой и контролем качества за период"""
+    query = (
+        select(
+            Batch.id.label("batch_id"),
+            Batch.batch_number,
+            Batch.status,
+            Batch.volume_m3,
+            Batch.created_at,
+            Batch.started_at,
+            Batch.completed_at,
+            Order.order_number,
+            Order.customer_name,
+            Order.concrete_grade,
+            Recipe.code.label("recipe_code"),
+            Recipe.name.label("recipe_name"),
+            Batch.actual_cement_kg,
+            Batch.actual_sand_kg,
+            Batch.actual_gravel_kg,
+            Batch.actual_water_kg,
+            Batch.actual_additive1_kg,
+            Batch.actual_additive2_kg,
+            Batch.deviation_cement_pct,
+            Batch.deviation_sand_pct,
+            Batch.deviation_gravel_pct,
+            Batch.deviation_water_pct,
+            QualityCheck.status.label("quality_status"),
+            QualityCheck.mobility_cm,
+            QualityCheck.strength_mpa,
+            QualityCheck.checked_at,
+        )
+        .join(Order, Batch.order_id == Order.id)
+        .join(Recipe, Batch.recipe_id == Recipe.id)
+        .outerjoin(QualityCheck, QualityCheck.batch_id == Batch.id)
+        .order_by(Batch.created_at, Batch.id)
+    )
+    return filter_period(query, Batch.created_at, date_from, date_to)
+
+def dosing_logs_export_query(date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """Логи дозирования с партией, заказом и рецептурой за период"""
+    query = (
+        select(
+            DosingLog.id.label("log_id"),
+            DosingLog.timestamp,
+            DosingLog.batch_id,
+            Batch.batch_number,
+            Order.order_number,
+            Recipe.code.label("recipe_code"),
+            DosingLog.component_type,
+            DosingLog.planned_kg,
+            DosingLog.actual_kg,
+            DosingLog.deviation_pct,
+        )
+        .join(Batch, DosingLog.batch_id == Batch.id)
+        .join(Order, Batch.order_id == Order.id)
+        .join(Recipe, Batch.recipe_id == Recipe.id)
+        .order_by(DosingLog.timestamp, DosingLog.id)
+    )
+    return filter_period(query, DosingLog.timestamp, date_from, date_to)
+
+@router.get("/batches")
+async def export_batches(
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+    fmt: str = Query("csv", alias="format", description="csv или parquet"),
+    current_user: User = Depends(auth.require_role(REPORT_ROLES))
+):
+    """Выгрузка партий с заказом, рецептурой и контролем качества"""
+    return export_response(batches_export_query(date_from, date_to), fmt, "batches")
+
+@router.get("/dosing-logs")
+async def export_dosing_logs(
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+    fmt: str = Query("csv", alias="format", description="csv или parquet"),
+    current_user: User = Depends(auth.require_role(REPORT_ROLES))
+):
+    """Выгрузка логов дозирования с партией, заказом и рецептурой"""
+    return export_response(dosing_logs_export_query(date_from, date_to), fmt, "dosing_logs")
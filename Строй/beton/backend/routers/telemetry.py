@@ -0,0 +1,75 @@
+"""
+Роутер для показаний датчиков оборудования
+"""
+from typing import List, Optional
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
+from backend import auth
+from backend.models import User, EquipmentStatus, TelemetrySeries
+from backend.schemas import (
+    TelemetryBatch, TelemetryIngestResult, TelemetrySeriesData, TelemetrySeriesResponse
+)
+from backend.serialization import fast_response
+from backend.telemetry import TELEMETRY_MAX_POINTS, apply_retention, ingest, local_time, query_series
+
+router = APIRouter()
+
+@router.post("/readings", response_model=TelemetryIngestResult)
+async def post_readings(
+    batches: List[TelemetryBatch],
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["operator", "admin"]))
+):
+    """Загрузка показаний пачкой: блоки точек по оборудованию и величине"""
+    result = await ingest(db, batches)
+    await db.commit()
+    return result
+
+@router.get("/series", response_model=List[TelemetrySeriesResponse])
+async def list_series(
+    equipment_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Ряды показаний"""
+    query = (
+        select(TelemetrySeries.id, TelemetrySeries.equipment_id, EquipmentStatus.equipment_name, TelemetrySeries.metric)
+        .join(EquipmentStatus, TelemetrySeries.equipment_id == EquipmentStatus.id)
+        .order_by(EquipmentStatus.equipment_name, TelemetrySeries.metric)
+    )
+    if equipment_id is not None:
+        query = query.where(TelemetrySeries.equipment_id == equipment_id)
+    return [row._asdict() for row in await db.execute(query)]
+
+@router.get("/series/{series_id}", response_model=TelemetrySeriesData)
+async def get_series(
+    series_id: int,
+    request: Request,
+    date_from: Optional[datetime] = Query(None, description="По умолчанию — час назад"),
+    date_to: Optional[datetime] = Query(None, description="По умолчанию — сейчас"),
+    points: int = Query(500, ge=1, le=TELEMETRY_MAX_POINTS, description="Примерное число точек графика"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Ряд за период, прореженный для графика (среднее, минимум и максимум на точку)"""
+    if await db.get(TelemetrySeries, series_id) is None:
+        raise HTTPException(status_code=404, detail="Ряд не найден")
+    # Границы с часовым поясом приводятся к местному времени до сравнения
+    date_to = local_time(date_to) if date_to else datetime.now()
+    date_from = local_time(date_from) if date_from else date_to - timedelta(hours=1)
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from должна быть раньше date_to")
+    return fast_response(request, await query_series(db, series_id, date_from, date_to, points))
+
+@router.post("/retention")
+async def run_telemetry_retention(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Удаление показаний и агрегатов старше сроков хранения"""
+    deleted = await apply_retention(db)
+    await db.commit()
+    return {"deleted": deleted}
@@ -1,41 +1,64 @@
 """
 Роутер для управления пользователями
 """
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
 from backend import auth
-from backend.models import User
-from backend.schemas import UserResponse, UserUpdate
+from backend.models import User, UserRole
+from backend.principal_cache import principal_cache
+from backend.schemas import UserResponse
 from pydantic import BaseModel
 
 router = APIRouter()
 
 class UserUpdate(BaseModel):
-    email: str = None
-    full_name: str = None
-    role: str = None
-    is_active: bool = None
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    role: Optional[UserRole] = None
+    is_active: Optional[bool] = None
 
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["admin", "production_head"]))
 ):
     """Получение списка пользователей"""
-    users = db.query(User).all()
-    return users
+    users = await db.scalars(select(User))
+    return users.all()
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение пользователя по ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return user
 
+@router.patch("/{user_id}", response_model=UserResponse)
+async def update_user(
+    user_id: int,
+    user_update: UserUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Обновление пользователя (в том числе деактивация)"""
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    
+    update_data = user_update.dict(exclude_unset=True)
+    for field, value in update_data.items():
+        setattr(user, field, value)
+    
+    await db.commit()
+    await db.refresh(user)
+    # Роль и активность проверяются по кэшу: сбрасываем запись сразу
+    principal_cache.invalidate(user.username)
+    return user
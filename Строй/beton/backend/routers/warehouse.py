@@ -2,13 +2,19 @@
 Роутер для управления складом сырья
 """
 from typing import List, Optional
+from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
 from backend import auth
-from backend.models import User, WarehouseMaterial
+from backend.models import User, WarehouseMaterial, StockMovement, LOW_STOCK_FILTER
 from backend.schemas import (
-    WarehouseMaterialCreate, WarehouseMaterialResponse, WarehouseMaterialUpdate
+    WarehouseMaterialCreate, WarehouseMaterialResponse, WarehouseMaterialUpdate,
+    StockMovementCreate, StockMovementResponse, StockReconciliation
+)
+from backend.stock import (
+    MANUAL_REASONS, STOCK_LEDGER_KEEP_DAYS, compact_ledger, count_stock, ledger_balance, record_movement
 )
 
 router = APIRouter()
@@ -16,42 +22,50 @@ router = APIRouter()
 @router.post("/", response_model=WarehouseMaterialResponse)
 async def create_material(
     material_data: WarehouseMaterialCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["admin", "production_head"]))
 ):
     """Создание записи о материале на складе"""
     db_material = WarehouseMaterial(**material_data.dict())
     db.add(db_material)
-    db.commit()
-    db.refresh(db_material)
+    await db.flush()
+    # Начальный остаток — первая запись журнала
+    if db_material.current_stock_kg:
+        db.add(StockMovement(
+            material_id=db_material.id,
+            quantity_kg=db_material.current_stock_kg,
+            reason="receipt",
+            created_by=current_user.id,
+            comment="Начальный остаток"
+        ))
+    await db.commit()
+    await db.refresh(db_material)
     return db_material
 
 @router.get("/", response_model=List[WarehouseMaterialResponse])
 async def get_materials(
     material_type: Optional[str] = Query(None),
     low_stock_only: bool = Query(False),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение списка материалов на складе"""
-    query = db.query(WarehouseMaterial)
+    query = select(WarehouseMaterial)
     if material_type:
-        query = query.filter(WarehouseMaterial.material_type == material_type)
+        query = query.where(WarehouseMaterial.material_type == material_type)
     if low_stock_only:
-        query = query.filter(
-            WarehouseMaterial.current_stock_kg <= WarehouseMaterial.min_stock_kg
-        )
-    materials = query.all()
-    return materials
+        query = query.where(LOW_STOCK_FILTER)
+    materials = await db.scalars(query)
+    return materials.all()
 
 @router.get("/{material_id}", response_model=WarehouseMaterialResponse)
 async def get_material(
     material_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_user)
 ):
     """Получение материала по ID"""
-    material = db.query(WarehouseMaterial).filter(WarehouseMaterial.id == material_id).first()
+    material = await db.get(WarehouseMaterial, material_id)
     if not material:
         raise HTTPException(status_code=404, detail="Материал не найден")
     return material
@@ -60,19 +74,87 @@ async def get_material(
 async def update_material(
     material_id: int,
     material_update: WarehouseMaterialUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.require_role(["operator", "admin", "production_head"]))
 ):
-    """Обновление остатков материала"""
-    material = db.query(WarehouseMaterial).filter(WarehouseMaterial.id == material_id).first()
+    """Обновление остатков материала (остаток задается по результатам инвентаризации)"""
+    update_data = material_update.dict(exclude_unset=True)
+    counted = update_data.pop("current_stock_kg", None)
+    if counted is not None:
+        # Остаток и запись журнала — от прежнего значения, прочитанного под блокировкой
+        if await count_stock(db, material_id, counted, user_id=current_user.id) is None:
+            raise HTTPException(status_code=404, detail="Материал не найден")
+    material = await db.get(WarehouseMaterial, material_id, populate_existing=True)
     if not material:
         raise HTTPException(status_code=404, detail="Материал не найден")
     
-    update_data = material_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(material, field, value)
     
-    db.commit()
-    db.refresh(material)
+    await db.commit()
+    await db.refresh(material)
     return material
 
+@router.post("/{material_id}/movements", response_model=StockMovementResponse)
+async def create_movement(
+    material_id: int,
+    movement_data: StockMovementCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["operator", "admin", "production_head"]))
+):
+    """Приход или корректировка остатка материала"""
+    if movement_data.reason not in MANUAL_REASONS:
+        raise HTTPException(status_code=400, detail=f"Причина должна быть одной из: {', '.join(MANUAL_REASONS)}")
+    movement = await record_movement(
+        db, material_id, movement_data.quantity_kg, movement_data.reason,
+        user_id=current_user.id, comment=movement_data.comment
+    )
+    if movement is None:
+        raise HTTPException(status_code=404, detail="Материал не найден")
+    await db.commit()
+    return movement
+
+@router.get("/{material_id}/movements", response_model=List[StockMovementResponse])
+async def get_movements(
+    material_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_user)
+):
+    """Последние движения материала"""
+    movements = await db.scalars(
+        select(StockMovement)
+        .where(StockMovement.material_id == material_id)
+        .order_by(StockMovement.created_at.desc(), StockMovement.id.desc())
+        .limit(limit)
+    )
+    return movements.all()
+
+@router.get("/{material_id}/reconcile", response_model=StockReconciliation)
+async def reconcile_material(
+    material_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["admin", "production_head"]))
+):
+    """Сверка остатка с суммой движений по журналу"""
+    material = await db.get(WarehouseMaterial, material_id)
+    if not material:
+        raise HTTPException(status_code=404, detail="Материал не найден")
+    balance = await ledger_balance(db, material_id)
+    return StockReconciliation(
+        material_id=material_id,
+        current_stock_kg=material.current_stock_kg,
+        ledger_balance_kg=balance,
+        difference_kg=material.current_stock_kg - balance
+    )
+
+@router.post("/ledger/compact")
+async def compact_stock_ledger(
+    keep_days: int = Query(STOCK_LEDGER_KEEP_DAYS, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.require_role(["admin"]))
+):
+    """Сворачивание движений старше keep_days в одну строку на материал"""
+    folded = await compact_ledger(db, datetime.now() - timedelta(days=keep_days))
+    await db.commit()
+    return {"folded": folded}
@@ -2,8 +2,8 @@
 Pydantic схемы для валидации данных
 """
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from typing import Dict, Optional, List, Tuple
+from datetime import date, datetime
 from backend.models import UserRole, OrderStatus, BatchStatus, QualityStatus
 
 
@@ -127,6 +127,11 @@ class BatchResponse(BatchBase):
     deviation_sand_pct: Optional[float] = None
     deviation_gravel_pct: Optional[float] = None
     deviation_water_pct: Optional[float] = None
+    predicted_strength_mpa: Optional[float] = None
+    strength_model_version: Optional[int] = None
+    mixer_id: Optional[int] = None
+    planned_start: Optional[datetime] = None
+    planned_end: Optional[datetime] = None
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     created_at: datetime
@@ -135,6 +140,31 @@ class BatchResponse(BatchBase):
         from_attributes = True
 
 
+class BatchSetpoints(BaseModel):
+    batch_id: int
+    recipe_id: int
+    recipe_version: int
+    volume_m3: float
+    moisture_pct: Dict[str, float]  # Влажность заполнителей рецептуры
+    free_water_kg: float  # Вода, пришедшая с заполнителями
+    base: Dict[str, float]  # Сухие массы по рецептуре
+    targets: Dict[str, float]  # Уставки с поправкой на влажность
+
+
+class BatchTransitionResponse(BaseModel):
+    id: int
+    batch_id: int
+    action: str
+    from_status: BatchStatus
+    to_status: BatchStatus
+    idempotency_key: Optional[str] = None
+    user_id: Optional[int] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
 # DosingLog schemas
 class DosingLogResponse(BaseModel):
     id: int
@@ -149,6 +179,53 @@ class DosingLogResponse(BaseModel):
         from_attributes = True
 
 
+class DosingRecord(BaseModel):
+    batch_id: int
+    actual_cement: float
+    actual_sand: float
+    actual_gravel: float
+    actual_water: float
+    actual_additive1: float = 0
+    actual_additive2: float = 0
+    timestamp: Optional[datetime] = None
+
+class BulkDosingError(BaseModel):
+    index: int
+    batch_id: Optional[int] = None
+    error: str
+
+class BulkDosingResult(BaseModel):
+    accepted: int
+    rejected: int
+    dosing_logs: int
+    errors: List[BulkDosingError] = []
+
+
+# Production plan schemas
+class PlanRequest(BaseModel):
+    order_ids: Optional[List[int]] = None  # По умолчанию — все ожидающие заказы
+    start_at: Optional[datetime] = None  # По умолчанию — сейчас
+    dry_run: bool = False  # Только рассчитать, не сохраняя партии
+
+class PlannedBatch(BaseModel):
+    id: Optional[int] = None
+    batch_number: str
+    order_id: int
+    recipe_id: int
+    mixer_id: int
+    volume_m3: float
+    planned_start: datetime
+    planned_end: datetime
+
+class PlanResult(BaseModel):
+    orders_planned: int
+    makespan_end: Optional[datetime] = None
+    total_truck_wait_sec: float
+    max_truck_wait_sec: float
+    skipped_orders: List[int] = []
+    batches: List[PlannedBatch]
+
+
 # QualityCheck schemas
 class QualityCheckBase(BaseModel):
     mobility_cm: Optional[float] = None
@@ -176,6 +253,44 @@ class QualityCheckResponse(QualityCheckBase):
         from_attributes = True
 
 
+# Strength prediction schemas
+class StrengthPredictionInput(BaseModel):
+    recipe_id: int
+    volume_m3: float
+    actual_cement_kg: float
+    actual_sand_kg: float
+    actual_gravel_kg: float
+    actual_water_kg: float
+    actual_additive1_kg: float = 0
+    actual_additive2_kg: float = 0
+    # Не заданы — считаются от уставок рецептуры, как при завершении дозирования
+    deviation_cement_pct: Optional[float] = None
+    deviation_sand_pct: Optional[float] = None
+    deviation_gravel_pct: Optional[float] = None
+    deviation_water_pct: Optional[float] = None
+
+class StrengthPrediction(BaseModel):
+    model_version: int
+    predicted_strength_mpa: Optional[float] = None  # None — прогноз невозможен (нет воды, объема)
+
+class StrengthPredictionBulk(BaseModel):
+    model_version: int
+    predictions: List[Optional[float]]  # В порядке входных записей
+
+class StrengthModelResponse(BaseModel):
+    id: int  # Версия
+    intercept: float
+    coefficients: Dict[str, float]
+    samples: int
+    rmse_mpa: Optional[float] = None
+    r2: Optional[float] = None
+    holdout_samples: Optional[int] = None
+    holdout_rmse_mpa: Optional[float] = None
+    holdout_r2: Optional[float] = None
+    train_ms: Optional[float] = None
+    created_at: datetime
+
+
 # Warehouse schemas
 class WarehouseMaterialBase(BaseModel):
     material_type: str
@@ -202,11 +317,37 @@ class WarehouseMaterialResponse(WarehouseMaterialBase):
         from_attributes = True
 
 
+class StockMovementCreate(BaseModel):
+    quantity_kg: float  # > 0 приход, < 0 расход
+    reason: str = "receipt"  # receipt, adjustment
+    comment: Optional[str] = None
+
+class StockMovementResponse(BaseModel):
+    id: int
+    material_id: int
+    quantity_kg: float
+    reason: str
+    batch_id: Optional[int] = None
+    created_by: Optional[int] = None
+    comment: Optional[str] = None
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class StockReconciliation(BaseModel):
+    material_id: int
+    current_stock_kg: float
+    ledger_balance_kg: float
+    difference_kg: float
+
+
 # Equipment schemas
 class EquipmentStatusResponse(BaseModel):
     id: int
     equipment_name: str
     equipment_type: str
+    capacity_m3: Optional[float] = None
     is_operational: bool
     status: str
     last_update: datetime
@@ -224,3 +365,72 @@ class MonitoringDashboard(BaseModel):
     recent_batches: List[BatchResponse]
     low_stock_materials: List[WarehouseMaterialResponse]
 
+
+# Analytics schemas
+class DeviationStats(BaseModel):
+    recipe_code: Optional[str] = None
+    component_type: Optional[str] = None
+    day: Optional[date] = None
+    shift: Optional[int] = None
+    count: int
+    mean_pct: float
+    stddev_pct: float
+    min_pct: float
+    max_pct: float
+    p5_pct: float
+    p50_pct: float
+    p95_pct: float
+
+class SpcPoint(BaseModel):
+    day: date
+    shift: int
+    count: int
+    mean_pct: float
+    ucl_pct: float
+    lcl_pct: float
+    out_of_control: bool
+    rules: List[str] = []
+
+class SpcChart(BaseModel):
+    recipe_code: str
+    component_type: str
+    center_line_pct: float
+    sigma_pct: float
+    points: List[SpcPoint]
+
+
+# Telemetry schemas
+class TelemetryBatch(BaseModel):
+    equipment: str  # Название оборудования (equipment_name)
+    metric: str
+    points: List[Tuple[datetime, float]]  # [[время, значение], ...]
+
+class TelemetryIngestError(BaseModel):
+    index: int  # Номер блока в запросе
+    equipment: str
+    metric: str
+    error: str
+
+class TelemetryIngestResult(BaseModel):
+    accepted: int
+    rejected: int
+    errors: List[TelemetryIngestError] = []
+
+class TelemetrySeriesResponse(BaseModel):
+    id: int
+    equipment_id: int
+    equipment_name: str
+    metric: str
+
+class TelemetryPoint(BaseModel):
+    ts: datetime  # Начало интервала
+    count: int
+    avg: float
+    min: float
+    max: float
+
+class TelemetrySeriesData(BaseModel):
+    series_id: int
+    source: str  # raw, 1s, 1m, 1h — откуда взяты точки
+    step_sec: float  # Длина интервала одной точки
+    points: List[TelemetryPoint]
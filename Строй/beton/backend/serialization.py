@@ -0,0 +1,74 @@
+"""
+Быстрая сериализация больших списков
+
+Списки читаются запросом только нужных колонок (без ORM-объектов и без
+проверки каждой строки моделью Pydantic) и кодируются сразу в байты:
+в JSON через `orjson`, а при `Accept: application/msgpack` — в MessagePack.
+Поля ответа те же, что у схемы `*Response` эндпоинта.
+
+`orjson` и `msgpack` — необязательные зависимости: без `orjson` JSON
+кодируется стандартной библиотекой, без `msgpack` MessagePack недоступен.
+"""
+import enum
+import json
+from datetime import date, datetime
+from typing import Dict, List, Optional, Type
+
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def project(model, schema: Type[BaseModel]) -> Select:
+    """SELECT колонок модели, совпадающих по имени с полями схемы ответа"""
+    return select(*[getattr(model, name) for name in schema.model_fields])
+
+
+async def fetch_rows(db: AsyncSession, query: Select) -> List[dict]:
+    """Строки запроса как словари {колонка: значение}"""
+    result = await db.execute(query)
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result.all()]
+
+
+def _default(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется")
+
+
+def dumps(content) -> bytes:
+    """JSON в байтах: orjson, если установлен"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def wants_msgpack(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+def fast_response(request: Request, content, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Ответ в JSON или MessagePack (по заголовку Accept)"""
+    if wants_msgpack(request):
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="MessagePack недоступен: не установлен msgpack")
+        body = msgpack.packb(content, default=_default)
+        return Response(content=body, media_type=MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return Response(content=dumps(content), media_type="application/json", headers=headers)
@@ -0,0 +1,261 @@
+"""
+Уставки дозирования с поправкой на влажность заполнителей
+
+Рецептура задает массы сухих компонентов на 1 м³. Песок и щебень в силосах
+и бункерах влажные: чтобы получить сухую массу, заполнителя нужно отвесить
+больше, а воды — меньше на ту воду, что пришла с ним. Влажность берется у
+материала, из которого дозируется компонент (первый по id для типа, как
+при списании со склада).
+
+Для каждой рецептуры таблица уставок на типовые объемы (шаг
+SETPOINT_VOLUME_STEP до SETPOINT_MAX_VOLUME) считается заранее; прочие
+объемы считаются при первом обращении и запоминаются. Изменение влажности
+пересчитывает только рецептуры, в которых есть этот заполнитель; изменение
+рецептуры — только её таблицу. Влажность, измененная в этом процессе,
+подхватывается после коммита, в других процессах — не позже чем через
+SETPOINT_CHECK_SEC.
+"""
+import asyncio
+import os
+import time
+from itertools import chain
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.models import Batch, Recipe, WarehouseMaterial
+from backend.recipe_cache import recipe_cache
+
+# Компоненты рецептуры в порядке записи логов
+DOSING_COMPONENTS = ("cement", "sand", "gravel", "water", "additive1", "additive2")
+
+# Заполнители, влажность которых учитывается в уставках
+AGGREGATE_COMPONENTS = ("sand", "gravel")
+
+# Шаг и предел объемов, для которых уставки считаются заранее (м³)
+SETPOINT_VOLUME_STEP = float(os.getenv("SETPOINT_VOLUME_STEP", "0.25"))
+SETPOINT_MAX_VOLUME = float(os.getenv("SETPOINT_MAX_VOLUME", "6"))
+
+# Период проверки влажности в БД (сек)
+SETPOINT_CHECK_SEC = float(os.getenv("SETPOINT_CHECK_SEC", "5"))
+
+# Сколько нетиповых объемов запоминать на рецептуру
+SETPOINT_EXTRA_VOLUMES = int(os.getenv("SETPOINT_EXTRA_VOLUMES", "256"))
+
+# Сколько партий держать в памяти (рецептура и объем партии не меняются)
+SETPOINT_BATCH_CACHE_SIZE = int(os.getenv("SETPOINT_BATCH_CACHE_SIZE", "10000"))
+
+
+def plan_components(recipe: Recipe, volume_m3: float) -> Dict[str, float]:
+    """Плановые массы сухих компонентов (кг) с учетом объема партии"""
+    return {
+        component: getattr(recipe, f"{component}_kg") * volume_m3
+        for component in DOSING_COMPONENTS
+    }
+
+
+def correct_for_moisture(base: Dict[str, float], moisture: Dict[str, float]) -> Tuple[Dict[str, float], float]:
+    """Уставки по сухим массам и влажности (%), и вода, пришедшая с заполнителями (кг)"""
+    targets = dict(base)
+    free_water = 0.0
+    for component in AGGREGATE_COMPONENTS:
+        wet = base[component] * moisture.get(component, 0) / 100
+        targets[component] = round(base[component] + wet, 3)
+        free_water += wet
+    # Воды в заполнителях может оказаться больше, чем нужно по рецептуре
+    targets["water"] = round(max(base["water"] - free_water, 0), 3)
+    return targets, round(free_water, 3)
+
+
+class SetpointTable:
+    """Уставки одной рецептуры при заданной влажности"""
+
+    def __init__(self, recipe: Recipe, moisture: Dict[str, float], volumes):
+        self.recipe = recipe
+        self.version = recipe.version
+        # Влажность только тех заполнителей, что есть в рецептуре
+        self.moisture = {
+            component: moisture.get(component, 0)
+            for component in AGGREGATE_COMPONENTS
+            if getattr(recipe, f"{component}_kg")
+        }
+        self.entries: Dict[float, dict] = {volume: self._compute(volume) for volume in volumes}
+        self.extra = 0
+
+    def _compute(self, volume_m3: float) -> dict:
+        base = plan_components(self.recipe, volume_m3)
+        targets, free_water = correct_for_moisture(base, self.moisture)
+        return {
+            "recipe_id": self.recipe.id,
+            "recipe_version": self.version,
+            "volume_m3": volume_m3,
+            "moisture_pct": self.moisture,
+            "free_water_kg": free_water,
+            "base": base,
+            "targets": targets,
+        }
+
+    def get(self, volume_m3: float) -> dict:
+        entry = self.entries.get(volume_m3)
+        if entry is None:
+            entry = self._compute(volume_m3)
+            if self.extra < SETPOINT_EXTRA_VOLUMES:
+                self.entries[volume_m3] = entry
+                self.extra += 1
+        return entry
+
+
+class SetpointEngine:
+    """Таблицы уставок по рецептурам с пересчетом при смене влажности"""
+
+    def __init__(self, check_interval: float, volume_step: float, max_volume: float):
+        self.check_interval = check_interval
+        steps = int(max_volume / volume_step + 1e-9) if volume_step > 0 else 0
+        self.volumes = tuple(round(volume_step * i, 6) for i in range(1, steps + 1))
+        self._tables: Dict[int, SetpointTable] = {}
+        self._batches: Dict[int, Tuple[int, float]] = {}
+        self._moisture: Optional[Dict[str, float]] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.lookups = 0
+        self.table_builds = 0
+        self.moisture_checks = 0
+        self.moisture_changes = 0
+        self.batch_misses = 0
+
+    def invalidate(self):
+        """Следующее обращение перечитает влажность из БД"""
+        self._checked_at = float("-inf")
+
+    def forget_batches(self):
+        self._batches.clear()
+
+    async def _check_moisture(self, db: AsyncSession):
+        if self._moisture is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if self._moisture is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            rows = await db.execute(
+                select(WarehouseMaterial.material_type, WarehouseMaterial.moisture_pct)
+                .where(WarehouseMaterial.material_type.in_(AGGREGATE_COMPONENTS))
+                .order_by(WarehouseMaterial.id)
+            )
+            moisture = {}
+            for material_type, moisture_pct in rows:
+                moisture.setdefault(material_type, moisture_pct or 0)
+            self.moisture_checks += 1
+            if moisture != self._moisture:
+                changed = {
+                    component for component in AGGREGATE_COMPONENTS
+                    if self._moisture is None or moisture.get(component) != self._moisture.get(component)
+                }
+                self._moisture = moisture
+                self.moisture_changes += 1
+                # Остальные таблицы не зависят от изменившейся влажности
+                for recipe_id, table in list(self._tables.items()):
+                    if any(getattr(table.recipe, f"{component}_kg") for component in changed):
+                        self._tables[recipe_id] = SetpointTable(table.recipe, moisture, self.volumes)
+                        self.table_builds += 1
+            self._checked_at = time.monotonic()
+
+    def _table(self, recipe: Recipe) -> SetpointTable:
+        table = self._tables.get(recipe.id)
+        if table is not None and table.recipe is not recipe:
+            # Кэш рецептур перечитал рецептуру; таблица устарела, только если сменилась версия
+            if table.version == recipe.version:
+                table.recipe = recipe
+            else:
+                table = None
+        if table is None:
+            table = SetpointTable(recipe, self._moisture, self.volumes)
+            self._tables[recipe.id] = table
+            self.table_builds += 1
+        return table
+
+    async def for_recipe(self, db: AsyncSession, recipe: Recipe, volume_m3: float) -> dict:
+        """Уставки рецептуры для объема (словарь только для чтения)"""
+        await self._check_moisture(db)
+        self.lookups += 1
+        return self._table(recipe).get(volume_m3)
+
+    async def targets(self, db: AsyncSession, recipe: Recipe, volume_m3: float) -> Dict[str, float]:
+        """Плановые массы компонентов (кг) с поправкой на влажность"""
+        return (await self.for_recipe(db, recipe, volume_m3))["targets"]
+
+    async def for_batch(self, db: AsyncSession, batch_id: int) -> Optional[dict]:
+        """Уставки партии; None — партия или рецептура не найдена"""
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            self.batch_misses += 1
+            row = (await db.execute(
+                select(Batch.recipe_id, Batch.volume_m3).where(Batch.id == batch_id)
+            )).one_or_none()
+            if row is None:
+                return None
+            if len(self._batches) >= SETPOINT_BATCH_CACHE_SIZE:
+                self._batches.clear()
+            batch = self._batches[batch_id] = (row.recipe_id, row.volume_m3)
+        recipe = await recipe_cache.get(db, batch[0])
+        if recipe is None:
+            return None
+        return await self.for_recipe(db, recipe, batch[1])
+
+    def stats(self) -> dict:
+        return {
+            "recipes": len(self._tables),
+            "precomputed_volumes": len(self.volumes),
+            "batches": len(self._batches),
+            "moisture_pct": self._moisture or {},
+            "lookups": self.lookups,
+            "table_builds": self.table_builds,
+            "moisture_checks": self.moisture_checks,
+            "moisture_changes": self.moisture_changes,
+            "batch_misses": self.batch_misses,
+        }
+
+
+setpoint_engine = SetpointEngine(SETPOINT_CHECK_SEC, SETPOINT_VOLUME_STEP, SETPOINT_MAX_VOLUME)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, WarehouseMaterial):
+            session.info["moisture_dirty"] = True
+        elif isinstance(obj, Batch) and obj in session.deleted:
+            session.info["batches_deleted"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statements(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    # Списание остатков идет массовым UPDATE и влажность не меняет
+    if issubclass(mapper.class_, WarehouseMaterial) and not orm_execute_state.is_update:
+        orm_execute_state.session.info["moisture_dirty"] = True
+    elif issubclass(mapper.class_, Batch) and orm_execute_state.is_delete:
+        orm_execute_state.session.info["batches_deleted"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.in_nested_transaction():
+        return
+    if session.info.pop("moisture_dirty", False):
+        setpoint_engine.invalidate()
+    if session.info.pop("batches_deleted", False):
+        setpoint_engine.forget_batches()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("moisture_dirty", None)
+    session.info.pop("batches_deleted", None)
@@ -0,0 +1,211 @@
+"""
+Имитаторы оборудования для шлюза: сервер Modbus TCP и брокер MQTT
+
+Нужны, чтобы проверять и нагружать шлюз (backend/gateway.py) без завода:
+сервер Modbus отдает регистры нескольких устройств (unit id), брокер MQTT
+пересылает публикации подписчикам с QoS 0. Запуск демонстрационного
+стенда с оборудованием из init_db:
+
+    python -m backend.simulators --config gateway.json
+
+команда пишет конфигурацию шлюза для GATEWAY_CONFIG и меняет показания
+раз в секунду, пока не будет остановлена.
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+from typing import Dict, List, Optional, Set
+
+from backend.fieldbus import (
+    MQTT_CONNACK, MQTT_CONNECT, MQTT_DISCONNECT, MQTT_PINGREQ, MQTT_PINGRESP, MQTT_PUBLISH,
+    MQTT_SUBACK, MQTT_SUBSCRIBE, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS, FieldbusError,
+    modbus_frame, mqtt_packet, mqtt_publish, parse_publish, parse_strings, read_modbus_frame,
+    read_mqtt_packet, topic_matches,
+)
+
+# Коды исключений Modbus: неверный адрес, устройство не отвечает
+ILLEGAL_ADDRESS = 2
+TARGET_NO_RESPONSE = 11
+
+
+class ModbusSimulator:
+    """Сервер Modbus TCP: у каждого unit id свой банк регистров"""
+
+    def __init__(self, units: Optional[Dict[int, List[int]]] = None):
+        self.units: Dict[int, List[int]] = units or {}
+        self.requests = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def set_registers(self, unit: int, address: int, values: List[int]):
+        bank = self.units.setdefault(unit, [])
+        if len(bank) < address + len(values):
+            bank.extend([0] * (address + len(values) - len(bank)))
+        bank[address:address + len(values)] = [value & 0xFFFF for value in values]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Запускает сервер, возвращает порт (0 — любой свободный)"""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _reply(self, unit: int, pdu: bytes) -> bytes:
+        function = pdu[0]
+        if function not in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            return bytes([function | 0x80, 1])
+        bank = self.units.get(unit)
+        if bank is None:
+            return bytes([function | 0x80, TARGET_NO_RESPONSE])
+        address, count = struct.unpack(">HH", pdu[1:5])
+        if address + count > len(bank):
+            return bytes([function | 0x80, ILLEGAL_ADDRESS])
+        return bytes([function, 2 * count]) + struct.pack(f">{count}H", *bank[address:address + count])
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                transaction_id, unit, pdu = await read_modbus_frame(reader)
+                self.requests += 1
+                writer.write(modbus_frame(transaction_id, unit, self._reply(unit, pdu)))
+                await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, FieldbusError):
+            pass
+        finally:
+            writer.close()
+
+
+class MqttBroker:
+    """Брокер MQTT 3.1.1 с QoS 0 (без сохранения сессий и retained-сообщений)"""
+
+    def __init__(self):
+        self._subscriptions: Dict[asyncio.StreamWriter, Set[str]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.published = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._subscriptions):
+                writer.close()
+            await self._server.wait_closed()
+
+    def publish(self, topic: str, payload: bytes):
+        """Рассылает публикацию подписчикам темы"""
+        self.published += 1
+        packet = mqtt_publish(topic, payload)
+        for writer, patterns in self._subscriptions.items():
+            if any(topic_matches(pattern, topic) for pattern in patterns):
+                writer.write(packet)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            packet_type, _, _ = await read_mqtt_packet(reader)
+            if packet_type != MQTT_CONNECT:
+                return
+            writer.write(mqtt_packet(MQTT_CONNACK, 0, b"\x00\x00"))
+            self._subscriptions[writer] = set()
+            while True:
+                packet_type, flags, body = await read_mqtt_packet(reader)
+                if packet_type == MQTT_PUBLISH:
+                    self.publish(*parse_publish(flags, body))
+                elif packet_type == MQTT_SUBSCRIBE:
+                    topics = [topic for topic, _ in parse_strings(body[2:])]
+                    self._subscriptions[writer].update(topics)
+                    writer.write(mqtt_packet(MQTT_SUBACK, 0, body[:2] + b"\x00" * len(topics)))
+                elif packet_type == MQTT_PINGREQ:
+                    writer.write(mqtt_packet(MQTT_PINGRESP, 0))
+                elif packet_type == MQTT_DISCONNECT:
+                    return
+                await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, FieldbusError):
+            pass
+        finally:
+            self._subscriptions.pop(writer, None)
+            writer.close()
+
+
+# ============= ДЕМОНСТРАЦИОННЫЙ СТЕНД =============
+
+# Оборудование init_db на Modbus: unit id, тип, величины (регистр, множитель)
+DEMO_MODBUS = {
+    "Весы цемента": (1, "scale", {"weight_kg": (1, 0.1)}),
+    "Весы песка": (2, "scale", {"weight_kg": (1, 0.1)}),
+    "Весы щебня": (3, "scale", {"weight_kg": (1, 0.1)}),
+    "Смеситель №1": (4, "mixer", {"temperature_c": (1, 0.1), "vibration_mm_s": (2, 0.01)}),
+}
+
+# Оборудование init_db, которое публикует состояние в MQTT
+DEMO_MQTT = {"Конвейер №1": "conveyor", "Силос цемента №1": "silo"}
+
+
+def gateway_config(modbus_host: str, modbus_port: int, mqtt_host: str, mqtt_port: int) -> dict:
+    """Конфигурация шлюза для демонстрационного стенда"""
+    return {
+        "modbus": [
+            {
+                "equipment": name,
+                "equipment_type": equipment_type,
+                "host": modbus_host,
+                "port": modbus_port,
+                "unit": unit,
+                "status_register": 0,
+                "metrics": {metric: {"register": register, "scale": scale} for metric, (register, scale) in metrics.items()},
+                "min_interval_ms": 100,
+                "max_interval_ms": 2000,
+            }
+            for name, (unit, equipment_type, metrics) in DEMO_MODBUS.items()
+        ],
+        "mqtt": [{"host": mqtt_host, "port": mqtt_port, "topic_prefix": "beton/equipment/"}],
+    }
+
+
+def demo_step(modbus: ModbusSimulator, broker: MqttBroker, rng: random.Random):
+    """Одно изменение показаний стенда"""
+    for unit, _, metrics in DEMO_MODBUS.values():
+        # Регистр 0 — код состояния (STATUS_CODES), изредка авария
+        status = 2 if rng.random() < 0.01 else rng.choice((0, 1, 1, 1))
+        values = [rng.randrange(0, 50000) for _ in metrics]
+        modbus.set_registers(unit, 0, [status, *values])
+    for name in DEMO_MQTT:
+        payload = {"status": "working", "is_operational": True, "readings": {"level_pct": round(rng.uniform(20, 95), 1)}}
+        broker.publish(f"beton/equipment/{name}", json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+async def run_demo(host: str, modbus_port: int, mqtt_port: int, config_path: Optional[str]):
+    modbus = ModbusSimulator()
+    broker = MqttBroker()
+    modbus_port = await modbus.start(host, modbus_port)
+    mqtt_port = await broker.start(host, mqtt_port)
+    rng = random.Random(1)
+    demo_step(modbus, broker, rng)
+    config = gateway_config(host, modbus_port, host, mqtt_port)
+    if config_path:
+        with open(config_path, "w", encoding="utf-8") as file:
+            json.dump(config, file, ensure_ascii=False, indent=2)
+        print(f"Конфигурация шлюза: {config_path} (GATEWAY_CONFIG={config_path})")
+    print(f"Modbus TCP: {host}:{modbus_port}, MQTT: {host}:{mqtt_port}")
+    while True:
+        await asyncio.sleep(1)
+        demo_step(modbus, broker, rng)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Имитаторы Modbus TCP и MQTT для шлюза оборудования")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--modbus-port", type=int, default=5020)
+    parser.add_argument("--mqtt-port", type=int, default=1883)
+    parser.add_argument("--config", help="Записать конфигурацию шлюза в файл")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_demo(args.host, args.modbus_port, args.mqtt_port, args.config))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,220 @@
+"""
+Складской учет: журнал движений материалов и атомарное изменение остатков
+
+Каждое изменение остатка записывается в журнал `stock_movements` в той же
+транзакции, а сам остаток меняется одним `UPDATE ... SET current_stock_kg =
+current_stock_kg + :delta`, без чтения в Python — параллельные списания
+не теряют друг друга. Остаток читается из `warehouse_materials` за O(1);
+старые движения периодически сворачиваются в одну строку на материал.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database import AsyncSessionLocal
+from backend.live_events import low_stock_event, queue_event
+from backend.models import StockMovement, WarehouseMaterial
+
+# Сколько дней движений хранить подробно (старые сворачиваются)
+STOCK_LEDGER_KEEP_DAYS = int(os.getenv("STOCK_LEDGER_KEEP_DAYS", "30"))
+
+# Период автоматического сворачивания журнала (ч); 0 — отключено
+STOCK_COMPACTION_INTERVAL_HOURS = float(os.getenv("STOCK_COMPACTION_INTERVAL_HOURS", "24"))
+
+# Причины, доступные для ручной записи движения
+MANUAL_REASONS = ("receipt", "adjustment")
+
+# Поля материала для события о низком остатке
+_EVENT_COLUMNS = (
+    WarehouseMaterial.id,
+    WarehouseMaterial.material_type,
+    WarehouseMaterial.material_name,
+    WarehouseMaterial.storage_location,
+    WarehouseMaterial.current_stock_kg,
+    WarehouseMaterial.min_stock_kg,
+)
+
+
+async def apply_delta(db: AsyncSession, material_id: int, delta_kg: float):
+    """Атомарно меняет остаток, возвращает строку материала (None — не найден)"""
+    row = (await db.execute(
+        update(WarehouseMaterial)
+        .where(WarehouseMaterial.id == material_id)
+        .values(current_stock_kg=WarehouseMaterial.current_stock_kg + delta_kg)
+        .returning(*_EVENT_COLUMNS)
+    )).one_or_none()
+    # UPDATE в обход unit of work: событие о низком остатке ставим явно
+    if row is not None and row.min_stock_kg is not None:
+        if row.current_stock_kg <= row.min_stock_kg < row.current_stock_kg - delta_kg:
+            queue_event(db.sync_session, low_stock_event(row))
+    return row
+
+
+async def count_stock(db: AsyncSession, material_id: int, counted_kg: float, user_id: Optional[int] = None):
+    """Инвентаризация: остаток задается пересчетом, в журнал пишется разница.
+
+    Возвращает прежний остаток (None — материал не найден).
+    """
+    # UPDATE без изменения блокирует строку (в SQLite — запись в БД) и отдает
+    # остаток до пересчета: списание не вклинится между чтением и записью
+    locked = (await db.execute(
+        update(WarehouseMaterial)
+        .where(WarehouseMaterial.id == material_id)
+        .values(current_stock_kg=WarehouseMaterial.current_stock_kg)
+        .returning(WarehouseMaterial.current_stock_kg)
+    )).one_or_none()
+    if locked is None:
+        return None
+    previous = locked.current_stock_kg or 0
+    if counted_kg == previous:
+        return previous
+    row = (await db.execute(
+        update(WarehouseMaterial)
+        .where(WarehouseMaterial.id == material_id)
+        .values(current_stock_kg=counted_kg)
+        .returning(*_EVENT_COLUMNS)
+    )).one()
+    if row.min_stock_kg is not None and row.current_stock_kg <= row.min_stock_kg < previous:
+        queue_event(db.sync_session, low_stock_event(row))
+    db.add(StockMovement(
+        material_id=material_id,
+        quantity_kg=counted_kg - previous,
+        reason="inventory",
+        created_by=user_id,
+    ))
+    await db.flush()
+    return previous
+
+
+async def record_movement(
+    db: AsyncSession,
+    material_id: int,
+    quantity_kg: float,
+    reason: str,
+    user_id: Optional[int] = None,
+    comment: Optional[str] = None,
+):
+    """Приход/корректировка: запись в журнал и изменение остатка"""
+    row = await apply_delta(db, material_id, quantity_kg)
+    if row is None:
+        return None
+    movement = StockMovement(
+        material_id=material_id,
+        quantity_kg=quantity_kg,
+        reason=reason,
+        created_by=user_id,
+        comment=comment,
+    )
+    db.add(movement)
+    await db.flush()
+    return movement
+
+
+async def materials_by_type(db: AsyncSession, material_types: Iterable[str]) -> Dict[str, int]:
+    """Материал, из которого дозируется компонент (первый по id для типа)"""
+    rows = await db.execute(
+        select(WarehouseMaterial.id, WarehouseMaterial.material_type)
+        .where(WarehouseMaterial.material_type.in_(list(material_types)))
+        .order_by(WarehouseMaterial.id)
+    )
+    materials = {}
+    for material_id, material_type in rows:
+        materials.setdefault(material_type, material_id)
+    return materials
+
+
+async def consume_for_batches(db: AsyncSession, consumption: List[Tuple[int, Dict[str, float]]]):
+    """Списание фактически отдозированных материалов.
+
+    consumption — [(batch_id, {компонент: кг})]. В журнал пишется строка
+    на партию и компонент, а остаток каждого материала меняется одним UPDATE.
+    """
+    material_types = {c for _, components in consumption for c, kg in components.items() if kg}
+    if not material_types:
+        return
+    materials = await materials_by_type(db, material_types)
+
+    now = datetime.now()
+    totals: Dict[int, float] = {}
+    movements = []
+    for batch_id, components in consumption:
+        for component, kg in components.items():
+            material_id = materials.get(component)
+            if material_id is None or not kg:
+                continue
+            totals[material_id] = totals.get(material_id, 0) + kg
+            movements.append({
+                "material_id": material_id,
+                "quantity_kg": -kg,
+                "reason": "dosing",
+                "batch_id": batch_id,
+                "created_at": now,
+            })
+
+    # Одинаковый порядок блокировок строк во всех транзакциях
+    for material_id in sorted(totals):
+        await apply_delta(db, material_id, -totals[material_id])
+    if movements:
+        await db.execute(insert(StockMovement), movements)
+
+
+async def ledger_balance(db: AsyncSession, material_id: int) -> float:
+    """Остаток по журналу (для сверки с current_stock_kg)"""
+    total = await db.scalar(
+        select(func.sum(StockMovement.quantity_kg)).where(StockMovement.material_id == material_id)
+    )
+    return total or 0.0
+
+
+async def compact_ledger(db: AsyncSession, before: datetime) -> int:
+    """Сворачивает движения старше `before` в одну строку на материал, возвращает число свернутых"""
+    last_id = await db.scalar(select(func.max(StockMovement.id)).where(StockMovement.created_at < before))
+    if last_id is None:
+        return 0
+    old = and_(StockMovement.id <= last_id, StockMovement.created_at < before)
+    groups = (await db.execute(
+        select(
+            StockMovement.material_id,
+            func.sum(StockMovement.quantity_kg).label("quantity_kg"),
+            func.max(StockMovement.created_at).label("created_at"),
+            func.count().label("count"),
+        )
+        .where(old)
+        .group_by(StockMovement.material_id)
+        .having(func.count() > 1)
+    )).all()
+    if not groups:
+        return 0
+
+    await db.execute(
+        delete(StockMovement).where(old, StockMovement.material_id.in_([g.material_id for g in groups]))
+    )
+    await db.execute(insert(StockMovement), [
+        {
+            "material_id": group.material_id,
+            "quantity_kg": group.quantity_kg,
+            "reason": "compaction",
+            "created_at": group.created_at,
+            "comment": f"Свернуто движений: {group.count}",
+        }
+        for group in groups
+    ])
+    return sum(group.count for group in groups)
+
+
+async def run_compaction():
+    """Фоновое сворачивание журнала раз в STOCK_COMPACTION_INTERVAL_HOURS"""
+    while True:
+        await asyncio.sleep(STOCK_COMPACTION_INTERVAL_HOURS * 3600)
+        try:
+            async with AsyncSessionLocal() as db:
+                folded = await compact_ledger(db, datetime.now() - timedelta(days=STOCK_LEDGER_KEEP_DAYS))
+                await db.commit()
+            if folded:
+                print(f"Свернуто движений склада: {folded}")
+        except Exception as e:
+            print(f"Ошибка при сворачивании журнала склада: {e}")
@@ -0,0 +1,417 @@
+"""
+Прогноз прочности бетона в 28 суток по данным дозирования
+
+Прочность из лаборатории (`quality_checks.strength_mpa`, испытание в 28
+суток) известна через недели после заливки, а то, от чего она зависит,
+записывается при дозировании: фактические массы, отклонения от уставок и
+состав рецептуры. Модель — гребневая регрессия по признакам партии; главный
+из них — цементно-водное отношение (по формуле Боломея прочность линейна по
+Ц/В).
+
+Обучение не тянет историю в Python: признаки вычисляются в SQL, и одна
+агрегирующая выборка возвращает суммы попарных произведений признаков и
+прочности (XᵀX, Xᵀy) — отдельно для обучающей и для контрольной части
+(каждая STRENGTH_HOLDOUT_EVERY-я партия). Система из десятка уравнений
+решается здесь же, так что обучение на миллионе партий — один проход по БД.
+Модели хранятся версиями в `strength_models`; процесс держит последнюю в
+памяти и проверяет появление новой не чаще чем раз в STRENGTH_MODEL_CHECK_SEC.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from datetime import datetime
+from operator import itemgetter
+from types import SimpleNamespace
+from typing import Callable, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import event, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.database import AsyncSessionLocal
+from backend.models import Batch, QualityCheck, Recipe, StrengthModel
+
+# Каждая какая партия (по id) уходит в контрольную выборку; 0 — без контроля
+STRENGTH_HOLDOUT_EVERY = int(os.getenv("STRENGTH_HOLDOUT_EVERY", "10"))
+
+# Сила регуляризации (доля от числа партий, признаки нормированы)
+STRENGTH_RIDGE_ALPHA = float(os.getenv("STRENGTH_RIDGE_ALPHA", "0.001"))
+
+# Меньше партий с результатами лаборатории — модель не обучается
+STRENGTH_MIN_SAMPLES = int(os.getenv("STRENGTH_MIN_SAMPLES", "50"))
+
+# Наибольшее число записей в одном запросе пакетного прогноза
+STRENGTH_BULK_MAX_ITEMS = int(os.getenv("STRENGTH_BULK_MAX_ITEMS", "10000"))
+
+# Период проверки новой версии модели в БД (сек)
+STRENGTH_MODEL_CHECK_SEC = float(os.getenv("STRENGTH_MODEL_CHECK_SEC", "30"))
+
+# Период переобучения (ч), если появились новые результаты лаборатории; 0 — отключено
+STRENGTH_RETRAIN_INTERVAL_HOURS = float(os.getenv("STRENGTH_RETRAIN_INTERVAL_HOURS", "24"))
+
+FEATURE_NAMES = (
+    "cement_water_ratio",
+    "cement_kg_m3",
+    "water_kg_m3",
+    "aggregate_kg_m3",
+    "additive1_kg_m3",
+    "additive2_kg_m3",
+    "deviation_cement_pct",
+    "deviation_sand_pct",
+    "deviation_gravel_pct",
+    "deviation_water_pct",
+    "design_cement_water_ratio",
+)
+
+# Поля партии, из которых считаются признаки
+INPUT_FIELDS = (
+    "volume_m3", "actual_cement_kg", "actual_sand_kg", "actual_gravel_kg", "actual_water_kg",
+    "actual_additive1_kg", "actual_additive2_kg",
+    "deviation_cement_pct", "deviation_sand_pct", "deviation_gravel_pct", "deviation_water_pct",
+)
+
+
+def batch_features(value: Callable[[str], object], recipe) -> tuple:
+    """Признаки партии в порядке FEATURE_NAMES.
+
+    Только арифметика, поэтому одна и та же функция дает числа (value — поле
+    словаря, recipe — рецептура), столбцы признаков numpy (value — столбец
+    полей, recipe — столбцы рецептур) и выражения SQL (value — колонка Batch,
+    recipe — класс Recipe).
+    """
+    volume = value("volume_m3")
+    cement = value("actual_cement_kg")
+    water = value("actual_water_kg")
+    return (
+        cement / water,
+        cement / volume,
+        water / volume,
+        (value("actual_sand_kg") + value("actual_gravel_kg")) / volume,
+        value("actual_additive1_kg") / volume,
+        value("actual_additive2_kg") / volume,
+        value("deviation_cement_pct"),
+        value("deviation_sand_pct"),
+        value("deviation_gravel_pct"),
+        value("deviation_water_pct"),
+        recipe.cement_kg / recipe.water_kg,
+    )
+
+
+_input_fields = itemgetter(*INPUT_FIELDS)
+
+
+def _input_row(values: Mapping[str, float]) -> tuple:
+    """Поля INPUT_FIELDS записи; незаданные — None"""
+    try:
+        return _input_fields(values)
+    except KeyError:
+        return tuple(values.get(name) for name in INPUT_FIELDS)
+
+
+class FittedModel:
+    """Веса версии модели в исходных единицах признаков"""
+
+    __slots__ = ("version", "intercept", "weights", "created_at")
+
+    def __init__(self, version: int, intercept: float, weights: Tuple[float, ...], created_at: Optional[datetime]):
+        self.version = version
+        self.intercept = intercept
+        self.weights = weights
+        self.created_at = created_at
+
+    @classmethod
+    def from_row(cls, row: StrengthModel) -> "FittedModel":
+        coefficients = json.loads(row.coefficients)
+        weights = tuple(coefficients.get(name, 0.0) for name in FEATURE_NAMES)
+        return cls(row.id, row.intercept, weights, row.created_at)
+
+    def predict(self, values: Mapping[str, float], recipe) -> Optional[float]:
+        """Прочность (МПа); None — признаки не считаются (нет рецептуры, воды, объема, отклонений)"""
+        try:
+            features = batch_features(values.__getitem__, recipe)
+            return round(self.intercept + sum(w * x for w, x in zip(self.weights, features)), 2)
+        except (AttributeError, TypeError, KeyError, ZeroDivisionError):
+            return None
+
+    def predict_many(self, items: Iterable[Tuple[Mapping[str, float], object]]) -> List[Optional[float]]:
+        """Прогноз для многих партий одним умножением матрицы признаков на веса.
+
+        Незаданное поле или рецептура дают NaN, деление на ноль — бесконечность;
+        такие прогнозы возвращаются как None, как и в predict.
+        """
+        items = list(items)
+        if not items:
+            return []
+        inputs = np.array([_input_row(values) for values, _ in items], dtype=float)
+        recipes = np.array(
+            [(getattr(recipe, "cement_kg", None), getattr(recipe, "water_kg", None)) for _, recipe in items],
+            dtype=float,
+        )
+        columns = dict(zip(INPUT_FIELDS, inputs.T))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            features = np.column_stack(batch_features(
+                columns.__getitem__, SimpleNamespace(cement_kg=recipes[:, 0], water_kg=recipes[:, 1])
+            ))
+            predictions = features @ np.array(self.weights) + self.intercept
+        rounded = np.round(predictions, 2).astype(object)
+        rounded[~np.isfinite(predictions)] = None
+        return rounded.tolist()
+
+
+# ============= ОБУЧЕНИЕ =============
+
+def _moments_query():
+    """Суммы попарных произведений (1, признаки, прочность) по контрольной и обучающей части"""
+    features = batch_features(lambda name: getattr(Batch, name), Recipe)
+    holdout = (Batch.id % STRENGTH_HOLDOUT_EVERY == 0) if STRENGTH_HOLDOUT_EVERY > 0 else literal(False)
+    inputs = [getattr(Batch, name) for name in INPUT_FIELDS]
+    samples = (
+        select(
+            holdout.label("holdout"),
+            *(feature.label(f"x{index}") for index, feature in enumerate(features)),
+            QualityCheck.strength_mpa.label("y"),
+        )
+        .join(QualityCheck, QualityCheck.batch_id == Batch.id)
+        .join(Recipe, Recipe.id == Batch.recipe_id)
+        .where(
+            QualityCheck.strength_mpa.is_not(None),
+            *(column.is_not(None) for column in inputs),
+            Batch.volume_m3 > 0,
+            Batch.actual_water_kg > 0,
+            Recipe.water_kg > 0,
+        )
+        # OFFSET 0 не дает СУБД развернуть подзапрос: иначе признаки пересчитываются в каждой сумме
+        .offset(0)
+        .subquery()
+    )
+    terms = [samples.c[f"x{index}"] for index in range(len(features))] + [samples.c.y]
+    sums = [func.count()]
+    sums += [func.sum(term) for term in terms]
+    sums += [func.sum(a * b) for i, a in enumerate(terms) for b in terms[i:]]
+    return select(samples.c.holdout, *sums).group_by(samples.c.holdout)
+
+
+def _moment_matrix(values) -> List[List[float]]:
+    """Симметричная матрица Σ z·zᵀ для z = (1, признаки, прочность)"""
+    size = len(FEATURE_NAMES) + 2
+    matrix = [[0.0] * size for _ in range(size)]
+    values = iter(values)
+    for i in range(size):
+        for j in range(i, size):
+            matrix[i][j] = matrix[j][i] = float(next(values) or 0)
+    return matrix
+
+
+def _solve(a: List[List[float]], b: List[float]) -> List[float]:
+    """Решение системы a·x = b методом Гаусса с выбором ведущего элемента"""
+    n = len(b)
+    rows = [list(a[i]) + [b[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda row: abs(rows[row][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        lead = rows[col][col]
+        for row in range(col + 1, n):
+            factor = rows[row][col] / lead
+            if factor:
+                for k in range(col, n + 1):
+                    rows[row][k] -= factor * rows[col][k]
+    x = [0.0] * n
+    for row in range(n - 1, -1, -1):
+        x[row] = (rows[row][n] - sum(rows[row][k] * x[k] for k in range(row + 1, n))) / rows[row][row]
+    return x
+
+
+def fit_ridge(moments: List[List[float]], alpha: float) -> Tuple[float, List[float]]:
+    """Свободный член и веса по суммам произведений (признаки нормируются внутри)"""
+    n = moments[0][0]
+    features = range(1, len(moments) - 1)
+    y = len(moments) - 1
+    mean = [moments[0][j] / n for j in range(len(moments))]
+
+    def scatter(j, k):
+        return moments[j][k] - n * mean[j] * mean[k]
+
+    scale = {j: math.sqrt(max(scatter(j, j), 0) / n) for j in features}
+    # Постоянные признаки (например, добавка, которой нет ни в одной рецептуре) получают нулевой вес;
+    # разброс сравнивается со средним квадратом, иначе ошибки округления сумм примут их за переменные
+    active = [j for j in features if scatter(j, j) > 1e-9 * moments[j][j]]
+    a = [
+        [scatter(j, k) / (scale[j] * scale[k]) + (alpha * n if j == k else 0) for k in active]
+        for j in active
+    ]
+    b = [scatter(j, y) / scale[j] for j in active]
+    solution = dict(zip(active, _solve(a, b))) if active else {}
+    weights = [solution[j] / scale[j] if j in solution else 0.0 for j in features]
+    intercept = mean[y] - sum(w * mean[j] for w, j in zip(weights, features))
+    return intercept, weights
+
+
+def evaluate(moments: List[List[float]], intercept: float, weights: List[float]) -> Tuple[float, float]:
+    """RMSE (МПа) и R² модели на выборке, заданной суммами произведений"""
+    n = moments[0][0]
+    # Остаток y - ŷ = -(v·z) при v = (свободный член, веса, -1), сумма квадратов = vᵀ·M·v
+    v = [intercept, *weights, -1.0]
+    sse = sum(v[i] * moments[i][j] * v[j] for i in range(len(v)) for j in range(len(v)))
+    y = len(moments) - 1
+    sst = moments[y][y] - moments[0][y] ** 2 / n
+    rmse = math.sqrt(max(sse, 0) / n)
+    return round(rmse, 3), round(1 - sse / sst, 4) if sst > 0 else None
+
+
+async def train(db: AsyncSession, user_id: Optional[int] = None) -> StrengthModel:
+    """Обучает новую версию модели; фиксирует вызывающий код"""
+    started = time.perf_counter()
+    parts = {bool(row[0]): _moment_matrix(row[1:]) for row in await db.execute(_moments_query())}
+    train_part = parts.get(False)
+    if train_part is None or train_part[0][0] < STRENGTH_MIN_SAMPLES:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Недостаточно партий с результатами лаборатории (нужно не меньше {STRENGTH_MIN_SAMPLES})",
+        )
+
+    holdout = parts.get(True)
+    holdout_rmse = holdout_r2 = None
+    if holdout is not None:
+        # Контрольная оценка — по весам, подобранным без этих партий
+        holdout_rmse, holdout_r2 = evaluate(holdout, *fit_ridge(train_part, STRENGTH_RIDGE_ALPHA))
+        # Итоговая модель учится на всех партиях: суммы произведений складываются
+        full = [[a + b for a, b in zip(row, other)] for row, other in zip(train_part, holdout)]
+    else:
+        full = train_part
+    intercept, weights = fit_ridge(full, STRENGTH_RIDGE_ALPHA)
+    rmse, r2 = evaluate(full, intercept, weights)
+
+    model = StrengthModel(
+        features=json.dumps(FEATURE_NAMES),
+        intercept=intercept,
+        coefficients=json.dumps(dict(zip(FEATURE_NAMES, weights))),
+        samples=int(full[0][0]),
+        rmse_mpa=rmse,
+        r2=r2,
+        holdout_samples=int(holdout[0][0]) if holdout is not None else 0,
+        holdout_rmse_mpa=holdout_rmse,
+        holdout_r2=holdout_r2,
+        train_ms=round((time.perf_counter() - started) * 1000, 1),
+        trained_by=user_id,
+        created_at=datetime.now(),
+    )
+    db.add(model)
+    await db.flush()
+    # Процесс начнет прогнозировать новой версией сразу после коммита
+    db.sync_session.info["strength_model"] = FittedModel.from_row(model)
+    return model
+
+
+def model_info(row: StrengthModel) -> dict:
+    """Поля схемы StrengthModelResponse"""
+    return {
+        "id": row.id,
+        "intercept": row.intercept,
+        "coefficients": json.loads(row.coefficients),
+        "samples": row.samples,
+        "rmse_mpa": row.rmse_mpa,
+        "r2": row.r2,
+        "holdout_samples": row.holdout_samples,
+        "holdout_rmse_mpa": row.holdout_rmse_mpa,
+        "holdout_r2": row.holdout_r2,
+        "train_ms": row.train_ms,
+        "created_at": row.created_at,
+    }
+
+
+# ============= ПРОГНОЗ =============
+
+class StrengthPredictor:
+    """Последняя версия модели в памяти процесса"""
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._model: Optional[FittedModel] = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self.loads = 0
+        self.checks = 0
+        self.predictions = 0
+
+    def install(self, model: FittedModel):
+        if self._model is None or model.version > self._model.version:
+            self._model = model
+        self._checked_at = time.monotonic()
+
+    async def current(self, db: AsyncSession) -> Optional[FittedModel]:
+        """Актуальная модель; None — ни одна версия еще не обучена"""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return self._model
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return self._model
+            self.checks += 1
+            version = await db.scalar(select(func.max(StrengthModel.id)))
+            if version is not None and (self._model is None or version != self._model.version):
+                self._model = FittedModel.from_row(await db.get(StrengthModel, version))
+                self.loads += 1
+            self._checked_at = time.monotonic()
+        return self._model
+
+    async def predict(self, db: AsyncSession, values: Mapping[str, float], recipe) -> Tuple[Optional[float], Optional[int]]:
+        """(прочность, версия модели) или (None, None), если модели нет"""
+        model = await self.current(db)
+        if model is None:
+            return None, None
+        self.predictions += 1
+        return model.predict(values, recipe), model.version
+
+    def stats(self) -> dict:
+        model = self._model
+        return {
+            "model_version": model.version if model else None,
+            "trained_at": model.created_at if model else None,
+            "predictions": self.predictions,
+            "checks": self.checks,
+            "loads": self.loads,
+        }
+
+
+strength_predictor = StrengthPredictor(STRENGTH_MODEL_CHECK_SEC)
+
+
+@event.listens_for(Session, "after_commit")
+def _install_on_commit(session):
+    if session.in_nested_transaction():
+        return
+    model = session.info.pop("strength_model", None)
+    if model is not None:
+        strength_predictor.install(model)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("strength_model", None)
+
+
+async def run_retraining():
+    """Фоновое переобучение раз в STRENGTH_RETRAIN_INTERVAL_HOURS при новых результатах лаборатории"""
+    while True:
+        await asyncio.sleep(STRENGTH_RETRAIN_INTERVAL_HOURS * 3600)
+        try:
+            async with AsyncSessionLocal() as db:
+                trained_at = await db.scalar(select(func.max(StrengthModel.created_at)))
+                fresh = select(QualityCheck.id).where(QualityCheck.strength_mpa.is_not(None))
+                if trained_at is not None:
+                    fresh = fresh.where(QualityCheck.checked_at > trained_at)
+                if await db.scalar(fresh.limit(1)) is None:
+                    continue
+                model = await train(db)
+                summary = f"Модель прочности v{model.id}: партий {model.samples}, RMSE {model.rmse_mpa} МПа"
+                await db.commit()
+            print(summary)
+        except HTTPException as e:
+            print(f"Модель прочности не переобучена: {e.detail}")
+        except Exception as e:
+            print(f"Ошибка при переобучении модели прочности: {e}")
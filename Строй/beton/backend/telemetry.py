@@ -0,0 +1,310 @@
+"""
+Временные ряды показаний датчиков оборудования
+
+`equipment_status` хранит только последнее состояние устройства. Показания
+весов, уровней, температур и вибрации пишутся отдельно: ряд — пара
+оборудование × величина (`telemetry_series`), сырые точки добавляются
+пачками в `telemetry_readings` одним INSERT на блок. В той же транзакции
+точки сворачиваются в агрегаты за 1 с, 1 мин и 1 ч (`telemetry_rollups`:
+количество, сумма, минимум, максимум) — так же, как агрегаты отклонений
+в backend/analytics.py.
+
+Графики строятся по самому крупному разрешению, которое еще дает нужное
+число точек, поэтому запрос за год читает тысячи строк часовых агрегатов,
+а не миллионы показаний. Старые показания и агрегаты удаляются фоновой
+задачей по срокам хранения каждого разрешения.
+"""
+import asyncio
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.database import AsyncSessionLocal
+from backend.models import EquipmentStatus, TelemetryReading, TelemetryRollup, TelemetrySeries
+from backend.schemas import TelemetryBatch, TelemetryIngestError, TelemetryIngestResult
+from backend.upsert import upsert
+
+# Разрешения агрегатов (с) и их имена в ответах
+ROLLUP_RESOLUTIONS = (1, 60, 3600)
+RESOLUTION_NAMES = {1: "1s", 60: "1m", 3600: "1h"}
+
+# Сроки хранения сырых показаний и агрегатов
+TELEMETRY_RAW_KEEP_HOURS = float(os.getenv("TELEMETRY_RAW_KEEP_HOURS", "24"))
+TELEMETRY_1S_KEEP_HOURS = float(os.getenv("TELEMETRY_1S_KEEP_HOURS", "48"))
+TELEMETRY_1M_KEEP_DAYS = float(os.getenv("TELEMETRY_1M_KEEP_DAYS", "30"))
+TELEMETRY_1H_KEEP_DAYS = float(os.getenv("TELEMETRY_1H_KEEP_DAYS", "730"))
+
+# Период удаления устаревших данных (мин); 0 — отключено
+TELEMETRY_RETENTION_INTERVAL_MIN = float(os.getenv("TELEMETRY_RETENTION_INTERVAL_MIN", "10"))
+
+# Строк в одном INSERT сырых показаний
+TELEMETRY_INSERT_CHUNK = int(os.getenv("TELEMETRY_INSERT_CHUNK", "5000"))
+
+# Наибольшее число точек в ответе для графика
+TELEMETRY_MAX_POINTS = int(os.getenv("TELEMETRY_MAX_POINTS", "5000"))
+
+# Сколько ошибок возвращать в ответе загрузки
+TELEMETRY_MAX_ERRORS = 100
+
+# Начало отсчета интервалов: агрегаты выровнены по целым секундам от него
+EPOCH = datetime(1970, 1, 1)
+
+ROLLUP_KEY = ("series_id", "resolution", "bucket")
+
+
+def keep_periods() -> Dict[object, timedelta]:
+    """Сроки хранения: "raw" — сырые показания, число — разрешение агрегатов"""
+    return {
+        "raw": timedelta(hours=TELEMETRY_RAW_KEEP_HOURS),
+        1: timedelta(hours=TELEMETRY_1S_KEEP_HOURS),
+        60: timedelta(days=TELEMETRY_1M_KEEP_DAYS),
+        3600: timedelta(days=TELEMETRY_1H_KEEP_DAYS),
+    }
+
+
+def local_time(ts: datetime) -> datetime:
+    """Время без часового пояса, как остальные метки времени в БД"""
+    return ts.astimezone().replace(tzinfo=None) if ts.tzinfo else ts
+
+
+class SeriesRegistry:
+    """id рядов по названию оборудования и величине (ряды не удаляются)"""
+
+    def __init__(self):
+        self._equipment: Dict[str, int] = {}
+        self._series: Dict[Tuple[str, str], int] = {}
+
+    async def resolve(self, db: AsyncSession, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+        """id рядов; ряды известного оборудования создаются при первом показании"""
+        keys = set(keys)
+        missing = keys - self._series.keys()
+        if missing:
+            names = {name for name, _ in missing} - self._equipment.keys()
+            if names:
+                rows = await db.execute(
+                    select(EquipmentStatus.equipment_name, EquipmentStatus.id)
+                    .where(EquipmentStatus.equipment_name.in_(names))
+                )
+                self._equipment.update({name: equipment_id for name, equipment_id in rows})
+            new = [(self._equipment[name], metric) for name, metric in missing if name in self._equipment]
+            if new:
+                # Ряд создан в транзакции вызывающего кода: при откате id из кэша станут недействительны
+                db.sync_session.info["telemetry_series_new"] = True
+                names_by_id = {equipment_id: name for name, equipment_id in self._equipment.items()}
+                await upsert(
+                    db, TelemetrySeries.__table__,
+                    [{"equipment_id": equipment_id, "metric": metric} for equipment_id, metric in sorted(new)],
+                    ("equipment_id", "metric"),
+                )
+                rows = await db.execute(
+                    select(TelemetrySeries.equipment_id, TelemetrySeries.metric, TelemetrySeries.id)
+                    .where(TelemetrySeries.equipment_id.in_({equipment_id for equipment_id, _ in new}))
+                )
+                for equipment_id, metric, series_id in rows:
+                    self._series[(names_by_id[equipment_id], metric)] = series_id
+        return {key: self._series[key] for key in keys if key in self._series}
+
+    def clear(self):
+        self._equipment.clear()
+        self._series.clear()
+
+
+series_registry = SeriesRegistry()
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_new_series(session):
+    if session.in_nested_transaction():
+        return
+    session.info.pop("telemetry_series_new", None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_new_series(session):
+    if session.in_nested_transaction():
+        return
+    if session.info.pop("telemetry_series_new", False):
+        series_registry.clear()
+
+
+def _accumulate_rollup(table, new) -> dict:
+    """Сложение агрегата с новой порцией (new — столбцы excluded или значения)"""
+    return {
+        "count": table.c.count + new["count"],
+        "sum": table.c.sum + new["sum"],
+        "min": case((new["min"] < table.c.min, new["min"]), else_=table.c.min),
+        "max": case((new["max"] > table.c.max, new["max"]), else_=table.c.max),
+    }
+
+
+async def add_to_rollups(db: AsyncSession, rollups: Dict[tuple, list]):
+    """Добавляет агрегаты {(series_id, resolution, секунда начала): [count, sum, min, max]}"""
+    if not rollups:
+        return
+    # Сортировка по ключу: одинаковый порядок блокировок в параллельных транзакциях
+    await upsert(db, TelemetryRollup.__table__, [
+        {
+            "series_id": series_id,
+            "resolution": resolution,
+            "bucket": EPOCH + timedelta(seconds=start),
+            "count": acc[0],
+            "sum": acc[1],
+            "min": acc[2],
+            "max": acc[3],
+        }
+        for (series_id, resolution, start), acc in sorted(rollups.items())
+    ], ROLLUP_KEY, _accumulate_rollup)
+
+
+async def ingest(db: AsyncSession, batches: List[TelemetryBatch]) -> TelemetryIngestResult:
+    """Пишет показания и агрегаты; фиксирует вызывающий код"""
+    series = await series_registry.resolve(db, {(batch.equipment, batch.metric) for batch in batches})
+    rejected = 0
+    errors = []
+    rows = []
+    rollups: Dict[tuple, list] = {}
+    for index, batch in enumerate(batches):
+        series_id = series.get((batch.equipment, batch.metric))
+        if series_id is None:
+            rejected += len(batch.points)
+            if len(errors) < TELEMETRY_MAX_ERRORS:
+                errors.append(TelemetryIngestError(
+                    index=index, equipment=batch.equipment, metric=batch.metric, error="Оборудование не найдено",
+                ))
+            continue
+        for ts, value in batch.points:
+            if not math.isfinite(value):
+                rejected += 1
+                continue
+            ts = local_time(ts)
+            rows.append({"series_id": series_id, "ts": ts, "value": value})
+            second = math.floor((ts - EPOCH).total_seconds())
+            for resolution in ROLLUP_RESOLUTIONS:
+                key = (series_id, resolution, second - second % resolution)
+                acc = rollups.get(key)
+                if acc is None:
+                    rollups[key] = [1, value, value, value]
+                else:
+                    acc[0] += 1
+                    acc[1] += value
+                    if value < acc[2]:
+                        acc[2] = value
+                    elif value > acc[3]:
+                        acc[3] = value
+
+    table = TelemetryReading.__table__
+    for start in range(0, len(rows), TELEMETRY_INSERT_CHUNK):
+        await db.execute(insert(table), rows[start:start + TELEMETRY_INSERT_CHUNK])
+    await add_to_rollups(db, rollups)
+    return TelemetryIngestResult(accepted=len(rows), rejected=rejected, errors=errors)
+
+
+def _choose_source(span: timedelta, date_from: datetime, points: int, now: datetime) -> Tuple[object, float]:
+    """Источник точек ("raw" или разрешение агрегатов) и длина интервала точки (с)"""
+    keep = keep_periods()
+    step = span.total_seconds() / points
+    if step < ROLLUP_RESOLUTIONS[0] and date_from >= now - keep["raw"]:
+        return "raw", step
+    available = [resolution for resolution in ROLLUP_RESOLUTIONS if date_from >= now - keep[resolution]]
+    if not available:
+        available = [ROLLUP_RESOLUTIONS[-1]]
+    fitting = [resolution for resolution in available if resolution <= step]
+    source = fitting[-1] if fitting else available[0]
+    # Точка графика — целое число интервалов источника
+    return source, max(math.ceil(step / source), 1) * source
+
+
+async def query_series(
+    db: AsyncSession,
+    series_id: int,
+    date_from: datetime,
+    date_to: datetime,
+    points: int,
+    now: Optional[datetime] = None,
+) -> dict:
+    """Ряд за период, прореженный примерно до `points` точек (поля схемы TelemetrySeriesData)"""
+    date_from, date_to = local_time(date_from), local_time(date_to)
+    source, step = _choose_source(date_to - date_from, date_from, points, now or datetime.now())
+    buckets: Dict[int, list] = {}
+    if source == "raw":
+        rows = await db.execute(
+            select(TelemetryReading.ts, TelemetryReading.value)
+            .where(
+                TelemetryReading.series_id == series_id,
+                TelemetryReading.ts >= date_from,
+                TelemetryReading.ts < date_to,
+            )
+        )
+        rows = ((ts, 1, value, value, value) for ts, value in rows)
+    else:
+        rows = await db.execute(
+            select(TelemetryRollup.bucket, TelemetryRollup.count, TelemetryRollup.sum, TelemetryRollup.min, TelemetryRollup.max)
+            .where(
+                TelemetryRollup.series_id == series_id,
+                TelemetryRollup.resolution == source,
+                TelemetryRollup.bucket > date_from - timedelta(seconds=source),
+                TelemetryRollup.bucket < date_to,
+            )
+        )
+    for ts, count, total, low, high in rows:
+        key = math.floor((ts - EPOCH).total_seconds() / step)
+        acc = buckets.get(key)
+        if acc is None:
+            buckets[key] = [count, total, low, high]
+        else:
+            acc[0] += count
+            acc[1] += total
+            acc[2] = min(acc[2], low)
+            acc[3] = max(acc[3], high)
+    return {
+        "series_id": series_id,
+        "source": RESOLUTION_NAMES.get(source, source),
+        "step_sec": step,
+        "points": [
+            {
+                "ts": EPOCH + timedelta(seconds=key * step),
+                "count": count,
+                "avg": total / count,
+                "min": low,
+                "max": high,
+            }
+            for key, (count, total, low, high) in sorted(buckets.items())
+        ],
+    }
+
+
+async def apply_retention(db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Удаляет показания и агрегаты старше сроков хранения, возвращает число строк"""
+    now = now or datetime.now()
+    deleted = {}
+    for source, keep in keep_periods().items():
+        if source == "raw":
+            result = await db.execute(
+                delete(TelemetryReading).where(TelemetryReading.ts < now - keep)
+            )
+        else:
+            result = await db.execute(
+                delete(TelemetryRollup)
+                .where(TelemetryRollup.resolution == source, TelemetryRollup.bucket < now - keep)
+            )
+        deleted[RESOLUTION_NAMES.get(source, source)] = result.rowcount
+    return deleted
+
+
+async def run_retention():
+    """Фоновое удаление устаревших показаний раз в TELEMETRY_RETENTION_INTERVAL_MIN"""
+    while True:
+        await asyncio.sleep(TELEMETRY_RETENTION_INTERVAL_MIN * 60)
+        try:
+            async with AsyncSessionLocal() as db:
+                deleted = await apply_retention(db)
+                await db.commit()
+            if any(deleted.values()):
+                print(f"Удалено устаревших показаний датчиков: {deleted}")
+        except Exception as e:
+            print(f"Ошибка при удалении устаревших показаний датчиков: {e}")
@@ -0,0 +1,86 @@
+"""
+INSERT ... ON CONFLICT для любой БД
+
+PostgreSQL и SQLite получают один INSERT ... ON CONFLICT на пачку строк.
+Для остальных СУБД строки пишутся по одной: UPDATE по ключу, для нового
+ключа — INSERT в точке сохранения; если ту же строку успела вставить
+параллельная транзакция, INSERT откатывается и повторяется UPDATE.
+"""
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import literal, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# СУБД с INSERT ... ON CONFLICT
+UPSERT_DIALECTS = ("postgresql", "sqlite")
+
+
+def _insert_for(dialect: str):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+async def upsert(
+    db: AsyncSession,
+    table,
+    rows: List[dict],
+    key: Sequence[str],
+    update: Optional[Callable[[object, object], Dict[str, object]]] = None,
+    returning: Sequence = (),
+) -> list:
+    """Вставляет строки; для существующего ключа — update(table, new) или ничего.
+
+    update получает таблицу и значения вставляемой строки (`new["count"]`:
+    столбцы excluded или литералы) и возвращает присваивания SET.
+    returning — столбцы, которые вернуть для всех строк rows.
+    Изменения фиксируются вместе с транзакцией вызывающего кода.
+    """
+    if not rows:
+        return []
+    dialect = db.get_bind().dialect.name
+    if dialect in UPSERT_DIALECTS:
+        stmt = _insert_for(dialect)(table)
+        if update is None:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(key))
+        else:
+            stmt = stmt.on_conflict_do_update(index_elements=list(key), set_=update(table, stmt.excluded))
+            if returning:
+                # Один INSERT с несколькими VALUES: rows — пачка умеренного размера
+                return (await db.execute(stmt.values(rows).returning(*returning))).all()
+        await db.execute(stmt, rows)
+    else:
+        for row in rows:
+            await _upsert_row(db, table, key, update, row)
+    if not returning:
+        return []
+
+    # DO NOTHING не возвращает существующие строки; прочие СУБД — без RETURNING
+    columns = [table.c[name] for name in key]
+    if len(columns) == 1:
+        condition = columns[0].in_([row[key[0]] for row in rows])
+    else:
+        condition = tuple_(*columns).in_([tuple(row[name] for name in key) for row in rows])
+    return (await db.execute(select(*returning).where(condition))).all()
+
+
+async def _upsert_row(db: AsyncSession, table, key: Sequence[str], update, row: dict):
+    """Одна строка без ON CONFLICT"""
+    changed = None
+    if update is not None:
+        new = {name: literal(value, table.c[name].type) for name, value in row.items()}
+        changed = table.update().where(*(table.c[name] == row[name] for name in key)).values(update(table, new))
+        if (await db.execute(changed)).rowcount:
+            return
+    # Обработчики after_commit/after_rollback пропускают точки сохранения:
+    # отметки session.info (события, сброс кэшей) ждут конца всей транзакции
+    try:
+        async with db.begin_nested():
+            await db.execute(table.insert().values(row))
+    except IntegrityError:
+        # Строку с этим ключом успела вставить параллельная транзакция
+        if changed is not None:
+            await db.execute(changed)